@@ -0,0 +1,248 @@
+"""
+The `backtracking` module contains functions for determining tracker
+orientations that avoid self-shading. At low solar elevation angles, it can be
+beneficial to orient the collectors away from the sun, trading a lower
+incidence angle modifier (cosine loss) for less shading.
+"""
+
+from twoaxistracking import shading
+import numpy as np
+import pandas as pd
+import shapely
+
+
+def _direction_vector(elevation, azimuth):
+    """Unit vector pointing in the direction of elevation and azimuth angles.
+
+    The vector components are east, north, and up.
+    """
+    elevation, azimuth = np.deg2rad(elevation), np.deg2rad(azimuth)
+    return np.stack([np.cos(elevation) * np.sin(azimuth),
+                     np.cos(elevation) * np.cos(azimuth),
+                     np.sin(elevation)], axis=-1)
+
+
+def _projected_offsets(solar_elevation, solar_azimuth, tracker_elevation,
+                       tracker_azimuth, tracker_distance, relative_azimuth,
+                       relative_slope):
+    """Calculate the offsets of the neighboring collectors projected onto the
+    plane of the reference collector for any tracker orientation.
+
+    All collectors are assumed to have the same orientation, defined by the
+    elevation and azimuth of the collector normal. The neighboring collectors
+    are projected along the direction of the sun onto the plane of the
+    reference collector. The x-axis of the collector plane is horizontal and
+    the y-axis points upwards along the collector plane.
+
+    For collectors normal to the sun on a horizontal field, the offsets are
+    identical to those used in :py:func:`twoaxistracking.shaded_fraction`.
+
+    Returns
+    -------
+    xoff, yoff : 2D arrays of floats
+        Offsets with the solar positions as rows and the neighboring
+        collectors as columns.
+    in_front : 2D array of bools
+        Whether the neighboring collectors are in front of the reference
+        collector as seen from the sun, i.e., whether they can cast a shadow.
+    cos_aoi : array of floats
+        Cosine of the angle of incidence of the direct irradiance.
+    """
+    sun = _direction_vector(solar_elevation, solar_azimuth)
+    normal = _direction_vector(tracker_elevation, tracker_azimuth)
+    tracker_elevation = np.deg2rad(tracker_elevation)
+    tracker_azimuth = np.deg2rad(tracker_azimuth)
+    x_axis = np.stack([-np.cos(tracker_azimuth), np.sin(tracker_azimuth),
+                       np.zeros_like(tracker_azimuth)], axis=-1)
+    y_axis = np.stack([-np.sin(tracker_elevation) * np.sin(tracker_azimuth),
+                       -np.sin(tracker_elevation) * np.cos(tracker_azimuth),
+                       np.cos(tracker_elevation)], axis=-1)
+    # Position of the neighboring collectors (east, north, up)
+    neighbors = np.column_stack([
+        tracker_distance * np.sin(np.deg2rad(relative_azimuth)),
+        tracker_distance * np.cos(np.deg2rad(relative_azimuth)),
+        tracker_distance * np.tan(np.deg2rad(relative_slope))])
+
+    cos_aoi = np.sum(normal * sun, axis=-1)
+    # Distance of the neighboring collector planes from the reference plane
+    distance_along_normal = normal @ neighbors.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Distance along the sun direction from the neighboring collectors to
+        # the plane of the reference collector
+        distance_to_plane = distance_along_normal / cos_aoi[:, np.newaxis]
+        xoff = x_axis @ neighbors.T \
+            - distance_to_plane * np.sum(x_axis * sun, axis=-1)[:, np.newaxis]
+        yoff = y_axis @ neighbors.T \
+            - distance_to_plane * np.sum(y_axis * sun, axis=-1)[:, np.newaxis]
+    in_front = (distance_along_normal > 0) & (cos_aoi[:, np.newaxis] > 0)
+    return xoff, yoff, in_front, cos_aoi
+
+
+def _orientation_shaded_fraction(tracker_field, solar_elevation, solar_azimuth,
+                                 tracker_elevation, tracker_azimuth):
+    """Calculate the shaded fraction and cosine of the angle of incidence for
+    arrays of solar positions and tracker orientations."""
+    xoff, yoff, in_front, cos_aoi = _projected_offsets(
+        solar_elevation, solar_azimuth, tracker_elevation, tracker_azimuth,
+        tracker_field.tracker_distance, tracker_field.relative_azimuth,
+        tracker_field.relative_slope)
+    unshaded_geometries, _, _ = tracker_field._unshaded_geometries_from_offsets(
+        xoff, yoff, in_front)
+    shaded_fraction = \
+        1 - shapely.area(unshaded_geometries) / tracker_field.active_collector_area
+    return shaded_fraction, cos_aoi
+
+
+def shade_avoidance_orientation(tracker_field, solar_elevation, solar_azimuth,
+                                max_azimuth_offset=45, grid_size=5,
+                                n_refinements=3, resolution=0.1):
+    """Determine the tracker orientations that maximize the unshaded beam
+    irradiance.
+
+    For each solar position, the tracker orientation that maximizes the
+    product of the unshaded fraction and the cosine of the angle of
+    incidence is determined. Only solar positions for which the collectors
+    are shaded when tracking the sun are searched; otherwise the collectors
+    track the sun.
+
+    The search is done on a coarse grid of tracker orientations, which is
+    successively refined around the best orientation. The tracker elevation
+    is searched between the solar elevation and 90° and the tracker azimuth
+    within ``max_azimuth_offset`` of the solar azimuth. The search is
+    vectorized across all solar positions and is only done once for solar
+    positions that are identical when rounded to ``resolution``. The offset
+    of the best orientation from tracking the sun found for the rounded
+    solar position is applied to the actual solar position, for which the
+    shaded fraction and the angle of incidence are calculated. If this
+    orientation is worse than tracking the sun, the collectors track the
+    sun.
+
+    Parameters
+    ----------
+    tracker_field : :py:class:`twoaxistracking.TrackerField`
+        Tracker field for which to determine the tracker orientations.
+    solar_elevation : array-like
+        Solar elevation angles in degrees.
+    solar_azimuth : array-like
+        Solar azimuth angles in degrees.
+    max_azimuth_offset : float, default : 45
+        Maximum difference between the tracker azimuth and the solar azimuth
+        [degrees]
+    grid_size : int, default : 5
+        Number of tracker elevation and azimuth angles in the search grid.
+    n_refinements : int, default : 3
+        Number of times the search grid is refined around the best
+        orientation.
+    resolution : float, default : 0.1
+        Resolution to which the solar positions are rounded before the search
+        [degrees]
+
+    Returns
+    -------
+    orientation : pandas.DataFrame
+        DataFrame with the columns ``tracker_elevation``, ``tracker_azimuth``,
+        ``shaded_fraction``, and ``cos_aoi`` (cosine of the angle of
+        incidence). The index is the same as ``solar_elevation`` if it is a
+        pandas Series. All values are nan when the sun is below the horizon.
+
+    Notes
+    -----
+    The shadows are projected along the direction of the sun onto the plane
+    of the reference collector, and all collectors are assumed to have the
+    same orientation. The collector geometry is oriented with its x-axis
+    horizontal.
+    """
+    elevation = np.atleast_1d(np.asarray(solar_elevation, dtype=float)).ravel()
+    azimuth = np.atleast_1d(np.asarray(solar_azimuth, dtype=float)).ravel()
+    shaded_fraction = np.asarray(
+        tracker_field.get_shaded_fraction(elevation, azimuth), dtype=float)
+
+    tracker_elevation = np.where(np.isnan(shaded_fraction), np.nan, elevation)
+    tracker_azimuth = np.where(np.isnan(shaded_fraction), np.nan, azimuth)
+    cos_aoi = np.where(np.isnan(shaded_fraction), np.nan, 1.)
+
+    # Solar positions that are partially shaded when tracking the sun. Below
+    # the horizon line of a sloped field, the sun is blocked by the ground.
+    labels = tracker_field._classify_solar_positions(elevation, azimuth)
+    search = (shaded_fraction > 0) & (labels == shading._NEEDS_GEOMETRY)
+
+    # Only search once for each (rounded) solar position
+    positions, inverse = np.unique(
+        np.round(np.column_stack([elevation[search], azimuth[search]]) / resolution),
+        axis=0, return_inverse=True)
+    positions = positions * resolution
+    best_offset = _search_orientation(
+        tracker_field, positions[:, 0], positions[:, 1], max_azimuth_offset,
+        grid_size, n_refinements)[inverse.ravel()]
+
+    # The offset from tracking the sun is applied to the actual solar
+    # positions, which are evaluated once more
+    search_elevation, search_azimuth = elevation[search], azimuth[search]
+    search_tracker_elevation = search_elevation \
+        + best_offset[:, 0] * (90 - search_elevation)
+    search_tracker_azimuth = search_azimuth + best_offset[:, 1] * max_azimuth_offset
+    search_shaded_fraction, search_cos_aoi = _orientation_shaded_fraction(
+        tracker_field, search_elevation, search_azimuth, search_tracker_elevation,
+        search_tracker_azimuth)
+    better = (1 - search_shaded_fraction) * np.clip(search_cos_aoi, 0, None) \
+        > 1 - shaded_fraction[search]
+    search[search] = better
+    tracker_elevation[search] = search_tracker_elevation[better]
+    tracker_azimuth[search] = search_tracker_azimuth[better]
+    shaded_fraction[search] = search_shaded_fraction[better]
+    cos_aoi[search] = search_cos_aoi[better]
+
+    orientation = pd.DataFrame({
+        'tracker_elevation': tracker_elevation,
+        'tracker_azimuth': np.mod(tracker_azimuth, 360),
+        'shaded_fraction': shaded_fraction,
+        'cos_aoi': cos_aoi})
+    if isinstance(solar_elevation, pd.Series):
+        orientation.index = solar_elevation.index
+    return orientation
+
+
+def _search_orientation(tracker_field, solar_elevation, solar_azimuth,
+                        max_azimuth_offset, grid_size, n_refinements):
+    """Coarse-to-fine grid search of the tracker orientation, vectorized
+    across solar positions.
+
+    Returns the best orientation of each solar position as the normalized
+    offsets from tracking the sun, i.e., the fractions of the elevation
+    span up to 90° and of ``max_azimuth_offset``.
+    """
+    # The search is done in normalized coordinates, where (0, 0) corresponds
+    # to tracking the sun and (1, +/-1) to the maximum offsets in elevation
+    # and azimuth. The first grid spans the entire search space.
+    elevation_span = 90 - solar_elevation
+    steps = np.linspace(-1, 1, grid_size)
+    elevation_grid, azimuth_grid = np.meshgrid(steps, steps, indexing='ij')
+    grid = np.stack([elevation_grid.ravel(), azimuth_grid.ravel()], axis=-1)
+    grid_center = np.tile([0.5, 0], (len(solar_elevation), 1))
+    half_width = np.array([0.5, 1])
+    # The best orientation so far is always included as a candidate, starting
+    # with tracking the sun
+    center = np.zeros((len(solar_elevation), 2))
+    for _ in range(n_refinements + 1):
+        candidates = np.concatenate([
+            center[:, np.newaxis, :],
+            grid_center[:, np.newaxis, :] + half_width * grid], axis=1)
+        candidates[..., 0] = np.clip(candidates[..., 0], 0, 1)
+        candidates[..., 1] = np.clip(candidates[..., 1], -1, 1)
+
+        n_candidates = candidates.shape[1]
+        tracker_elevation = (solar_elevation[:, np.newaxis]
+                             + candidates[..., 0] * elevation_span[:, np.newaxis]).ravel()
+        tracker_azimuth = (solar_azimuth[:, np.newaxis]
+                           + candidates[..., 1] * max_azimuth_offset).ravel()
+        shaded_fraction, cos_aoi = _orientation_shaded_fraction(
+            tracker_field, np.repeat(solar_elevation, n_candidates),
+            np.repeat(solar_azimuth, n_candidates), tracker_elevation,
+            tracker_azimuth)
+        objective = ((1 - shaded_fraction) * np.clip(cos_aoi, 0, None)).reshape(
+            -1, n_candidates)
+        best = np.argmax(objective, axis=1)
+        center = grid_center = candidates[np.arange(len(center)), best]
+        # The refined grid spans the neighboring grid points of the best one
+        half_width = half_width * 2 / (grid_size - 1)
+    return center
@@ -0,0 +1,156 @@
+"""
+The `cli` module contains the ``twoaxistracking`` command-line entry point for
+running batch shading simulations from files, e.g., from a job scheduler.
+
+The tracker field is specified by a JSON configuration file with the
+parameters of :py:class:`twoaxistracking.TrackerField`, where the collector
+geometries are given as WKT strings or GeoJSON geometry objects, e.g.::
+
+    {
+        "total_collector_geometry": "POLYGON ((-2 -1, 2 -1, 2 1, -2 1, -2 -1))",
+        "active_collector_geometry": {"type": "Polygon", "coordinates": [...]},
+        "neighbor_order": 2,
+        "gcr": 0.3,
+        "layout_type": "square"
+    }
+
+The solar positions are read from a columnar file, and the input columns
+and the shaded fraction are written to a columnar file, see
+:py:mod:`twoaxistracking.io` for the supported formats. The command-line
+interface requires pyarrow.
+"""
+
+from twoaxistracking import io, lookup, trackerfield
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import time
+import numpy as np
+import shapely
+
+
+_GEOMETRY_PARAMETERS = ('total_collector_geometry', 'active_collector_geometry')
+
+
+def _parse_geometry(geometry):
+    """Convert a WKT string or a GeoJSON geometry object to a geometry."""
+    if isinstance(geometry, str):
+        return shapely.from_wkt(geometry)
+    return shapely.geometry.shape(geometry)
+
+
+def read_field_config(filename):
+    """Create a tracker field from a JSON configuration file.
+
+    Parameters
+    ----------
+    filename : path-like
+        Path of the JSON file with the parameters of
+        :py:class:`twoaxistracking.TrackerField`. The collector geometries
+        (including ``neighbor_geometries``) are specified as WKT strings or
+        GeoJSON geometry objects.
+
+    Returns
+    -------
+    tracker_field : :py:class:`twoaxistracking.TrackerField`
+    """
+    with open(filename) as f:
+        config = json.load(f)
+    for name in _GEOMETRY_PARAMETERS:
+        config[name] = _parse_geometry(config[name])
+    if config.get('neighbor_geometries') is not None:
+        config['neighbor_geometries'] = [
+            _parse_geometry(geometry) for geometry in config['neighbor_geometries']]
+    return trackerfield.TrackerField(**config)
+
+
+def _chunked_shaded_fraction(get_shaded_fraction, solar_elevation, solar_azimuth,
+                             max_workers, chunk_size):
+    """Calculate the shaded fraction in chunks of solar positions using a
+    pool of threads."""
+    if chunk_size is None:
+        chunk_size = max(len(solar_elevation), 1)
+    chunks = range(0, len(solar_elevation), chunk_size)
+    with ThreadPoolExecutor(max_workers) as executor:
+        results = executor.map(
+            lambda start: get_shaded_fraction(solar_elevation[start:start + chunk_size],
+                                              solar_azimuth[start:start + chunk_size]),
+            chunks)
+        return np.concatenate([np.empty(0)] + list(results))
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog='twoaxistracking',
+        description='Calculate the shaded fraction of a two-axis tracker field for a '
+                    'file of solar positions.')
+    parser.add_argument('config', help='JSON file with the tracker field parameters')
+    parser.add_argument('solar_position',
+                        help='Parquet, Arrow, or CSV file, or directory of .npy files with '
+                             'the solar positions')
+    parser.add_argument('output',
+                        help='Parquet, Arrow, or CSV file, or directory of .npy files to '
+                             'write the results to')
+    parser.add_argument('--elevation-column', default='elevation',
+                        help='column with the solar elevation angles (default: %(default)s)')
+    parser.add_argument('--azimuth-column', default='azimuth',
+                        help='column with the solar azimuth angles (default: %(default)s)')
+    parser.add_argument('--engine', choices=['geometric', 'lookup'], default='geometric',
+                        help='geometric shading calculation or interpolation in an '
+                             'adaptive lookup table (default: %(default)s)')
+    parser.add_argument('--lookup-tolerance', type=float, default=0.01,
+                        help='maximum interpolation error of the lookup table, checked at '
+                             'a finite number of points (default: %(default)s)')
+    parser.add_argument('--max-workers', type=int, default=1,
+                        help='number of threads (default: %(default)s)')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='number of solar positions per chunk (default: all)')
+    return parser
+
+
+def main(argv=None):
+    """Run the ``twoaxistracking`` command-line interface.
+
+    Parameters
+    ----------
+    argv : list of str, optional
+        Command-line arguments. If None, the arguments of the process are
+        used.
+
+    Returns
+    -------
+    exit_code : int
+        Zero if the simulation was successful.
+    """
+    import pyarrow as pa
+
+    args = _parser().parse_args(argv)
+    start = time.perf_counter()
+    tracker_field = read_field_config(args.config)
+    table = io.read_table(args.solar_position)
+    solar_elevation, solar_azimuth = io.solar_position_arrays(
+        table, args.elevation_column, args.azimuth_column)
+
+    shading_start = time.perf_counter()
+    if args.engine == 'lookup':
+        lookup_table = lookup.ShadingLookupTable(tracker_field, tolerance=args.lookup_tolerance)
+        shaded_fraction = _chunked_shaded_fraction(
+            lookup_table.get_shaded_fraction, solar_elevation, solar_azimuth,
+            args.max_workers, args.chunk_size)
+    else:
+        shaded_fraction = tracker_field.get_shaded_fraction(
+            solar_elevation, solar_azimuth, max_workers=args.max_workers,
+            chunk_size=args.chunk_size)
+    shading_runtime = time.perf_counter() - shading_start
+
+    io.write_table(table.append_column('shaded_fraction', pa.array(shaded_fraction)),
+                   args.output)
+    runtime = time.perf_counter() - start
+    print(f'Calculated the shaded fraction of {table.num_rows} timestamps in '
+          f'{shading_runtime:.3f} s ({table.num_rows / max(shading_runtime, 1e-9):.0f} '
+          f'timestamps/s). Total runtime including I/O: {runtime:.3f} s.')
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,74 @@
+"""
+The `electrical` module contains functions for estimating the electrical
+shading loss from the shaded fraction of the individual cells of a
+collector. The electrical loss is generally higher than the geometric
+shaded fraction, as the current of series-connected cells is limited by the
+most shaded cell.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def electrical_shaded_fraction(cell_shaded_fraction, substring_index,
+                               diffuse_fraction=0):
+    """Estimate the electrical shading loss of a string of bypass-diode
+    protected substrings.
+
+    Each substring consists of series-connected cells and is protected by a
+    bypass diode. The current of a substring is limited by its least
+    irradiated cell. The substrings are connected in series, and the string
+    operates at the current that maximizes its power, with substrings that
+    cannot carry the string current being bypassed.
+
+    Parameters
+    ----------
+    cell_shaded_fraction : 2D array-like
+        Shaded fraction of each cell with the solar positions as rows and the
+        cells as columns, e.g., as returned by
+        :py:meth:`twoaxistracking.TrackerField.get_cell_shaded_fraction`.
+    substring_index : array-like of ints
+        Index of the substring that each cell belongs to.
+    diffuse_fraction : float or array-like, default : 0
+        Fraction of the irradiance that is diffuse and thus still reaches the
+        shaded part of the cells. Can be specified for each solar position.
+
+    Returns
+    -------
+    electrical_shaded_fraction : array or pandas.Series
+        Relative reduction in the power of the string compared to the
+        unshaded string for each solar position. A Series is returned if
+        ``cell_shaded_fraction`` is a pandas DataFrame.
+
+    Notes
+    -----
+    The power of a string with the substring currents :math:`I_1 \\geq I_2
+    \\geq ... \\geq I_n` is estimated as :math:`\\max_j(j \\cdot I_j)`, i.e.,
+    assuming that all active substrings operate at the same voltage and that
+    the bypass diodes are ideal. The cell current is assumed proportional to
+    the irradiance.
+    """
+    shaded_fraction = np.asarray(cell_shaded_fraction, dtype=float)
+    diffuse_fraction = np.asarray(diffuse_fraction, dtype=float)
+    if diffuse_fraction.ndim == 1:
+        diffuse_fraction = diffuse_fraction[:, np.newaxis]
+    # Relative irradiance (and thus current) of each cell
+    cell_current = 1 - shaded_fraction * (1 - diffuse_fraction)
+
+    # The substring current is the minimum of its cell currents
+    order = np.argsort(substring_index, kind='stable')
+    sorted_index = np.asarray(substring_index)[order]
+    substring_start = np.flatnonzero(np.r_[True, np.diff(sorted_index) != 0])
+    substring_current = np.minimum.reduceat(
+        cell_current[:, order], substring_start, axis=1)
+
+    # For each possible string current (one of the substring currents), the
+    # power is proportional to the number of substrings carrying it
+    n_substrings = substring_current.shape[1]
+    substring_current = -np.sort(-substring_current, axis=1)
+    string_power = np.max(substring_current * np.arange(1, n_substrings + 1), axis=1)
+    electrical_shaded_fraction = 1 - string_power / n_substrings
+
+    if isinstance(cell_shaded_fraction, pd.DataFrame):
+        return pd.Series(electrical_shaded_fraction, index=cell_shaded_fraction.index)
+    return electrical_shaded_fraction
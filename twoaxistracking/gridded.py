@@ -0,0 +1,59 @@
+"""
+The `gridded` module contains functions for calculating the shaded fraction
+of gridded solar positions stored as xarray DataArrays, e.g., solar position
+cubes with latitude, longitude, and time dimensions. Dask-backed DataArrays
+are evaluated lazily and blockwise.
+
+The module requires the optional dependencies xarray and, for lazy
+evaluation, dask.
+"""
+
+import numpy as np
+
+
+def _block_shaded_fraction(solar_elevation, solar_azimuth, tracker_field):
+    """Calculate the shaded fraction of one block of solar positions."""
+    solar_elevation, solar_azimuth = np.broadcast_arrays(solar_elevation, solar_azimuth)
+    shaded_fraction = tracker_field.get_shaded_fraction(
+        solar_elevation.ravel(), solar_azimuth.ravel())
+    return np.asarray(shaded_fraction, dtype=float).reshape(solar_elevation.shape)
+
+
+def gridded_shaded_fraction(tracker_field, solar_elevation, solar_azimuth):
+    """Calculate the shaded fraction of gridded solar positions.
+
+    The shaded fraction is calculated blockwise using the vectorized
+    :py:meth:`twoaxistracking.TrackerField.get_shaded_fraction`. If the
+    inputs are backed by dask arrays, the calculation is lazy and each chunk
+    is evaluated independently when computed, so that solar position cubes
+    larger than memory can be processed with any dask scheduler.
+
+    Parameters
+    ----------
+    tracker_field : :py:class:`twoaxistracking.TrackerField`
+        Tracker field for which to calculate the shaded fraction.
+    solar_elevation : xarray.DataArray
+        Solar elevation angles in degrees.
+    solar_azimuth : xarray.DataArray
+        Solar azimuth angles in degrees. Broadcast against
+        ``solar_elevation``.
+
+    Returns
+    -------
+    shaded_fraction : xarray.DataArray
+        Shaded fraction named ``shaded_fraction`` with the broadcast dimensions
+        and coordinates of the inputs. The result is dask-backed if either
+        input is dask-backed.
+
+    Notes
+    -----
+    The tracker field is passed to each task and is pickled when using a
+    process-based or distributed scheduler.
+    """
+    import xarray as xr
+
+    shaded_fraction = xr.apply_ufunc(
+        _block_shaded_fraction, solar_elevation, solar_azimuth,
+        kwargs={'tracker_field': tracker_field},
+        dask='parallelized', output_dtypes=[float])
+    return shaded_fraction.rename('shaded_fraction')
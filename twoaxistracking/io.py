@@ -0,0 +1,290 @@
+"""
+The `io` module contains functions for reading solar positions from and
+writing shading results to columnar files without converting the columns to
+pandas objects or Python lists. The columns are read as Arrow tables, and the
+solar position columns are passed to the shading calculation as NumPy views
+of the Arrow buffers wherever possible.
+
+The supported formats are determined from the path:
+
+* ``.parquet``: Parquet file.
+* ``.arrow``, ``.feather``: Arrow IPC file, which is memory-mapped when read
+  (written uncompressed).
+* ``.csv``: CSV file, read and written by the multithreaded Arrow CSV
+  reader and writer.
+* A directory: one memory-mapped ``.npy`` file per column, named
+  ``<column>.npy``.
+
+The functions of the module require the optional dependency pyarrow, which
+is imported when the functions are called.
+"""
+
+from twoaxistracking import shading
+from shapely import geometry
+import pathlib
+import numpy as np
+import shapely
+
+
+def _file_format(path):
+    """Determine the file format from the path."""
+    path = pathlib.Path(path)
+    if path.is_dir() or (path.suffix == ''):
+        return 'npy'
+    suffix = path.suffix.lower()
+    if suffix in ('.arrow', '.feather'):
+        return 'arrow'
+    if suffix in ('.parquet', '.csv'):
+        return suffix[1:]
+    raise ValueError(f'Unsupported file format: {path.suffix}')
+
+
+def read_table(source, columns=None):
+    """Read a columnar file as an Arrow table.
+
+    Parameters
+    ----------
+    source : path-like
+        Parquet, Arrow IPC, or CSV file, or a directory of ``.npy`` files.
+    columns : list of str, optional
+        Columns to read. All columns are read if not specified.
+
+    Returns
+    -------
+    table : pyarrow.Table
+    """
+    import pyarrow as pa
+
+    file_format = _file_format(source)
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_table(source, columns=columns, memory_map=True)
+    if file_format == 'arrow':
+        import pyarrow.feather as feather
+        return feather.read_table(source, columns=columns, memory_map=True)
+    if file_format == 'csv':
+        import pyarrow.csv as csv
+        return csv.read_csv(source, convert_options=csv.ConvertOptions(
+            include_columns=columns))
+    if columns is None:
+        columns = sorted(path.stem for path in pathlib.Path(source).glob('*.npy'))
+    # Numeric arrays are wrapped by Arrow without copying the memory map
+    return pa.table({name: np.load(pathlib.Path(source) / f'{name}.npy', mmap_mode='r')
+                     for name in columns})
+
+
+def write_table(table, destination):
+    """Write an Arrow table to a columnar file.
+
+    Parameters
+    ----------
+    table : pyarrow.Table
+        Table to write.
+    destination : path-like
+        Parquet, Arrow IPC, or CSV file, or a directory, in which case each
+        column is written to a separate ``.npy`` file.
+    """
+    file_format = _file_format(destination)
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, destination)
+    elif file_format == 'arrow':
+        import pyarrow.feather as feather
+        # Uncompressed files can be memory-mapped when read
+        feather.write_feather(table, destination, compression='uncompressed')
+    elif file_format == 'csv':
+        import pyarrow.csv as csv
+        csv.write_csv(table, destination)
+    else:
+        pathlib.Path(destination).mkdir(parents=True, exist_ok=True)
+        for name, column in zip(table.column_names, table.columns):
+            values = column.to_numpy()
+            if values.dtype == object:
+                # Fixed-width strings can be memory-mapped, unlike objects
+                values = values.astype(str)
+            np.save(pathlib.Path(destination) / f'{name}.npy', values)
+
+
+def _column_values(table, name):
+    """Return a column of an Arrow table as a float array, without copying
+    if the column consists of a single chunk of doubles without nulls."""
+    import pyarrow as pa
+
+    column = table.column(name)
+    if column.type != pa.float64():
+        column = column.cast(pa.float64())
+    # Null values are converted to nan
+    return column.to_numpy()
+
+
+def solar_position_arrays(table, elevation_column='elevation', azimuth_column='azimuth'):
+    """Get the solar elevation and azimuth angles of an Arrow table as arrays.
+
+    Parameters
+    ----------
+    table : pyarrow.Table
+        Table with the solar positions.
+    elevation_column : str, default : 'elevation'
+        Column with the solar elevation angles in degrees.
+    azimuth_column : str, default : 'azimuth'
+        Column with the solar azimuth angles in degrees.
+
+    Returns
+    -------
+    solar_elevation, solar_azimuth : arrays of floats
+        Views of the Arrow buffers if the columns consist of single chunks of
+        doubles without nulls, otherwise copies.
+    """
+    return _column_values(table, elevation_column), _column_values(table, azimuth_column)
+
+
+def shaded_fraction_table(tracker_field, table, elevation_column='elevation',
+                          azimuth_column='azimuth'):
+    """Calculate the shaded fraction for the solar positions of an Arrow table.
+
+    Parameters
+    ----------
+    tracker_field : :py:class:`twoaxistracking.TrackerField` or ShadingLookupTable
+        Tracker field or :py:class:`twoaxistracking.lookup.ShadingLookupTable`
+        for which to calculate the shaded fraction.
+    table : pyarrow.Table
+        Table with the solar positions, e.g., as returned by
+        :py:func:`read_table`.
+    elevation_column : str, default : 'elevation'
+        Column with the solar elevation angles in degrees.
+    azimuth_column : str, default : 'azimuth'
+        Column with the solar azimuth angles in degrees.
+
+    Returns
+    -------
+    table : pyarrow.Table
+        The input table with the shaded fraction appended as the column
+        ``shaded_fraction``. The input columns are not copied.
+    """
+    import pyarrow as pa
+
+    solar_elevation, solar_azimuth = solar_position_arrays(
+        table, elevation_column, azimuth_column)
+    shaded_fraction = np.asarray(
+        tracker_field.get_shaded_fraction(solar_elevation, solar_azimuth), dtype=float)
+    return table.append_column('shaded_fraction', pa.array(shaded_fraction))
+
+
+# Field metadata of the GeoArrow WKB extension type, so that geospatial tools
+# recognize the columns as geometries
+_GEOARROW_WKB_METADATA = {b'ARROW:extension:name': b'geoarrow.wkb',
+                          b'ARROW:extension:metadata': b'{}'}
+
+
+def _shading_geometry_schema():
+    """Schema of the shading geometry tables."""
+    import pyarrow as pa
+
+    return pa.schema([
+        pa.field('shaded_fraction', pa.float64()),
+        pa.field('unshaded_geometry', pa.binary(), metadata=_GEOARROW_WKB_METADATA),
+        pa.field('shading_geometry', pa.binary(), metadata=_GEOARROW_WKB_METADATA)])
+
+
+def shading_geometry_table(tracker_field, solar_elevation, solar_azimuth):
+    """Calculate the unshaded and shading geometries as an Arrow table.
+
+    The geometries of all solar positions are calculated in one batch and
+    encoded as WKB in binary columns, i.e., one packed buffer of WKB and an
+    array of offsets per column. The columns have the GeoArrow WKB extension
+    metadata (``geoarrow.wkb``).
+
+    Parameters
+    ----------
+    tracker_field : :py:class:`twoaxistracking.TrackerField`
+        Tracker field for which to calculate the geometries.
+    solar_elevation : array-like
+        Solar elevation angles in degrees.
+    solar_azimuth : array-like
+        Solar azimuth angles in degrees.
+
+    Returns
+    -------
+    table : pyarrow.Table
+        Table with one row per solar position and the columns
+        ``shaded_fraction``, ``unshaded_geometry`` (the unshaded part of the
+        active collector geometry), and ``shading_geometry`` (a MultiPolygon
+        of the projected neighboring collectors close enough to shade the
+        reference collector, whose parts may overlap). The geometries are null when the
+        sun is below the horizon (night). When the sun is below the horizon of
+        a sloped field, the unshaded geometry is empty.
+    """
+    import pyarrow as pa
+
+    elevation = np.atleast_1d(np.asarray(solar_elevation, dtype=float)).ravel()
+    azimuth = np.atleast_1d(np.asarray(solar_azimuth, dtype=float)).ravel()
+    labels = tracker_field._classify_solar_positions(elevation, azimuth)
+    needs_geometry = labels == shading._NEEDS_GEOMETRY
+
+    unshaded_geometry = np.full(len(elevation), None, dtype=object)
+    unshaded_geometry[labels == shading._UNSHADED] = tracker_field.active_collector_geometry
+    unshaded_geometry[labels == shading._FULLY_SHADED] = geometry.Polygon()
+    unshaded_geometries, shading_geometries, position_index = \
+        tracker_field._unshaded_geometries(elevation[needs_geometry], azimuth[needs_geometry])
+    unshaded_geometry[needs_geometry] = unshaded_geometries
+
+    # The shading geometries of each solar position are collected into one
+    # MultiPolygon, which is empty for solar positions without shading
+    shading_geometry = np.full(len(elevation), None, dtype=object)
+    is_day = labels != shading._NIGHT
+    shading_geometry[is_day] = geometry.MultiPolygon()
+    shading_geometry = shapely.multipolygons(
+        shading_geometries, indices=np.flatnonzero(needs_geometry)[position_index],
+        out=shading_geometry)
+    shading_geometry[~is_day] = None
+
+    shaded_fraction = shading._SHADED_FRACTION_BY_LABEL[labels]
+    shaded_fraction[needs_geometry] = \
+        1 - shapely.area(unshaded_geometries) / tracker_field.active_collector_area
+    return pa.table([
+        pa.array(shaded_fraction),
+        pa.array(shapely.to_wkb(unshaded_geometry), type=pa.binary()),
+        pa.array(shapely.to_wkb(shading_geometry), type=pa.binary())],
+        schema=_shading_geometry_schema())
+
+
+def write_shading_geometries(tracker_field, solar_elevation, solar_azimuth, destination,
+                             chunk_size=10000):
+    """Write the unshaded and shading geometries of a time series to a file.
+
+    The geometries are calculated in chunks of solar positions with
+    :py:func:`shading_geometry_table`, and each chunk is written as a record
+    batch, so only the geometries of one chunk are held in memory as shapely
+    objects.
+
+    Parameters
+    ----------
+    tracker_field : :py:class:`twoaxistracking.TrackerField`
+        Tracker field for which to calculate the geometries.
+    solar_elevation : array-like
+        Solar elevation angles in degrees.
+    solar_azimuth : array-like
+        Solar azimuth angles in degrees.
+    destination : path-like
+        Parquet or Arrow IPC file.
+    chunk_size : int, default : 10000
+        Number of solar positions per chunk.
+    """
+    import pyarrow as pa
+
+    file_format = _file_format(destination)
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(destination, _shading_geometry_schema())
+    elif file_format == 'arrow':
+        writer = pa.ipc.new_file(destination, _shading_geometry_schema())
+    else:
+        raise ValueError('The shading geometries can only be written to Parquet or '
+                         'Arrow IPC files.')
+    elevation = np.atleast_1d(np.asarray(solar_elevation, dtype=float)).ravel()
+    azimuth = np.atleast_1d(np.asarray(solar_azimuth, dtype=float)).ravel()
+    with writer:
+        for start in range(0, len(elevation), chunk_size):
+            writer.write_table(shading_geometry_table(
+                tracker_field, elevation[start:start + chunk_size],
+                azimuth[start:start + chunk_size]))
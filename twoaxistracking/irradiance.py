@@ -0,0 +1,120 @@
+"""
+The `irradiance` module contains functions for converting the shaded
+fraction into shading losses of the direct and diffuse irradiance on the
+collector plane.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Number of patches in each 12° elevation band of the Tregenza sky
+# discretization, starting from the horizon. The zenith is covered by a
+# single circular patch.
+TREGENZA_BAND_PATCHES = [30, 30, 24, 24, 18, 12, 6]
+
+
+def _sky_patches(n_patches=145):
+    """Discretize the sky dome into patches.
+
+    The Tregenza discretization (145 patches) and its Reinhart subdivisions
+    are supported. A Reinhart subdivision with a subdivision factor MF splits
+    each Tregenza band into MF bands with MF times as many patches, which
+    results in 144*MF**2 + 1 patches, e.g., 577 or 2305.
+
+    Parameters
+    ----------
+    n_patches : int, default : 145
+        Number of sky patches.
+
+    Returns
+    -------
+    elevation : array of floats
+        Elevation angle of the center of each sky patch [degrees]
+    azimuth : array of floats
+        Azimuth angle of the center of each sky patch [degrees]
+    weight : array of floats
+        Fraction of the diffuse horizontal irradiance from an isotropic sky
+        that originates from each sky patch. Sums to one.
+    """
+    subdivisions = np.sqrt((n_patches - 1) / 144)
+    if (subdivisions < 1) or (subdivisions != int(subdivisions)):
+        raise ValueError('The number of sky patches must be 145 (Tregenza) or '
+                         'a Reinhart subdivision (144*MF**2 + 1).')
+    subdivisions = int(subdivisions)
+    n_bands = len(TREGENZA_BAND_PATCHES) * subdivisions
+    band_width = 90 / (n_bands + 0.5)
+    elevation, azimuth, weight = [], [], []
+    for band in range(n_bands):
+        n_band_patches = TREGENZA_BAND_PATCHES[band // subdivisions] * subdivisions
+        lower = np.deg2rad(band * band_width)
+        upper = np.deg2rad((band + 1) * band_width)
+        elevation.append(np.full(n_band_patches, (band + 0.5) * band_width))
+        azimuth.append(np.arange(n_band_patches) * 360 / n_band_patches)
+        # The contribution of a patch to the horizontal irradiance is the
+        # integral of sin(elevation) over the solid angle of the patch
+        weight.append(np.full(n_band_patches,
+                              (np.sin(upper)**2 - np.sin(lower)**2) / n_band_patches))
+    # Circular patch at the zenith
+    elevation.append([90])
+    azimuth.append([0])
+    weight.append([1 - np.sin(np.deg2rad(90 - band_width / 2))**2])
+    return (np.concatenate(elevation), np.concatenate(azimuth),
+            np.concatenate(weight))
+
+
+def effective_irradiance(tracker_field, solar_elevation, solar_azimuth, dni,
+                         dhi, n_patches=145):
+    """Calculate the irradiance on the unshaded collector area.
+
+    The direct irradiance is reduced by the shaded fraction of the solar
+    position, whereas the sky diffuse irradiance is reduced by the diffuse
+    shading factor of the field, see
+    :py:meth:`twoaxistracking.TrackerField.diffuse_shading_factor`.
+
+    Parameters
+    ----------
+    tracker_field : :py:class:`twoaxistracking.TrackerField`
+        Tracker field for which to calculate the effective irradiance.
+    solar_elevation : array-like
+        Solar elevation angles in degrees.
+    solar_azimuth : array-like
+        Solar azimuth angles in degrees.
+    dni : array-like
+        Direct normal irradiance [W/m^2]
+    dhi : array-like
+        Diffuse horizontal irradiance [W/m^2]
+    n_patches : int, default : 145
+        Number of sky patches used for calculating the diffuse shading factor.
+
+    Returns
+    -------
+    irradiance : pandas.DataFrame
+        DataFrame with the columns ``poa_global``, ``poa_direct``, and
+        ``poa_diffuse`` representing the effective irradiance on the collector
+        plane. The index is the same as ``solar_elevation`` if it is a
+        pandas Series.
+
+    Notes
+    -----
+    The collector plane is assumed to be normal to the sun, such that the
+    collector tilt equals the solar zenith angle. The sky diffuse irradiance
+    on the collector plane is calculated assuming an isotropic sky, and
+    ground-reflected irradiance is neglected. The shaded fraction is nan when
+    the sun is below the horizon, in which case the direct irradiance is set
+    to zero.
+    """
+    elevation = np.asarray(solar_elevation, dtype=float)
+    shaded_fraction = np.asarray(
+        tracker_field.get_shaded_fraction(elevation, np.asarray(solar_azimuth)),
+        dtype=float)
+    poa_direct = np.asarray(dni) * (1 - np.nan_to_num(shaded_fraction, nan=1))
+    # Isotropic sky diffuse on a plane with a tilt equal to the zenith angle
+    tilt = 90 - np.clip(elevation, 0, 90)
+    poa_sky_diffuse = np.asarray(dhi) * (1 + np.cos(np.deg2rad(tilt))) / 2
+    poa_diffuse = poa_sky_diffuse * (1 - tracker_field.diffuse_shading_factor(n_patches))
+
+    index = solar_elevation.index if isinstance(solar_elevation, pd.Series) else None
+    return pd.DataFrame({'poa_global': poa_direct + poa_diffuse,
+                         'poa_direct': poa_direct,
+                         'poa_diffuse': poa_diffuse}, index=index)
@@ -18,7 +18,7 @@ def _calculate_min_tracker_spacing(collector_geometry):
 
 def generate_field_layout(gcr, total_collector_area, min_tracker_spacing,
                           neighbor_order, aspect_ratio, offset, rotation,
-                          slope_azimuth=0, slope_tilt=0):
+                          slope_azimuth=0, slope_tilt=0, min_solar_elevation=None):
     """
     Generate a regularly-spaced collector field layout.
 
@@ -49,6 +49,11 @@ def generate_field_layout(gcr, total_collector_area, min_tracker_spacing,
         Direction of normal to slope on horizontal [degrees]
     slope_tilt : float, optional
         Tilt of slope relative to horizontal [degrees]
+    min_solar_elevation : float, optional
+        Minimum solar elevation angle for which shading is to be calculated
+        [degrees]. If specified, neighboring collectors that cannot shade the
+        reference collector for solar elevation angles above
+        ``min_solar_elevation`` are removed from the layout.
 
     Returns
     -------
@@ -74,31 +79,86 @@ def generate_field_layout(gcr, total_collector_area, min_tracker_spacing,
     .. [1] `Shading and land use in regularly-spaced sun-tracking collectors, Cumpston & Pye.
        <https://doi.org/10.1016/j.solener.2014.06.012>`_
     """
+    field_layouts = generate_field_layouts(
+        gcr=gcr, total_collector_area=total_collector_area,
+        min_tracker_spacing=min_tracker_spacing, neighbor_order=neighbor_order,
+        aspect_ratio=aspect_ratio, offset=offset, rotation=rotation,
+        slope_azimuth=slope_azimuth, slope_tilt=slope_tilt,
+        min_solar_elevation=min_solar_elevation)
+    return tuple(field_layout[0] for field_layout in field_layouts)
+
+
+def generate_field_layouts(gcr, total_collector_area, min_tracker_spacing,
+                           neighbor_order, aspect_ratio, offset, rotation,
+                           slope_azimuth=0, slope_tilt=0, min_solar_elevation=None):
+    """
+    Generate multiple regularly-spaced collector field layouts at once.
+
+    Batched version of :py:func:`generate_field_layout`, where the layout
+    parameters ``gcr``, ``aspect_ratio``, ``offset``, and ``rotation`` can be
+    arrays. The parameters are broadcast against each other, and the layouts
+    are returned as 2D arrays with the layouts as rows and the neighboring
+    collectors as columns.
+
+    Parameters
+    ----------
+    gcr: float or array-like
+        Ground cover ratio. Ratio of collector area to ground area.
+    total_collector_area: float
+        Surface area of one collector.
+    min_tracker_spacing: float
+        Minimum distance between collectors.
+    neighbor_order: int
+        Order of neighbors to include in layout.
+    aspect_ratio: float or array-like
+        Ratio of the spacing in the primary direction to the secondary.
+    offset: float or array-like
+        Relative row offset in the secondary direction as fraction of the
+        spacing in the primary direction. -0.5 <= offset < 0.5.
+    rotation: float or array-like
+        Counterclockwise rotation of the field in degrees. 0 <= rotation < 180
+    slope_azimuth : float, optional
+        Direction of normal to slope on horizontal [degrees]
+    slope_tilt : float, optional
+        Tilt of slope relative to horizontal [degrees]
+    min_solar_elevation : float, optional
+        Minimum solar elevation angle for which shading is to be calculated
+        [degrees]. If specified, neighboring collectors that cannot shade the
+        reference collector in any of the layouts for solar elevation angles
+        above ``min_solar_elevation`` are removed.
+
+    Returns
+    -------
+    X, Y, Z, tracker_distance, relative_azimuth, relative_slope: 2D arrays of floats
+        See :py:func:`generate_field_layout`.
+    """
+    gcr, aspect_ratio, offset, rotation = [
+        np.atleast_1d(parameter).astype(float)[:, np.newaxis] for parameter in
+        np.broadcast_arrays(gcr, aspect_ratio, offset, rotation)]
+
     # Check parameters are within their ranges
-    if (offset < -0.5) | (offset >= 0.5):
+    if np.any((offset < -0.5) | (offset >= 0.5)):
         raise ValueError('The specified offset is outside the valid range.')
-    if (rotation < 0) | (rotation >= 180):
+    if np.any((rotation < 0) | (rotation >= 180)):
         raise ValueError('The specified rotation is outside the valid range.')
     # Check if Lmin is physically possible given the collector area.
     if (min_tracker_spacing < np.sqrt(4*total_collector_area/np.pi)):
         raise ValueError('Lmin is not physically possible.')
     # Check if mimimum and maximum ground cover ratios are exceded
     gcr_max = total_collector_area / (min_tracker_spacing**2 * np.sqrt(1-offset**2))
-    if (gcr < 0) or (gcr > gcr_max):
+    if np.any((gcr < 0) | (gcr > gcr_max)):
         raise ValueError('Maximum ground cover ratio exceded or less than 0.')
-    if aspect_ratio < np.sqrt(1-offset**2):
+    if np.any(aspect_ratio < np.sqrt(1-offset**2)):
         raise ValueError('Aspect ratio is too low and not feasible')
-    if aspect_ratio > total_collector_area/(gcr*min_tracker_spacing**2):
+    if np.any(aspect_ratio > total_collector_area/(gcr*min_tracker_spacing**2)):
         raise ValueError('Aspect ratio is too high and not feasible')
 
-    N = 1 + 2 * neighbor_order  # Number of collectors along each side
-
-    # Generation of X and Y arrays with coordinates
-    X = np.tile(np.arange(int(-N/2), int(N/2)+1), N)
-    Y = np.repeat(np.arange(int(-N/2), int(N/2)+1), N)
+    # Generation of X and Y arrays with the grid indices of the neighbors
+    indices = np.arange(-neighbor_order, neighbor_order + 1)
+    X, Y = np.meshgrid(indices, indices)
     # Remove reference collector point (origin)
-    X = np.delete(X, int(N**2/2))
-    Y = np.delete(Y, int(N**2/2))
+    is_neighbor = (X != 0) | (Y != 0)
+    X, Y = X[is_neighbor], Y[is_neighbor]
 
     # Add offset and implement aspect ratio. Note that it is important to first
     # calculate offset as it relies on the original X array.
@@ -124,7 +184,51 @@ def generate_field_layout(gcr, total_collector_area, min_tracker_spacing,
     relative_slope = np.rad2deg(np.arctan(-np.cos(np.deg2rad(slope_azimuth - relative_azimuth))
                                           * np.tan(np.deg2rad(slope_tilt))))
 
-    return X, Y, Z, tracker_distance, relative_azimuth, relative_slope
+    field_layouts = (X, Y, Z, tracker_distance, relative_azimuth, relative_slope)
+    if min_solar_elevation is not None:
+        can_shade = _can_shade(tracker_distance, relative_slope,
+                               min_tracker_spacing, min_solar_elevation)
+        field_layouts = tuple(
+            field_layout[:, can_shade.any(axis=0)] for field_layout in field_layouts)
+    return field_layouts
+
+
+def _can_shade(tracker_distance, relative_slope, min_tracker_spacing,
+               min_solar_elevation):
+    """Determine which neighboring collectors can shade the reference
+    collector for solar elevation angles above a minimum elevation.
+
+    The projected distance between a neighboring collector and the reference
+    collector is smallest when the neighbor is in the direction of the sun,
+    where it equals tracker_distance*sin(elevation-slope)/cos(slope), and it
+    cannot exceed the tracker distance. Shading can only occur when the
+    projected distance is less than the minimum tracker spacing.
+    """
+    elevation_difference = np.clip(min_solar_elevation - relative_slope, 0, 90)
+    min_projected_distance = tracker_distance * np.minimum(
+        np.sin(np.deg2rad(elevation_difference)) / np.cos(np.deg2rad(relative_slope)), 1)
+    return min_projected_distance < min_tracker_spacing
+
+
+def _required_neighbor_order(gcr, total_collector_area, min_tracker_spacing,
+                             aspect_ratio, offset, slope_tilt, min_solar_elevation):
+    """Calculate the neighbor order that includes all neighboring collectors
+    that can cast shade for solar elevation angles above a minimum elevation.
+
+    The furthest distance at which a neighboring collector can cast shade
+    occurs when it is higher than the reference collector by the full
+    slope_tilt, see :py:func:`_can_shade`.
+    """
+    if min_solar_elevation <= slope_tilt:
+        raise ValueError('The minimum solar elevation must be greater than the '
+                         'slope tilt.')
+    max_distance = min_tracker_spacing * np.cos(np.deg2rad(slope_tilt)) / \
+        np.sin(np.deg2rad(min(min_solar_elevation, 90) - slope_tilt))
+    # Spacing between collectors in the primary and secondary direction
+    scaling = np.sqrt(total_collector_area / (gcr * aspect_ratio))
+    max_primary_index = max_distance / (aspect_ratio * scaling)
+    max_secondary_index = max_distance / scaling + abs(offset) * max_primary_index
+    return int(np.ceil(max(max_primary_index, max_secondary_index)))
 
 
 def max_shading_elevation(total_collector_geometry, tracker_distance,
@@ -164,6 +268,9 @@ def max_shading_elevation(total_collector_geometry, tracker_distance,
     whereas for other geometries, the returned elevation is a conservative
     estimate.
     """
+    # Without neighboring collectors, shading cannot occur
+    if len(tracker_distance) == 0:
+        return 0
     # Calculate extent of box bounding the total collector geometry
     x_min, y_min, x_max, y_max = total_collector_geometry.bounds
     # Collector rectangular bounding box dimensions
@@ -0,0 +1,237 @@
+"""
+The `lookup` module contains a lookup table of the shaded fraction over the
+solar elevation and azimuth angles, which is adaptively refined where the
+shaded fraction varies. Long time series can then be answered by
+interpolation instead of the geometric shading calculation.
+"""
+
+from twoaxistracking import shading, trackerfield
+import numpy as np
+import shapely
+
+
+class ShadingLookupTable:
+    """
+    Adaptively refined lookup table of the shaded fraction of a tracker field.
+
+    The sky between the horizon and the maximum shading elevation is divided
+    into a uniform grid of root cells, which are recursively split into four
+    cells (a quadtree) where bilinear interpolation between the cell corners
+    does not reproduce the shaded fraction within the tolerance. The
+    interpolation error of a cell is checked at its center, the midpoints
+    of its edges, which become the corners of the four cells if the cell is
+    split, and the centers of the four cells. Therefore, the shaded fraction
+    is only calculated once for each point and in one batched calculation
+    per level of refinement. The
+    shading by the horizon is not included in the table, as it is
+    discontinuous, but is applied exactly when looking up solar positions.
+
+    Parameters
+    ----------
+    tracker_field : :py:class:`twoaxistracking.TrackerField`
+        Tracker field for which to create the lookup table.
+    tolerance : float, default : 0.01
+        Maximum interpolation error of the shaded fraction [unitless]. The
+        cells are split until the error at the checked points is within half
+        the tolerance, which keeps the error between the checked points
+        within the tolerance.
+    max_depth : int, default : 6
+        Maximum number of times the root cells are split.
+    elevation_step : float, default : 5
+        Maximum height of the root cells [degrees]
+    azimuth_step : float, default : 15
+        Width of the root cells [degrees]
+
+    Attributes
+    ----------
+    n_evaluations : int
+        Number of solar positions for which the shaded fraction was
+        calculated when creating the lookup table.
+    n_cells : int
+        Number of cells that are not split further (leaves of the quadtree).
+
+    Notes
+    -----
+    The solar positions that are at night, below the horizon, or above the
+    maximum shading elevation are classified exactly as in
+    :py:meth:`twoaxistracking.TrackerField.get_shaded_fraction`, and only
+    the remaining solar positions are interpolated. The error is only checked
+    at a finite number of points, so the tolerance is not a strict bound:
+    shading features smaller than a root cell may not be detected, and cells
+    at ``max_depth`` are not split further even if the error exceeds the
+    tolerance.
+    """
+
+    def __init__(self, tracker_field, tolerance=0.01, max_depth=6,
+                 elevation_step=5, azimuth_step=15):
+        self.tracker_field = tracker_field
+        self.tolerance = tolerance
+        self.max_depth = max_depth
+
+        max_elevation = tracker_field.max_shading_elevation
+        n_elevation = max(int(np.ceil(max_elevation / elevation_step)), 1)
+        n_azimuth = int(np.ceil(360 / azimuth_step))
+        self._root_shape = (n_elevation, n_azimuth)
+        self._root_size = (max_elevation / n_elevation, 360 / n_azimuth)
+        elevation_edges = np.linspace(0, max_elevation, n_elevation + 1)
+        azimuth_edges = np.linspace(0, 360, n_azimuth + 1)
+        # The root cells are ordered row-major by elevation and azimuth index
+        lower_elevation, left_azimuth = [
+            edges.ravel() for edges in np.meshgrid(
+                elevation_edges[:-1], azimuth_edges[:-1], indexing='ij')]
+        upper_elevation, right_azimuth = [
+            edges.ravel() for edges in np.meshgrid(
+                elevation_edges[1:], azimuth_edges[1:], indexing='ij')]
+
+        # Shaded fraction of each calculated point, keyed by (elevation, azimuth).
+        # Shared corners are calculated from the same cell edges, such that
+        # their coordinates are identical.
+        self._evaluated = {}
+        cells = [lower_elevation, upper_elevation, left_azimuth, right_azimuth]
+        corner_values = self._evaluate(
+            [lower_elevation, lower_elevation, upper_elevation, upper_elevation],
+            [left_azimuth, right_azimuth, left_azimuth, right_azimuth])
+
+        levels, level_first_child = [], []
+        n_nodes = len(lower_elevation)
+        for depth in range(max_depth + 1):
+            levels.append((cells, corner_values))
+            first_child = np.full(len(cells[0]), -1)
+            level_first_child.append(first_child)
+            if depth == max_depth:
+                break
+            cells, corner_values, split = self._split_cells(cells, corner_values)
+            first_child[split] = n_nodes + 4 * np.arange(split.sum())
+            n_nodes += len(cells[0])
+            if len(cells[0]) == 0:
+                break
+
+        (self._lower_elevation, self._upper_elevation, self._left_azimuth,
+         self._right_azimuth) = [np.concatenate([level[0][k] for level in levels])
+                                 for k in range(4)]
+        self._corner_values = np.concatenate([level[1] for level in levels])
+        self._first_child = np.concatenate(level_first_child)
+        self.n_evaluations = len(self._evaluated)
+        self.n_cells = int(np.sum(self._first_child == -1))
+
+    def _evaluate(self, solar_elevation, solar_azimuth):
+        """Return the shaded fraction of groups of points as columns,
+        calculating the points that have not been calculated before in one
+        batch."""
+        keys = list(zip(np.concatenate(solar_elevation).tolist(),
+                        np.concatenate(solar_azimuth).tolist()))
+        missing = list(dict.fromkeys(key for key in keys if key not in self._evaluated))
+        if len(missing) > 0:
+            elevation, azimuth = np.array(missing).T
+            # The geometric calculation is used for all points, including
+            # those below the horizon, such that the interpolation is not
+            # affected by the discontinuity at the horizon
+            unshaded_geometries, _, _ = self.tracker_field._unshaded_geometries(
+                elevation, azimuth)
+            shaded_fractions = 1 - shapely.area(unshaded_geometries) / \
+                self.tracker_field.active_collector_area
+            self._evaluated.update(zip(missing, shaded_fractions.tolist()))
+        values = np.array([self._evaluated[key] for key in keys], dtype=float)
+        return values.reshape(len(solar_elevation), -1).T
+
+    def _split_cells(self, cells, corner_values):
+        """Split the cells whose interpolation error exceeds the tolerance.
+
+        Returns the bounds and corner values of the new cells, which are
+        ordered such that the four cells of a split cell are consecutive, as
+        well as a boolean array of the split cells.
+        """
+        lower_elevation, upper_elevation, left_azimuth, right_azimuth = cells
+        mid_elevation = (lower_elevation + upper_elevation) / 2
+        mid_azimuth = (left_azimuth + right_azimuth) / 2
+        # The centers of the four cells are calculated as in the next level of
+        # refinement, so that the points are only calculated once
+        quarter_elevation = [(lower_elevation + mid_elevation) / 2,
+                             (mid_elevation + upper_elevation) / 2]
+        quarter_azimuth = [(left_azimuth + mid_azimuth) / 2,
+                           (mid_azimuth + right_azimuth) / 2]
+        # Shaded fraction at the center, the lower, upper, left and right edge
+        # midpoints, and the centers of the four cells, and their values
+        # interpolated from the cell corners
+        values = self._evaluate(
+            [mid_elevation, lower_elevation, upper_elevation, mid_elevation, mid_elevation]
+            + [quarter_elevation[k // 2] for k in range(4)],
+            [mid_azimuth, mid_azimuth, mid_azimuth, left_azimuth, right_azimuth]
+            + [quarter_azimuth[k % 2] for k in range(4)])
+        v00, v01, v10, v11 = corner_values.T
+        interpolated = np.column_stack([
+            (v00 + v01 + v10 + v11) / 4, (v00 + v01) / 2, (v10 + v11) / 2,
+            (v00 + v10) / 2, (v01 + v11) / 2,
+            (9 * v00 + 3 * v01 + 3 * v10 + v11) / 16, (3 * v00 + 9 * v01 + v10 + 3 * v11) / 16,
+            (3 * v00 + v01 + 9 * v10 + 3 * v11) / 16, (v00 + 3 * v01 + 3 * v10 + 9 * v11) / 16])
+        # Half the tolerance is used as a safety margin for the error between
+        # the checked points
+        split = np.any(np.abs(values - interpolated) > self.tolerance / 2, axis=1)
+
+        center, lower, upper, left, right = values[split, :5].T
+        v00, v01, v10, v11 = corner_values[split].T
+        e0, e1, em = lower_elevation[split], upper_elevation[split], mid_elevation[split]
+        a0, a1, am = left_azimuth[split], right_azimuth[split], mid_azimuth[split]
+        # Child k covers the upper elevation half if k // 2 == 1 and the right
+        # azimuth half if k % 2 == 1, matching the point location in the query
+        children = [
+            ((e0, em, a0, am), (v00, lower, left, center)),
+            ((e0, em, am, a1), (lower, v01, center, right)),
+            ((em, e1, a0, am), (left, center, v10, upper)),
+            ((em, e1, am, a1), (center, right, upper, v11))]
+        child_cells = [np.stack([child[0][k] for child in children], axis=1).ravel()
+                       for k in range(4)]
+        child_values = np.stack([np.column_stack(child[1]) for child in children],
+                                axis=1).reshape(-1, 4)
+        return child_cells, child_values, split
+
+    def get_shaded_fraction(self, solar_elevation, solar_azimuth):
+        """Look up the shaded fraction for the specified solar positions.
+
+        Parameters
+        ----------
+        solar_elevation : array-like
+            Solar elevation angles in degrees.
+        solar_azimuth : array-like
+            Solar azimuth angles in degrees.
+
+        Returns
+        -------
+        shaded_fractions : array-like
+            The interpolated shaded fractions, returned as the same type as
+            ``solar_elevation``.
+        """
+        is_scalar = np.isscalar(solar_elevation)
+        elevation = np.atleast_1d(np.asarray(solar_elevation, dtype=float)).ravel()
+        azimuth = np.atleast_1d(np.asarray(solar_azimuth, dtype=float)).ravel()
+        labels = self.tracker_field._classify_solar_positions(elevation, azimuth)
+        shaded_fractions = shading._SHADED_FRACTION_BY_LABEL[labels]
+
+        needs_geometry = labels == shading._NEEDS_GEOMETRY
+        elevation = elevation[needs_geometry]
+        azimuth = np.mod(azimuth[needs_geometry], 360)
+        # Locate the root cell and descend the quadtree to the leaf cells
+        n_elevation, n_azimuth = self._root_shape
+        elevation_index = np.clip(
+            (elevation // self._root_size[0]).astype(int), 0, n_elevation - 1)
+        azimuth_index = np.clip((azimuth // self._root_size[1]).astype(int), 0, n_azimuth - 1)
+        node = elevation_index * n_azimuth + azimuth_index
+        for _ in range(self.max_depth):
+            first_child = self._first_child[node]
+            if np.all(first_child == -1):
+                break
+            upper = elevation >= (self._lower_elevation[node]
+                                  + self._upper_elevation[node]) / 2
+            right = azimuth >= (self._left_azimuth[node] + self._right_azimuth[node]) / 2
+            node = np.where(first_child == -1, node, first_child + 2 * upper + right)
+
+        # Bilinear interpolation between the corners of the leaf cells
+        te = (elevation - self._lower_elevation[node]) / \
+            (self._upper_elevation[node] - self._lower_elevation[node])
+        ta = (azimuth - self._left_azimuth[node]) / \
+            (self._right_azimuth[node] - self._left_azimuth[node])
+        v00, v01, v10, v11 = self._corner_values[node].T
+        shaded_fractions[needs_geometry] = (
+            v00 * (1 - te) * (1 - ta) + v01 * (1 - te) * ta
+            + v10 * te * (1 - ta) + v11 * te * ta)
+        return trackerfield._as_input_type(shaded_fractions, solar_elevation, is_scalar)
@@ -1,15 +1,19 @@
 import matplotlib.pyplot as plt
+from matplotlib import animation
 from matplotlib import collections
 from matplotlib import patches
 from shapely import geometry
+import shapely
 import matplotlib.colors as mcolors
 from matplotlib import cm
+import numpy as np
 
 
 def _plot_field_layout(X, Y, Z, min_tracker_spacing):
     """Create a plot of the field layout."""
+    X, Y, Z = np.asarray(X), np.asarray(Y), np.asarray(Z)
     # Collector heights is illustrated with colors from a colormap
-    norm = mcolors.Normalize(vmin=min(Z)-0.000001, vmax=max(Z)+0.000001)
+    norm = mcolors.Normalize(vmin=np.min(Z)-0.000001, vmax=np.max(Z)+0.000001)
     # 0.000001 is added/subtracted to/from the limits in order for the colormap
     # to correctly display the middle color when all tracker Z coords are zero
     cmap = cm.viridis_r
@@ -19,7 +23,7 @@ def _plot_field_layout(X, Y, Z, min_tracker_spacing):
     ax.add_collection(collections.EllipseCollection(
         widths=min_tracker_spacing, heights=min_tracker_spacing, angles=0,
         units='xy', facecolors=colors, edgecolors=("black",), linewidths=(1,),
-        offsets=list(zip(X, Y)), transOffset=ax.transData))
+        offsets=np.column_stack([X, Y]), transOffset=ax.transData))
     # Similarly, add a circle for the origin
     ax.add_collection(collections.EllipseCollection(
         widths=min_tracker_spacing, heights=min_tracker_spacing, angles=0,
@@ -30,13 +34,96 @@ def _plot_field_layout(X, Y, Z, min_tracker_spacing):
     fig.colorbar(cm.ScalarMappable(norm=norm, cmap=cmap), ax=ax, shrink=0.8,
                  label='Relative tracker height (vertical)')
     # Set limits
-    lower_lim = min(min(X), min(Y)) - min_tracker_spacing
-    upper_lim = max(max(X), max(Y)) + min_tracker_spacing
+    lower_lim = min(np.min(X), np.min(Y)) - min_tracker_spacing
+    upper_lim = max(np.max(X), np.max(Y)) + min_tracker_spacing
     ax.set_xlim(lower_lim, upper_lim)
     ax.set_ylim(lower_lim, upper_lim)
     return fig
 
 
+def plot_tracker_layout(X, Y, values=None, min_tracker_spacing=None,
+                        max_points=None, rasterized=None, cmap='viridis',
+                        label=None, ax=None):
+    """Plot the positions of the trackers in a field.
+
+    The plot is intended for large fields, e.g., the as-built layout of a
+    plant with tens of thousands of trackers. The trackers can be colored by
+    a value, e.g., the annual shading loss of each tracker.
+
+    Parameters
+    ----------
+    X : array-like
+        Position of the trackers in the east-west direction. East is
+        positive.
+    Y : array-like
+        Position of the trackers in the north-south direction. North is
+        positive.
+    values : array-like, optional
+        Value of each tracker used for coloring the trackers.
+    min_tracker_spacing : float, optional
+        Minimum distance between collectors. If specified, the trackers are
+        drawn as circles with a diameter of ``min_tracker_spacing`` in data
+        units. Otherwise, the trackers are drawn as markers with a fixed
+        size, which is faster.
+    max_points : int, optional
+        Maximum number of trackers to plot. If the field contains more
+        trackers, a random subset of the trackers is plotted.
+    rasterized : bool, optional
+        Whether to rasterize the trackers when saving the figure in a vector
+        format. By default, the trackers are rasterized when more than 10000
+        trackers are plotted.
+    cmap : str or matplotlib.colors.Colormap, default : 'viridis'
+        Colormap used for coloring the trackers by ``values``.
+    label : str, optional
+        Label of the colorbar.
+    ax : matplotlib.axes.Axes, optional
+        Axes to plot in. If None, a new figure is created.
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+        Figure with the plot of the tracker positions.
+    """
+    X, Y = np.asarray(X, dtype=float).ravel(), np.asarray(Y, dtype=float).ravel()
+    if values is not None:
+        values = np.asarray(values, dtype=float).ravel()
+    # Decimate the trackers by plotting a random subset. A fixed seed is used
+    # so that the plot is reproducible, and a random subset avoids the
+    # aliasing patterns of plotting every n-th tracker of a regular layout.
+    if (max_points is not None) and (len(X) > max_points):
+        subset = np.sort(np.random.default_rng(0).choice(len(X), max_points, replace=False))
+        X, Y = X[subset], Y[subset]
+        if values is not None:
+            values = values[subset]
+    if rasterized is None:
+        rasterized = len(X) > 10000
+
+    if ax is None:
+        fig, ax = plt.subplots(figsize=(6, 6), subplot_kw={'aspect': 'equal'})
+    else:
+        fig = ax.figure
+    if min_tracker_spacing is None:
+        trackers = ax.scatter(X, Y, s=4, c=values, cmap=cmap, linewidths=0,
+                              rasterized=rasterized)
+    else:
+        color_kwargs = {'facecolors': 'C0'} if values is None else \
+            {'array': values, 'cmap': cmap}
+        trackers = collections.EllipseCollection(
+            widths=min_tracker_spacing, heights=min_tracker_spacing, angles=0,
+            units='xy', offsets=np.column_stack([X, Y]), transOffset=ax.transData,
+            linewidths=0, **color_kwargs)
+        trackers.set_rasterized(rasterized)
+        ax.add_collection(trackers)
+        if len(X) > 0:
+            ax.set_xlim(X.min() - min_tracker_spacing, X.max() + min_tracker_spacing)
+            ax.set_ylim(Y.min() - min_tracker_spacing, Y.max() + min_tracker_spacing)
+    ax.set_xlabel('Tracker position (east-west direction)')
+    ax.set_ylabel('Tracker position (north-south direction)')
+    if values is not None:
+        fig.colorbar(trackers, ax=ax, shrink=0.8, label=label)
+    return fig
+
+
 def _polygons_to_patch_collection(geometries, **kwargs):
     """Convert Shapely Polygon or MultiPolygon to matplotlib PathCollection.
 
@@ -55,6 +142,14 @@ def _polygons_to_patch_collection(geometries, **kwargs):
     return path_collection
 
 
+def _polygons_to_patches(geometries):
+    """Convert Shapely Polygons or MultiPolygons to a list of matplotlib
+    Polygon patches of the polygon exteriors. Empty polygons are skipped."""
+    parts = shapely.get_parts(np.atleast_1d(np.asarray(geometries, dtype=object)))
+    parts = parts[~shapely.is_empty(parts)]
+    return [patches.Polygon(part.exterior.coords) for part in parts]
+
+
 def _plot_shading(active_collector_geometry, unshaded_geometry,
                   shading_geometries, min_tracker_spacing):
     """Plot the shaded and unshaded area for a specific solar position."""
@@ -75,3 +170,63 @@ def _plot_shading(active_collector_geometry, unshaded_geometry,
         ax.set_xlim(-min_tracker_spacing, min_tracker_spacing)
         ax.set_ylim(-min_tracker_spacing, min_tracker_spacing)
     return fig
+
+
+def _save_shading_animation(filename, active_collector_geometry, frames,
+                            min_tracker_spacing, fps=10, dpi=100, writer=None):
+    """Save an animation of the shaded and unshaded area for a sequence of
+    solar positions.
+
+    The frames are an iterable of tuples of the unshaded geometry, the
+    shading geometries, and the title of each frame, which is consumed one
+    frame at a time. A single figure with the same layout as
+    :py:func:`_plot_shading` is created, and the patches of the patch
+    collections are updated in place for each frame, which is written
+    directly to the file.
+    """
+    if writer is None:
+        writer = 'pillow' if str(filename).lower().endswith('.gif') else 'ffmpeg'
+    if isinstance(writer, str):
+        writer = animation.writers[writer](fps=fps)
+
+    fig = _plot_shading(active_collector_geometry, geometry.Polygon(), [],
+                        min_tracker_spacing)
+    axes = fig.axes
+    # The collections are added in the order: active, shading, unshaded
+    shading_patches = axes[0].collections[1]
+    unshaded_patches = axes[1].collections[0]
+    title = fig.suptitle('')
+    try:
+        with writer.saving(fig, filename, dpi):
+            for unshaded, shading, text in frames:
+                shading_patches.set_paths(_polygons_to_patches(shading))
+                unshaded_patches.set_paths(_polygons_to_patches(unshaded))
+                title.set_text(text)
+                writer.grab_frame()
+    finally:
+        plt.close(fig)
+
+
+def _plot_sky_shading_map(shading_map):
+    """Plot the shaded fraction over the sky dome as a polar heatmap.
+
+    The shading map is a DataFrame with the elevation angles of the cell
+    centers as index and the azimuth angles as columns, see
+    :py:meth:`twoaxistracking.TrackerField.sky_shading_map`. The zenith is
+    at the center of the plot and north is up.
+    """
+    elevation = shading_map.index.to_numpy(dtype=float)
+    # The azimuth cells cover the full circle and the elevation cells span
+    # from the horizon to the zenith
+    azimuth_edges = np.deg2rad(np.linspace(0, 360, shading_map.shape[1] + 1))
+    elevation_edges = np.concatenate([[0], (elevation[1:] + elevation[:-1]) / 2, [90]])
+    fig, ax = plt.subplots(figsize=(5, 4), subplot_kw={'projection': 'polar'})
+    ax.set_theta_zero_location('N')
+    ax.set_theta_direction(-1)
+    mesh = ax.pcolormesh(azimuth_edges, 90 - elevation_edges, shading_map.to_numpy(),
+                         cmap='viridis', vmin=0, vmax=1)
+    # The radial axis is the zenith angle, labelled with the elevation angle
+    ax.set_ylim(0, 90)
+    ax.set_yticks([30, 60], labels=['60°', '30°'])
+    fig.colorbar(mesh, ax=ax, shrink=0.8, label='Shaded fraction')
+    return fig
@@ -1,9 +1,19 @@
-from shapely import affinity
 from shapely import geometry
+import shapely
 import numpy as np
 from twoaxistracking import plotting
 
 
+# Labels assigned to solar positions by _classify_solar_positions
+_NIGHT = 0
+_UNSHADED = 1
+_FULLY_SHADED = 2
+_NEEDS_GEOMETRY = 3
+# Shaded fraction corresponding to each label (indexed by the label value).
+# Solar positions that need the geometric calculation are initialized as nan.
+_SHADED_FRACTION_BY_LABEL = np.array([np.nan, 0, 1, np.nan])
+
+
 def horizon_elevation_angle(azimuth, slope_azimuth, slope_tilt):
     """Calculate horizon elevation angle caused by a sloped field.
 
@@ -30,6 +40,69 @@ def horizon_elevation_angle(azimuth, slope_azimuth, slope_tilt):
     return horizon_elevation_angle
 
 
+def _horizon_lookup_table(azimuth, elevation, n_azimuths=360):
+    """Resample a horizon profile to a lookup table for uniformly spaced
+    azimuth angles, see :py:func:`_horizon_lookup`.
+
+    The profile is interpolated linearly and periodically, i.e., between the
+    last and the first azimuth angle across north. Negative horizon elevation
+    angles are set to zero.
+    """
+    azimuth = np.mod(np.asarray(azimuth, dtype=float), 360)
+    elevation = np.asarray(elevation, dtype=float)
+    if (azimuth.shape != elevation.shape) or (azimuth.ndim != 1) or (len(azimuth) == 0):
+        raise ValueError('The horizon profile must consist of one-dimensional '
+                         'azimuth and elevation arrays of the same length.')
+    table_azimuth = np.arange(n_azimuths) * 360 / n_azimuths
+    table = np.interp(table_azimuth, azimuth, elevation, period=360)
+    return np.clip(table, a_min=0, a_max=None)
+
+
+def _horizon_lookup(horizon_profile, azimuth):
+    """Look up the horizon elevation angle in a horizon profile table.
+
+    The table contains the horizon elevation angles for uniformly spaced
+    azimuth angles starting from north (0°), and the horizon elevation angle
+    is interpolated linearly between the table entries.
+    """
+    step = 360 / len(horizon_profile)
+    # Missing azimuth angles are looked up as north to avoid invalid indices
+    position = np.nan_to_num(np.mod(azimuth, 360) / step)
+    index = np.floor(position).astype(int) % len(horizon_profile)
+    weight = position - np.floor(position)
+    return (horizon_profile[index] * (1 - weight)
+            + horizon_profile[(index + 1) % len(horizon_profile)] * weight)
+
+
+def _classify_solar_positions(solar_elevation, solar_azimuth, slope_azimuth,
+                              slope_tilt, max_shading_elevation,
+                              horizon_profile=None):
+    """Classify solar positions by the type of shading calculation needed.
+
+    The early-exit conditions of :py:func:`shaded_fraction` are evaluated for
+    all solar positions at once, such that only the solar positions labelled
+    ``_NEEDS_GEOMETRY`` have to go through the geometric calculation. Solar
+    positions with a missing (nan) elevation are labelled as ``_NIGHT``. If
+    a horizon profile table is specified (see :py:func:`_horizon_lookup`),
+    solar positions below it are also fully shaded, including those above
+    the maximum shading elevation, which only accounts for the shading by
+    the neighboring collectors.
+    """
+    solar_elevation = np.asarray(solar_elevation, dtype=float)
+    solar_azimuth = np.asarray(solar_azimuth, dtype=float)
+    labels = np.full(solar_elevation.shape, _NEEDS_GEOMETRY)
+    # The labels are assigned in reverse order of precedence, such that they
+    # are identical to the order of the checks in shaded_fraction
+    horizon = horizon_elevation_angle(solar_azimuth, slope_azimuth, slope_tilt)
+    labels[solar_elevation <= horizon] = _FULLY_SHADED
+    labels[solar_elevation > max_shading_elevation] = _UNSHADED
+    if horizon_profile is not None:
+        labels[solar_elevation <= _horizon_lookup(horizon_profile, solar_azimuth)] = \
+            _FULLY_SHADED
+    labels[~(solar_elevation >= 0)] = _NIGHT
+    return labels
+
+
 def shaded_fraction(solar_elevation, solar_azimuth,
                     total_collector_geometry, active_collector_geometry,
                     min_tracker_spacing, tracker_distance, relative_azimuth,
@@ -122,29 +195,16 @@ def shaded_fraction(solar_elevation, solar_azimuth,
         else:
             return shaded_fraction
 
-    azimuth_difference = solar_azimuth - relative_azimuth
-
-    # Create mask to only calculate shading for collectors within +/-90° view
-    mask = np.where(np.cos(np.deg2rad(azimuth_difference)) > 0)
-
-    xoff = tracker_distance[mask]*np.sin(np.deg2rad(azimuth_difference[mask]))
-    yoff = - tracker_distance[mask] *\
-        np.cos(np.deg2rad(azimuth_difference[mask])) * \
-        np.sin(np.deg2rad(solar_elevation-relative_slope[mask])) / \
-        np.cos(np.deg2rad(relative_slope[mask]))
-
-    # Initialize the unshaded area as the collector active collector area
-    unshaded_geometry = active_collector_geometry
-    shading_geometries = []
-    for i, (x, y) in enumerate(zip(xoff, yoff)):
-        if np.sqrt(x**2+y**2) < min_tracker_spacing:
-            # Project the geometry of the shading collector (total area) onto
-            # the plane of the reference collector
-            shading_geometry = affinity.translate(total_collector_geometry, x, y)  # noqa: E501
-            # Update the unshaded area based on overlapping shade
-            unshaded_geometry = unshaded_geometry.difference(shading_geometry)
-            if plot or return_geometries:
-                shading_geometries.append(shading_geometry)
+    xoff, yoff, in_view = _shading_offsets(
+        solar_elevation, solar_azimuth, tracker_distance, relative_azimuth,
+        relative_slope)
+    # Only collectors within the field of view and close enough to the
+    # reference collector can cast a shadow on it
+    shades = in_view & (np.hypot(xoff, yoff) < min_tracker_spacing)
+    unshaded_geometries, shading_geometries, _ = _unshaded_geometries(
+        xoff, yoff, shades, total_collector_geometry, active_collector_geometry)
+    unshaded_geometry = unshaded_geometries[0]
+    shading_geometries = list(shading_geometries)
 
     if plot:
         plotting._plot_shading(active_collector_geometry, unshaded_geometry,
@@ -156,3 +216,113 @@ def shaded_fraction(solar_elevation, solar_azimuth,
                                  'shading_geometries': shading_geometries}
     else:
         return shaded_fraction
+
+
+def _shading_offsets(solar_elevation, solar_azimuth, tracker_distance,
+                     relative_azimuth, relative_slope):
+    """Calculate the offsets of the neighboring collectors projected onto the
+    plane of the reference collector.
+
+    The offsets are calculated for all combinations of solar positions
+    (rows) and neighboring collectors (columns). The returned boolean array
+    indicates whether the neighboring collectors are within the +/-90° field
+    of view of the reference collector.
+    """
+    solar_elevation = np.atleast_1d(solar_elevation)[:, np.newaxis]
+    solar_azimuth = np.atleast_1d(solar_azimuth)[:, np.newaxis]
+    azimuth_difference = np.deg2rad(solar_azimuth - relative_azimuth)
+    cos_azimuth_difference = np.cos(azimuth_difference)
+    xoff = tracker_distance * np.sin(azimuth_difference)
+    yoff = - tracker_distance * cos_azimuth_difference * \
+        np.sin(np.deg2rad(solar_elevation - relative_slope)) / \
+        np.cos(np.deg2rad(relative_slope))
+    in_view = cos_azimuth_difference > 0
+    return xoff, yoff, in_view
+
+
+def _translate_geometry(geometry, xoff, yoff, coordinates=None):
+    """Create copies of a geometry translated by each pair of offsets.
+
+    The copies are created by offsetting the coordinate array of the geometry
+    directly, which avoids the generic affine transformation of
+    :py:func:`shapely.affinity.translate`.
+    """
+    if coordinates is None:
+        coordinates = shapely.get_coordinates(geometry)
+    geometries = np.full(len(xoff), geometry, dtype=object)
+    offsets = np.column_stack([xoff, yoff])[:, np.newaxis, :]
+    return shapely.set_coordinates(
+        geometries, (coordinates + offsets).reshape(-1, 2))
+
+
+def _unshaded_geometries(xoff, yoff, shades, total_collector_geometry,
+                         active_collector_geometry,
+                         total_collector_coordinates=None, geometry_index=None):
+    """Calculate the unshaded geometries for multiple solar positions at once.
+
+    Parameters
+    ----------
+    xoff, yoff: 2D array of floats
+        Offsets of the projected neighboring collectors with the solar
+        positions as rows and the neighboring collectors as columns.
+    shades: 2D array of bools
+        Whether each of the projected neighboring collectors can cast a
+        shadow on the reference collector.
+    total_collector_geometry: :py:class:`Shapely Polygon <Polygon>`
+        Polygon corresponding to the total collector area.
+    active_collector_geometry: :py:class:`Shapely Polygon <Polygon>` or :py:class:`MultiPolygon`
+        One or more polygons defining the active collector area, preferably
+        prepared with :py:func:`shapely.prepare`.
+    total_collector_coordinates: 2D array of floats, optional
+        Coordinates of ``total_collector_geometry``. Calculated if not
+        specified.
+    geometry_index: array of ints, optional
+        Index of the total collector geometry of each neighboring collector.
+        If specified, ``total_collector_geometry`` and
+        ``total_collector_coordinates`` are sequences with one entry for each
+        collector geometry.
+
+    Returns
+    -------
+    unshaded_geometries: array of geometries
+        The unshaded geometry for each solar position.
+    shading_geometries: array of geometries
+        The projected geometries of the shading collectors for all the solar
+        positions.
+    position_index: array of ints
+        Index of the solar position that each shading geometry belongs to.
+    """
+    position_index, neighbor_index = np.nonzero(shades)
+    if geometry_index is None:
+        shading_geometries = _translate_geometry(
+            total_collector_geometry, xoff[shades], yoff[shades],
+            total_collector_coordinates)
+    else:
+        # The shading geometries are created for one collector geometry at a
+        # time, as the coordinates of each geometry are offset together
+        if total_collector_coordinates is None:
+            total_collector_coordinates = [
+                shapely.get_coordinates(g) for g in total_collector_geometry]
+        shading_geometry_index = geometry_index[neighbor_index]
+        shading_geometries = np.empty(len(position_index), dtype=object)
+        for k in np.unique(shading_geometry_index):
+            is_k = shading_geometry_index == k
+            shading_geometries[is_k] = _translate_geometry(
+                total_collector_geometry[k], xoff[shades][is_k], yoff[shades][is_k],
+                total_collector_coordinates[k])
+    # The difference only needs to be computed for the intersecting geometries.
+    # The intersection test is much faster if the caller has prepared the
+    # active geometry, which is not done here as it modifies the geometry.
+    intersects = shapely.intersects(active_collector_geometry, shading_geometries)
+    index = position_index[intersects]
+    geometries = shading_geometries[intersects]
+    # The shading geometries are subtracted one at a time for each solar
+    # position, but vectorized across all solar positions. The rank is the
+    # order of the shading geometry among those of the same solar position.
+    rank = np.arange(len(index)) - np.searchsorted(index, index)
+    unshaded_geometries = np.full(len(xoff), active_collector_geometry, dtype=object)
+    for k in range(rank.max(initial=-1) + 1):
+        index_k = index[rank == k]
+        unshaded_geometries[index_k] = shapely.difference(
+            unshaded_geometries[index_k], geometries[rank == k])
+    return unshaded_geometries, shading_geometries, position_index
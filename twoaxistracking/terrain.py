@@ -0,0 +1,126 @@
+"""
+The `terrain` module contains functions for describing undulating terrain by
+a heightmap (digital elevation model), e.g., for deriving the relative heights
+of the collectors in a field and the horizon caused by the terrain.
+
+The heightmap is defined on a regular grid with the coordinates relative to
+the reference collector, i.e., the reference collector is located at (0, 0).
+"""
+
+import numpy as np
+
+
+def _check_terrain(x, y, heights):
+    """Check and convert the heightmap grid to arrays."""
+    x, y, heights = np.asarray(x, dtype=float), np.asarray(y, dtype=float), \
+        np.asarray(heights, dtype=float)
+    if (len(x) < 2) or (len(y) < 2) or np.any(np.diff(x) <= 0) or np.any(np.diff(y) <= 0):
+        raise ValueError('The terrain coordinates must be strictly increasing '
+                         'and contain at least two values.')
+    if heights.shape != (len(y), len(x)):
+        raise ValueError('The shape of the terrain heights must be (len(y), len(x)).')
+    return x, y, heights
+
+
+def terrain_height(x, y, heights, xi, yi):
+    """Calculate the terrain height at arbitrary points.
+
+    The heights are interpolated bilinearly between the grid points of the
+    heightmap, vectorized across all points.
+
+    Parameters
+    ----------
+    x : array-like
+        Coordinates of the heightmap grid in the east-west direction. East is
+        positive.
+    y : array-like
+        Coordinates of the heightmap grid in the north-south direction. North
+        is positive.
+    heights : 2D array-like
+        Terrain heights with shape (len(y), len(x)).
+    xi, yi : array-like
+        Coordinates of the points for which to calculate the terrain height.
+
+    Returns
+    -------
+    height : array of floats
+        Terrain height at the points. Points outside the heightmap are nan.
+    """
+    x, y, heights = _check_terrain(x, y, heights)
+    xi, yi = np.broadcast_arrays(np.asarray(xi, dtype=float), np.asarray(yi, dtype=float))
+    # Index of the grid cell containing each point
+    i = np.clip(np.searchsorted(x, xi) - 1, 0, len(x) - 2)
+    j = np.clip(np.searchsorted(y, yi) - 1, 0, len(y) - 2)
+    tx = (xi - x[i]) / (x[i + 1] - x[i])
+    ty = (yi - y[j]) / (y[j + 1] - y[j])
+    height = (heights[j, i] * (1 - tx) * (1 - ty) + heights[j, i + 1] * tx * (1 - ty)
+              + heights[j + 1, i] * (1 - tx) * ty + heights[j + 1, i + 1] * tx * ty)
+    outside = (xi < x[0]) | (xi > x[-1]) | (yi < y[0]) | (yi > y[-1])
+    return np.where(outside, np.nan, height)
+
+
+def terrain_horizon_profile(x, y, heights, azimuth=None, observer_height=0):
+    """Calculate the horizon elevation angle caused by the terrain.
+
+    The horizon is calculated as seen from the reference collector at (0, 0)
+    by sampling the terrain along rays in the direction of each azimuth angle
+    with a step equal to the smallest grid spacing, up to the edge of the
+    heightmap. The horizon is measured from ``observer_height`` above the
+    terrain, i.e., from the collector rather than from the ground, such that
+    low terrain features close to the collector do not shade it.
+
+    Parameters
+    ----------
+    x : array-like
+        Coordinates of the heightmap grid in the east-west direction. East is
+        positive.
+    y : array-like
+        Coordinates of the heightmap grid in the north-south direction. North
+        is positive.
+    heights : 2D array-like
+        Terrain heights with shape (len(y), len(x)).
+    azimuth : array-like, optional
+        Azimuth angles for which to calculate the horizon elevation angle
+        [degrees]. Default is every degree from 0 to 359.
+    observer_height : float, default : 0
+        Height above the terrain at (0, 0) from which the horizon is seen,
+        e.g., the mounting height of the collector.
+
+    Returns
+    -------
+    horizon_elevation_angle : array of floats
+        Horizon elevation angle for each azimuth angle [degrees]. The horizon
+        elevation angle cannot be less than zero.
+    """
+    x, y, heights = _check_terrain(x, y, heights)
+    if azimuth is None:
+        azimuth = np.arange(0, 360)
+    azimuth = np.deg2rad(np.asarray(azimuth, dtype=float))[:, np.newaxis]
+    step = min(np.diff(x).min(), np.diff(y).min())
+    max_distance = np.hypot(np.abs(x).max(), np.abs(y).max())
+    distance = np.arange(step, max_distance + step, step)
+    height = terrain_height(x, y, heights, distance * np.sin(azimuth),
+                            distance * np.cos(azimuth))
+    reference_height = terrain_height(x, y, heights, 0, 0) + observer_height
+    elevation = np.rad2deg(np.arctan2(height - reference_height, distance))
+    # Points outside the heightmap do not contribute to the horizon
+    elevation = np.where(np.isnan(elevation), 0, elevation)
+    return np.clip(elevation.max(axis=1), a_min=0, a_max=None)
+
+
+def _max_terrain_slope(x, y, heights):
+    """Calculate the steepest slope of the heightmap [degrees]."""
+    x, y, heights = _check_terrain(x, y, heights)
+    dz_dy, dz_dx = np.gradient(heights, y, x)
+    return np.rad2deg(np.arctan(np.hypot(dz_dx, dz_dy).max()))
+
+
+def _terrain_field_layout(x, y, heights, X, Y, tracker_distance):
+    """Calculate the relative heights and slopes of the neighboring
+    collectors from the heightmap."""
+    neighbor_height = terrain_height(x, y, heights, X, Y)
+    if np.any(np.isnan(neighbor_height)):
+        raise ValueError('The terrain does not cover all neighboring collectors.')
+    Z = neighbor_height - terrain_height(x, y, heights, 0, 0)
+    relative_slope = np.rad2deg(np.arctan(Z / tracker_distance))
+    return Z, relative_slope
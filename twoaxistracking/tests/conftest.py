@@ -1,7 +1,7 @@
 import pytest
 from shapely import geometry
 import numpy as np
-from twoaxistracking import layout
+from twoaxistracking import layout, trackerfield
 
 
 @pytest.fixture
@@ -29,6 +29,20 @@ def active_geometry_split():
     return active_geometry_split
 
 
+@pytest.fixture
+def tracker_field(request, rectangular_geometry, active_geometry_split):
+    # Tracker field of the rectangular_geometry with the active_geometry_split.
+    # The parameters of the field can be changed by indirect parametrization
+    # with a dict of TrackerField parameters, e.g.:
+    # @pytest.mark.parametrize('tracker_field', [{'gcr': 0.25}], indirect=True)
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    kwargs = dict(total_collector_geometry=collector_geometry,
+                  active_collector_geometry=active_geometry_split,
+                  neighbor_order=2, gcr=0.3, layout_type='square')
+    kwargs.update(getattr(request, 'param', {}))
+    return trackerfield.TrackerField(**kwargs)
+
+
 @pytest.fixture
 def square_field_layout():
     # Corresponds to GCR 0.125 with the rectangular_geometry
@@ -0,0 +1,186 @@
+"""
+Reference dataset of shaded fractions for validating the shading engines.
+
+The dataset contains the shaded fraction of a set of tracker field scenarios
+for a year of solar positions at 30-minute resolution, calculated with
+:py:func:`reference_shaded_fraction`, which translates and subtracts the
+neighboring collectors one at a time. It shares no code with the shading
+engines, so errors in the shared shading helpers are not stored in the
+dataset. The solar
+positions are those of Barstow, California in 1976, i.e., the location and
+year of the reference irradiance dataset, calculated with a simplified solar
+position algorithm so that the dataset is deterministic. The collector
+geometries and layouts are those of the fixtures in ``conftest.py``.
+
+The dataset is regenerated by running::
+
+    python -m twoaxistracking.tests.reference_dataset
+"""
+
+import pathlib
+import time
+import numpy as np
+import pandas as pd
+from shapely import affinity
+from shapely import geometry
+from twoaxistracking import shading, trackerfield
+
+
+REFERENCE_DATASET = pathlib.Path(__file__).parent / 'data' / 'reference_dataset.npz'
+
+# Latitude of Barstow, California [degrees]
+LATITUDE = 34.88
+
+# Tracker field parameters of each scenario
+SCENARIOS = {
+    # The square_field_layout fixture
+    'square': dict(
+        total_collector_geometry=geometry.box(-2, -1, 2, 1),
+        active_collector_geometry=geometry.box(-2, -1, 2, 1),
+        neighbor_order=1, gcr=0.125, layout_type='square'),
+    # The square_field_layout_sloped fixture
+    'square_sloped': dict(
+        total_collector_geometry=geometry.box(-2, -1, 2, 1),
+        active_collector_geometry=geometry.box(-2, -1, 2, 1),
+        neighbor_order=1, gcr=0.125, layout_type='square',
+        slope_azimuth=45, slope_tilt=5),
+    'hexagonal_split': dict(
+        total_collector_geometry=geometry.box(-2, -1, 2, 1),
+        active_collector_geometry=geometry.MultiPolygon([
+            geometry.box(-1.9, -0.9, -0.1, -0.1),
+            geometry.box(0.1, -0.9, 1.9, -0.1),
+            geometry.box(-1.9, 0.1, -0.1, 0.9),
+            geometry.box(0.1, 0.1, 1.9, 0.9)]),
+        neighbor_order=2, gcr=0.3, layout_type='hexagonal_n_s'),
+    'circular': dict(
+        total_collector_geometry=geometry.Point(0, 0).buffer(2),
+        active_collector_geometry=geometry.Point(0, 0).buffer(2),
+        neighbor_order=2, gcr=0.4, layout_type='hexagonal_e_w'),
+}
+
+
+def reference_solar_position():
+    """Calculate the solar positions of the reference dataset.
+
+    Returns
+    -------
+    solar_elevation, solar_azimuth : pandas.Series
+        Solar elevation and azimuth angles in degrees.
+    """
+    times = pd.date_range('1976-01-01', '1977-01-01', freq='30min', inclusive='left')
+    declination = np.deg2rad(23.45 * np.sin(2 * np.pi * (284 + times.dayofyear) / 365))
+    latitude = np.deg2rad(LATITUDE)
+    hour_angle = np.deg2rad(15 * (times.hour + times.minute / 60 - 12))
+    sin_elevation = np.sin(latitude) * np.sin(declination) \
+        + np.cos(latitude) * np.cos(declination) * np.cos(hour_angle)
+    solar_elevation = pd.Series(np.rad2deg(np.arcsin(sin_elevation)), index=times)
+    solar_azimuth = pd.Series(np.rad2deg(np.arctan2(
+        np.sin(hour_angle), np.cos(hour_angle) * np.sin(latitude)
+        - np.tan(declination) * np.cos(latitude))) + 180, index=times)
+    return solar_elevation, solar_azimuth
+
+
+def reference_shaded_fraction(tracker_field, solar_elevation, solar_azimuth):
+    """Calculate the shaded fraction one solar position and one neighboring
+    collector at a time.
+
+    The implementation is independent of :py:mod:`twoaxistracking.shading`,
+    i.e., it does not skip solar positions above the maximum shading
+    elevation and translates each neighboring collector with
+    :py:func:`shapely.affinity.translate`.
+    """
+    tracker_distance = np.asarray(tracker_field.tracker_distance)
+    relative_azimuth = np.asarray(tracker_field.relative_azimuth)
+    relative_slope = np.asarray(tracker_field.relative_slope)
+    active_area = tracker_field.active_collector_geometry.area
+    shaded_fraction = []
+    for elevation, azimuth in zip(solar_elevation, solar_azimuth):
+        horizon = np.rad2deg(np.arctan(
+            - np.cos(np.deg2rad(tracker_field.slope_azimuth - azimuth))
+            * np.tan(np.deg2rad(tracker_field.slope_tilt))))
+        if elevation < 0:
+            shaded_fraction.append(np.nan)
+            continue
+        if elevation <= max(horizon, 0):
+            shaded_fraction.append(1)
+            continue
+        unshaded_geometry = tracker_field.active_collector_geometry
+        for distance, neighbor_azimuth, slope in zip(
+                tracker_distance, relative_azimuth, relative_slope):
+            azimuth_difference = np.deg2rad(azimuth - neighbor_azimuth)
+            # Only collectors within the +/-90 degrees field of view shade
+            if np.cos(azimuth_difference) <= 0:
+                continue
+            xoff = distance * np.sin(azimuth_difference)
+            yoff = - distance * np.cos(azimuth_difference) \
+                * np.sin(np.deg2rad(elevation - slope)) / np.cos(np.deg2rad(slope))
+            if np.sqrt(xoff**2 + yoff**2) < tracker_field.min_tracker_spacing:
+                unshaded_geometry = unshaded_geometry.difference(affinity.translate(
+                    tracker_field.total_collector_geometry, xoff, yoff))
+        shaded_fraction.append(1 - unshaded_geometry.area / active_area)
+    return np.array(shaded_fraction, dtype=float)
+
+
+def scalar_shaded_fraction(tracker_field, solar_elevation, solar_azimuth):
+    """Calculate the shaded fraction one solar position at a time using
+    :py:func:`twoaxistracking.shaded_fraction`."""
+    return np.array([
+        shading.shaded_fraction(
+            elevation, azimuth, tracker_field.total_collector_geometry,
+            tracker_field.active_collector_geometry, tracker_field.min_tracker_spacing,
+            tracker_field.tracker_distance, tracker_field.relative_azimuth,
+            tracker_field.relative_slope, tracker_field.slope_azimuth,
+            tracker_field.slope_tilt, tracker_field.max_shading_elevation)
+        for elevation, azimuth in zip(solar_elevation, solar_azimuth)])
+
+
+def generate_reference_dataset(path=REFERENCE_DATASET):
+    """Calculate the reference dataset and save it as a compressed npz file."""
+    solar_elevation, solar_azimuth = reference_solar_position()
+    shaded_fractions = {
+        name: reference_shaded_fraction(
+            trackerfield.TrackerField(**kwargs), solar_elevation, solar_azimuth)
+        for name, kwargs in SCENARIOS.items()}
+    pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(path, solar_elevation=solar_elevation.values,
+                        solar_azimuth=solar_azimuth.values, **shaded_fractions)
+
+
+def evaluate_engine(engine, path=REFERENCE_DATASET):
+    """Compare the shaded fractions of an engine to the reference dataset.
+
+    Parameters
+    ----------
+    engine : callable
+        Function with the signature ``engine(tracker_field, solar_elevation,
+        solar_azimuth)`` that returns the shaded fractions as an array.
+    path : path-like, optional
+        Path of the reference dataset.
+
+    Returns
+    -------
+    results : pandas.DataFrame
+        The maximum absolute difference from the reference dataset, the
+        runtime in seconds, and the throughput in solar positions per second
+        indexed by scenario.
+    """
+    reference = np.load(path)
+    solar_elevation, solar_azimuth = reference['solar_elevation'], reference['solar_azimuth']
+    results = {}
+    for name, kwargs in SCENARIOS.items():
+        tracker_field = trackerfield.TrackerField(**kwargs)
+        start = time.perf_counter()
+        shaded_fraction = np.asarray(
+            engine(tracker_field, solar_elevation, solar_azimuth), dtype=float)
+        runtime = time.perf_counter() - start
+        # Missing values count as an infinite difference, unless both are nan
+        difference = np.abs(shaded_fraction - reference[name])
+        difference[np.isnan(difference)] = np.inf
+        difference[np.isnan(shaded_fraction) & np.isnan(reference[name])] = 0
+        results[name] = {'max_difference': difference.max(), 'runtime': runtime,
+                         'throughput': len(solar_elevation) / runtime}
+    return pd.DataFrame.from_dict(results, orient='index')
+
+
+if __name__ == '__main__':
+    generate_reference_dataset()
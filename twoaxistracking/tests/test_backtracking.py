@@ -0,0 +1,81 @@
+from twoaxistracking import backtracking, shading
+import numpy as np
+import pandas as pd
+
+
+def test_projected_offsets_tracking(square_field_layout):
+    # Test that the offsets are identical to those of shaded_fraction when
+    # the collectors are normal to the sun on a horizontal field
+    X, Y, Z, tracker_distance, relative_azimuth, relative_slope = square_field_layout
+    solar_elevation = np.array([3, 10, 25])
+    solar_azimuth = np.array([95, 180, 260])
+    xoff, yoff, in_front, cos_aoi = backtracking._projected_offsets(
+        solar_elevation, solar_azimuth, solar_elevation, solar_azimuth,
+        tracker_distance, relative_azimuth, relative_slope)
+    expected_xoff, expected_yoff, expected_in_view = shading._shading_offsets(
+        solar_elevation, solar_azimuth, tracker_distance, relative_azimuth,
+        relative_slope)
+    np.testing.assert_allclose(xoff, expected_xoff, atol=1e-12)
+    np.testing.assert_allclose(yoff, expected_yoff, atol=1e-12)
+    np.testing.assert_array_equal(in_front, expected_in_view)
+    np.testing.assert_allclose(cos_aoi, 1)
+
+
+def test_horizontal_collectors_unshaded(tracker_field):
+    # Horizontal collectors at the same height cannot shade each other
+    shaded_fraction, cos_aoi = backtracking._orientation_shaded_fraction(
+        tracker_field, np.array([5, 30]), np.array([180, 90]), np.array([90, 90]),
+        np.array([180, 90]))
+    np.testing.assert_allclose(shaded_fraction, 0)
+    np.testing.assert_allclose(cos_aoi, np.sin(np.deg2rad([5, 30])))
+
+
+def test_shade_avoidance_orientation(tracker_field):
+    index = pd.date_range('2020-06-01 04:00', freq='30min', periods=6)
+    solar_elevation = pd.Series([-3, 2, 5, 8, 12, 50], index=index)
+    solar_azimuth = pd.Series([60, 65, 70, 75, 80, 180], index=index)
+    result = backtracking.shade_avoidance_orientation(
+        tracker_field, solar_elevation, solar_azimuth)
+    pd.testing.assert_index_equal(result.index, index)
+    # Sun below the horizon
+    assert result.iloc[0].isna().all()
+    # The collectors track the sun when there is no shading
+    np.testing.assert_allclose(result.iloc[-1], [50, 180, 0, 1])
+    # The unshaded beam irradiance is at least as high as when tracking
+    tracking = tracker_field.get_shaded_fraction(solar_elevation, solar_azimuth)
+    unshaded_beam = (1 - result['shaded_fraction']) * result['cos_aoi']
+    assert (unshaded_beam.iloc[1:] >= 1 - tracking.iloc[1:]).all()
+    # Tilting away from the sun reduces the shading at low solar elevations
+    assert (unshaded_beam.iloc[1:3] > 1 - tracking.iloc[1:3]).all()
+    assert (result['tracker_elevation'].iloc[1:] >= solar_elevation.iloc[1:]).all()
+
+
+def test_shade_avoidance_orientation_array(tracker_field, monkeypatch):
+    # Test that identical solar positions are only searched once and that
+    # a RangeIndex is used for array inputs
+    searched = []
+    search_orientation = backtracking._search_orientation
+
+    def recorded_search_orientation(tracker_field, solar_elevation, *args):
+        searched.append(len(solar_elevation))
+        return search_orientation(tracker_field, solar_elevation, *args)
+
+    monkeypatch.setattr(backtracking, '_search_orientation', recorded_search_orientation)
+    solar_elevation, solar_azimuth = np.array([4, 4.04, 4]), np.array([100, 100.03, 100])
+    result = backtracking.shade_avoidance_orientation(
+        tracker_field, solar_elevation, solar_azimuth, resolution=0.1)
+    assert searched == [1]
+    assert isinstance(result.index, pd.RangeIndex)
+    assert (result.iloc[0] == result.iloc[2]).all()
+    # The orientation offset of the rounded solar position is applied to the
+    # actual solar position, for which the results are calculated
+    offset = (result['tracker_elevation'] - solar_elevation) / (90 - solar_elevation)
+    np.testing.assert_allclose(offset[1], offset[0])
+    np.testing.assert_allclose(result['tracker_azimuth'] - solar_azimuth,
+                               result['tracker_azimuth'][0] - solar_azimuth[0])
+    shaded_fraction, cos_aoi = backtracking._orientation_shaded_fraction(
+        tracker_field, solar_elevation, solar_azimuth,
+        result['tracker_elevation'].values, result['tracker_azimuth'].values)
+    np.testing.assert_allclose(result['shaded_fraction'], shaded_fraction)
+    np.testing.assert_allclose(result['cos_aoi'], cos_aoi)
+    assert result['cos_aoi'][1] != result['cos_aoi'][0]
@@ -0,0 +1,99 @@
+from twoaxistracking import cli, trackerfield
+import json
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+
+@pytest.fixture
+def field_config(tmp_path, rectangular_geometry, active_geometry_split):
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    config = {
+        'total_collector_geometry': collector_geometry.wkt,
+        'active_collector_geometry': shapely.geometry.mapping(active_geometry_split),
+        'neighbor_order': 2, 'gcr': 0.3, 'layout_type': 'hexagonal_n_s',
+        'slope_azimuth': 90, 'slope_tilt': 2}
+    filename = tmp_path / 'field.json'
+    filename.write_text(json.dumps(config))
+    return filename
+
+
+@pytest.fixture
+def solar_position():
+    return pd.DataFrame({
+        'time': pd.date_range('2020-06-01 04:00', periods=40, freq='30min').astype(str),
+        'elevation': np.linspace(-5, 60, 40),
+        'azimuth': np.linspace(60, 240, 40)})
+
+
+def test_read_field_config(field_config, rectangular_geometry, active_geometry_split):
+    # Test that WKT and GeoJSON geometries are converted
+    tracker_field = cli.read_field_config(field_config)
+    assert tracker_field.total_collector_geometry.equals(rectangular_geometry[0])
+    assert tracker_field.active_collector_geometry.equals(active_geometry_split)
+    assert tracker_field.layout_type == 'hexagonal_n_s'
+
+
+def test_read_field_config_neighbor_geometries(tmp_path, rectangular_geometry):
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    config = {
+        'total_collector_geometry': collector_geometry.wkt,
+        'active_collector_geometry': collector_geometry.wkt,
+        'neighbor_order': 1, 'gcr': 0.25, 'layout_type': 'square',
+        'neighbor_geometries': [collector_geometry.wkt,
+                                shapely.geometry.mapping(shapely.box(-2.5, -1, 2.5, 1))],
+        'neighbor_geometry_index': [0, 1, 0, 1, 0, 1, 0, 1]}
+    filename = tmp_path / 'field.json'
+    filename.write_text(json.dumps(config))
+    tracker_field = cli.read_field_config(filename)
+    assert tracker_field.neighbor_geometries[1].equals(shapely.box(-2.5, -1, 2.5, 1))
+
+
+@pytest.mark.parametrize('extension', ['csv', 'parquet'])
+def test_main(tmp_path, field_config, solar_position, extension, capsys):
+    # Test that the shaded fraction is written together with the input columns
+    input_file, output_file = tmp_path / f'input.{extension}', tmp_path / f'output.{extension}'
+    if extension == 'csv':
+        solar_position.to_csv(input_file, index=False)
+    else:
+        solar_position.to_parquet(input_file, index=False)
+    assert cli.main([str(field_config), str(input_file), str(output_file),
+                     '--max-workers', '2', '--chunk-size', '7']) == 0
+    result = pd.read_csv(output_file) if extension == 'csv' else pd.read_parquet(output_file)
+    pd.testing.assert_frame_equal(result[solar_position.columns], solar_position)
+    expected = cli.read_field_config(field_config).get_shaded_fraction(
+        solar_position['elevation'].values, solar_position['azimuth'].values)
+    np.testing.assert_allclose(result['shaded_fraction'], expected)
+    assert 'timestamps/s' in capsys.readouterr().out
+
+
+def test_main_lookup_engine(tmp_path, field_config, solar_position):
+    # Test the lookup table engine and custom column names
+    input_file, output_file = tmp_path / 'input.csv', tmp_path / 'output.parquet'
+    solar_position.rename(columns={'elevation': 'apparent_elevation'}).to_csv(
+        input_file, index=False)
+    cli.main([str(field_config), str(input_file), str(output_file), '--engine', 'lookup',
+              '--elevation-column', 'apparent_elevation', '--lookup-tolerance', '0.02'])
+    result = pd.read_parquet(output_file)
+    expected = cli.read_field_config(field_config).get_shaded_fraction(
+        solar_position['elevation'].values, solar_position['azimuth'].values)
+    np.testing.assert_allclose(result['shaded_fraction'], expected, atol=0.02)
+
+
+def test_main_empty_input(tmp_path, field_config):
+    input_file, output_file = tmp_path / 'input.csv', tmp_path / 'output.csv'
+    input_file.write_text('elevation,azimuth\n')
+    cli.main([str(field_config), str(input_file), str(output_file)])
+    assert len(pd.read_csv(output_file)) == 0
+
+
+def test_chunked_shaded_fraction(rectangular_geometry):
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    tracker_field = trackerfield.TrackerField(
+        collector_geometry, collector_geometry, 1, 0.25, 'square')
+    solar_elevation, solar_azimuth = np.linspace(1, 40, 23), np.linspace(90, 270, 23)
+    np.testing.assert_array_equal(
+        cli._chunked_shaded_fraction(tracker_field.get_shaded_fraction, solar_elevation,
+                                     solar_azimuth, max_workers=3, chunk_size=4),
+        tracker_field.get_shaded_fraction(solar_elevation, solar_azimuth))
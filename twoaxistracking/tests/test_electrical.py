@@ -0,0 +1,36 @@
+from twoaxistracking import electrical
+import numpy as np
+import pandas as pd
+
+
+def test_electrical_shaded_fraction():
+    cell_shaded_fraction = np.array([
+        [0, 0, 0, 0],  # unshaded
+        [0.3, 0, 0, 0],  # one substring limited by the most shaded cell
+        [1, 0, 0, 0],  # one substring bypassed
+        [1, 1, 1, 1],  # completely shaded
+        [np.nan, np.nan, np.nan, np.nan],  # sun below the horizon
+    ])
+    # Two substrings with two cells each
+    substring_index = [0, 0, 1, 1]
+    result = electrical.electrical_shaded_fraction(
+        cell_shaded_fraction, substring_index)
+    np.testing.assert_allclose(result, [0, 0.3, 0.5, 1, np.nan])
+
+
+def test_electrical_shaded_fraction_bypass_or_limit():
+    # Three substrings with the currents 1, 0.8, and 0.1. Operating at a
+    # current of 0.8 and bypassing the third substring gives the most power.
+    cell_shaded_fraction = np.array([[0.2, 0, 0.9, 0, 0, 0]])
+    substring_index = [1, 2, 0, 0, 1, 2]
+    result = electrical.electrical_shaded_fraction(
+        cell_shaded_fraction, substring_index)
+    np.testing.assert_allclose(result, [1 - 1.6 / 3])
+
+
+def test_electrical_shaded_fraction_diffuse_fraction():
+    # The diffuse irradiance reaches the shaded cells
+    cell_shaded_fraction = pd.DataFrame([[1, 0], [0.5, 0]], index=['a', 'b'])
+    result = electrical.electrical_shaded_fraction(
+        cell_shaded_fraction, substring_index=[0, 0], diffuse_fraction=[0.2, 0.5])
+    pd.testing.assert_series_equal(result, pd.Series([0.8, 0.25], index=['a', 'b']))
@@ -0,0 +1,51 @@
+from twoaxistracking import gridded
+import numpy as np
+import pandas as pd
+import pytest
+
+xr = pytest.importorskip('xarray')
+dask = pytest.importorskip('dask')
+
+
+@pytest.fixture
+def solar_position_cube():
+    coords = {'lat': [50, 55, 60], 'lon': [0, 10],
+              'time': pd.date_range('2020-06-01', periods=8, freq='h')}
+    shape = (3, 2, 8)
+    solar_elevation = np.linspace(-5, 40, np.prod(shape)).reshape(shape)
+    solar_azimuth = np.linspace(60, 300, np.prod(shape)).reshape(shape)
+    return (xr.DataArray(solar_elevation, coords=coords, dims=coords.keys()),
+            xr.DataArray(solar_azimuth, coords=coords, dims=coords.keys()))
+
+
+@pytest.mark.parametrize('scheduler', ['threads', 'processes'])
+def test_gridded_shaded_fraction_dask(tracker_field, solar_position_cube, scheduler):
+    # Test that the shaded fraction of dask-backed arrays is calculated
+    # lazily and matches the direct calculation
+    solar_elevation, solar_azimuth = solar_position_cube
+    expected = tracker_field.get_shaded_fraction(
+        solar_elevation.values, solar_azimuth.values)
+    chunks = {'lat': 2, 'time': 3}
+    result = gridded.gridded_shaded_fraction(
+        tracker_field, solar_elevation.chunk(chunks), solar_azimuth.chunk(chunks))
+    assert result.name == 'shaded_fraction'
+    assert isinstance(result.data, dask.array.Array)
+    assert result.chunks == solar_elevation.chunk(chunks).chunks
+    computed = result.compute(scheduler=scheduler)
+    xr.testing.assert_equal(computed.lat, solar_elevation.lat)
+    xr.testing.assert_equal(computed.time, solar_elevation.time)
+    np.testing.assert_allclose(computed.values, expected)
+
+
+def test_gridded_shaded_fraction_broadcast(tracker_field, solar_position_cube):
+    # Test that the inputs are broadcast and that numpy-backed arrays are
+    # calculated eagerly
+    solar_elevation, _ = solar_position_cube
+    solar_azimuth = xr.DataArray([90, 180, 270], dims='lat')
+    result = gridded.gridded_shaded_fraction(tracker_field, solar_elevation, solar_azimuth)
+    assert isinstance(result.data, np.ndarray)
+    assert result.dims == ('lat', 'lon', 'time')
+    expected = tracker_field.get_shaded_fraction(
+        solar_elevation.values,
+        np.broadcast_to(solar_azimuth.values[:, None, None], solar_elevation.shape))
+    np.testing.assert_allclose(result.values, expected)
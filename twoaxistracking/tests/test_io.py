@@ -0,0 +1,126 @@
+from twoaxistracking import io, lookup
+import numpy as np
+import pyarrow as pa
+import pytest
+import shapely
+
+
+@pytest.fixture
+def solar_position_table():
+    return pa.table({
+        'elevation': np.linspace(-5, 60, 40),
+        'azimuth': np.linspace(60, 240, 40),
+        'site': np.array(['barstow'] * 40)})
+
+
+@pytest.mark.parametrize('filename', ['solar_position.parquet', 'solar_position.arrow',
+                                      'solar_position.feather', 'solar_position.csv',
+                                      'solar_position'])
+def test_read_write_table(tmp_path, solar_position_table, filename):
+    # Test that the tables are written and read without changes
+    io.write_table(solar_position_table, tmp_path / filename)
+    table = io.read_table(tmp_path / filename)
+    assert table.select(solar_position_table.column_names).equals(solar_position_table)
+    table = io.read_table(tmp_path / filename, columns=['azimuth'])
+    assert table.column_names == ['azimuth']
+
+
+@pytest.mark.parametrize('filename', ['solar_position.arrow', 'solar_position'])
+def test_solar_position_arrays_memory_mapped(tmp_path, solar_position_table, filename):
+    # Test that the solar positions of memory-mapped files are read-only
+    # views rather than copies
+    io.write_table(solar_position_table, tmp_path / filename)
+    table = io.read_table(tmp_path / filename)
+    solar_elevation, solar_azimuth = io.solar_position_arrays(table)
+    for values in [solar_elevation, solar_azimuth]:
+        assert not values.flags.owndata
+        assert not values.flags.writeable
+    np.testing.assert_array_equal(solar_azimuth, solar_position_table['azimuth'])
+
+
+def test_solar_position_arrays_conversion():
+    # Test that integer columns are converted to floats and nulls to nan
+    table = pa.table({'apparent_elevation': pa.array([10, None, 30], type=pa.int32()),
+                      'azimuth': pa.chunked_array([[100.], [150., 200.]])})
+    solar_elevation, solar_azimuth = io.solar_position_arrays(
+        table, elevation_column='apparent_elevation')
+    np.testing.assert_array_equal(solar_elevation, [10, np.nan, 30])
+    np.testing.assert_array_equal(solar_azimuth, [100, 150, 200])
+    assert solar_elevation.dtype == float
+
+
+def test_shaded_fraction_table(tracker_field, solar_position_table):
+    solar_elevation = solar_position_table['elevation'].to_numpy()
+    solar_azimuth = solar_position_table['azimuth'].to_numpy()
+    result = io.shaded_fraction_table(tracker_field, solar_position_table)
+    assert result.column_names == ['elevation', 'azimuth', 'site', 'shaded_fraction']
+    np.testing.assert_array_equal(
+        result['shaded_fraction'], tracker_field.get_shaded_fraction(solar_elevation,
+                                                                     solar_azimuth))
+    # Lookup tables can be used in place of the tracker field
+    result = io.shaded_fraction_table(
+        lookup.ShadingLookupTable(tracker_field, tolerance=0.02), solar_position_table)
+    np.testing.assert_allclose(
+        result['shaded_fraction'], tracker_field.get_shaded_fraction(solar_elevation,
+                                                                     solar_azimuth),
+        atol=0.02)
+
+
+def test_unsupported_file_format(tmp_path, solar_position_table):
+    with pytest.raises(ValueError, match="Unsupported file format: .xlsx"):
+        io.read_table(tmp_path / 'solar_position.xlsx')
+    with pytest.raises(ValueError, match="Unsupported file format: .txt"):
+        io.write_table(solar_position_table, tmp_path / 'solar_position.txt')
+
+
+@pytest.mark.parametrize('tracker_field', [{'slope_tilt': 5}], indirect=True, ids=['sloped'])
+def test_shading_geometry_table(tracker_field, active_geometry_split):
+    # Night, below the slope horizon, shaded, and above the max shading elevation
+    solar_elevation = np.array([-5, 2, 10, 80, 15])
+    solar_azimuth = np.array([180, 180, 180, 180, 200])
+    table = io.shading_geometry_table(tracker_field, solar_elevation, solar_azimuth)
+    assert table.schema.field('unshaded_geometry').metadata[b'ARROW:extension:name'] == \
+        b'geoarrow.wkb'
+    np.testing.assert_array_equal(
+        table['shaded_fraction'],
+        tracker_field.get_shaded_fraction(solar_elevation, solar_azimuth))
+    unshaded_geometry = shapely.from_wkb(table['unshaded_geometry'].to_numpy(
+        zero_copy_only=False))
+    shading_geometry = shapely.from_wkb(table['shading_geometry'].to_numpy(
+        zero_copy_only=False))
+    assert unshaded_geometry[0] is None and shading_geometry[0] is None
+    assert unshaded_geometry[1].is_empty and shading_geometry[1].is_empty
+    assert unshaded_geometry[3].equals(active_geometry_split) and shading_geometry[3].is_empty
+
+    expected_unshaded, expected_shading, position_index = \
+        tracker_field._unshaded_geometries(solar_elevation[[2, 4]], solar_azimuth[[2, 4]])
+    for k, row in enumerate([2, 4]):
+        assert unshaded_geometry[row].equals_exact(expected_unshaded[k], tolerance=1e-12)
+        assert shapely.get_num_geometries(shading_geometry[row]) == np.sum(position_index == k)
+        for part, expected in zip(shapely.get_parts(shading_geometry[row]),
+                                  expected_shading[position_index == k]):
+            assert part.equals_exact(expected, tolerance=1e-12)
+
+
+@pytest.mark.parametrize('tracker_field', [{'slope_tilt': 5}], indirect=True, ids=['sloped'])
+@pytest.mark.parametrize('filename', ['geometries.parquet', 'geometries.arrow'])
+def test_write_shading_geometries(tmp_path, tracker_field, filename):
+    # Test that writing the geometries in chunks gives the same table as
+    # calculating them at once
+    solar_elevation = np.linspace(-10, 50, 25)
+    solar_azimuth = np.linspace(90, 270, 25)
+    io.write_shading_geometries(tracker_field, solar_elevation, solar_azimuth,
+                                tmp_path / filename, chunk_size=7)
+    table = io.read_table(tmp_path / filename)
+    expected = io.shading_geometry_table(tracker_field, solar_elevation, solar_azimuth)
+    np.testing.assert_array_equal(table['shaded_fraction'], expected['shaded_fraction'])
+    for name in ['unshaded_geometry', 'shading_geometry']:
+        assert table[name].equals(expected[name])
+    assert table.schema.field('shading_geometry').metadata == \
+        expected.schema.field('shading_geometry').metadata
+
+
+def test_write_shading_geometries_unsupported_format(tmp_path, tracker_field):
+    with pytest.raises(ValueError, match="only be written to Parquet or Arrow IPC"):
+        io.write_shading_geometries(tracker_field, [10], [180],
+                                    tmp_path / 'geometries.csv')
@@ -0,0 +1,69 @@
+from twoaxistracking import irradiance
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.mark.parametrize('n_patches', [145, 577, 2305])
+def test_sky_patches(n_patches):
+    # Test the number of patches of the Tregenza and Reinhart discretizations
+    # and that the weights of the patches sum to one
+    elevation, azimuth, weight = irradiance._sky_patches(n_patches)
+    assert len(elevation) == len(azimuth) == len(weight) == n_patches
+    np.testing.assert_allclose(weight.sum(), 1)
+
+
+def test_sky_patches_tregenza():
+    elevation, azimuth, weight = irradiance._sky_patches()
+    np.testing.assert_allclose(np.unique(elevation), [6, 18, 30, 42, 54, 66, 78, 90])
+    np.testing.assert_array_equal(np.unique(elevation, return_counts=True)[1],
+                                  [30, 30, 24, 24, 18, 12, 6, 1])
+
+
+@pytest.mark.parametrize('n_patches', [144, 146, 300])
+def test_sky_patches_invalid_number(n_patches):
+    with pytest.raises(ValueError, match='number of sky patches'):
+        irradiance._sky_patches(n_patches)
+
+
+def test_diffuse_shading_factor(tracker_field):
+    # Test that the diffuse shading factor is the weighted average of the
+    # shaded fraction of the sky patches and that it is cached
+    elevation, azimuth, weight = irradiance._sky_patches(577)
+    expected = np.sum(tracker_field.get_shaded_fraction(elevation, azimuth) * weight)
+    result = tracker_field.diffuse_shading_factor(n_patches=577, max_workers=3)
+    np.testing.assert_allclose(result, expected)
+    assert 0 < result < 1
+    assert tracker_field._diffuse_shading_factor == {577: result}
+    # The factor is similar for the Tregenza discretization
+    np.testing.assert_allclose(tracker_field.diffuse_shading_factor(), result, atol=0.01)
+
+
+def test_effective_irradiance(tracker_field):
+    index = pd.date_range('2020-06-01 04:00', freq='1h', periods=4)
+    solar_elevation = pd.Series([-2, 3, 10, 60], index=index)
+    solar_azimuth = pd.Series([60, 70, 80, 180], index=index)
+    dni = pd.Series([0, 100, 400, 900], index=index)
+    dhi = pd.Series([5, 50, 80, 100], index=index)
+    result = irradiance.effective_irradiance(
+        tracker_field, solar_elevation, solar_azimuth, dni, dhi)
+    pd.testing.assert_index_equal(result.index, index)
+    shaded_fraction = tracker_field.get_shaded_fraction(solar_elevation, solar_azimuth)
+    expected_direct = [0, *(dni * (1 - shaded_fraction))[1:]]
+    np.testing.assert_allclose(result['poa_direct'], expected_direct)
+    # Isotropic sky diffuse on a plane with a tilt equal to the zenith angle
+    np.testing.assert_allclose(
+        result['poa_diffuse'].iloc[-1],
+        100 * (1 + np.sin(np.deg2rad(60))) / 2
+        * (1 - tracker_field.diffuse_shading_factor()))
+    np.testing.assert_allclose(
+        result['poa_global'], result['poa_direct'] + result['poa_diffuse'])
+
+
+def test_effective_irradiance_array(tracker_field):
+    # Test that a RangeIndex is used when the inputs are not pandas Series
+    result = irradiance.effective_irradiance(
+        tracker_field, np.array([45]), np.array([180]), np.array([800]),
+        np.array([100]))
+    assert isinstance(result.index, pd.RangeIndex)
+    np.testing.assert_allclose(result['poa_direct'], 800)
@@ -1,4 +1,4 @@
-from twoaxistracking import layout
+from twoaxistracking import layout, shading
 from shapely import geometry
 import numpy as np
 import pytest
@@ -175,3 +175,107 @@ def test_calculation_of_max_shading_elevation_circle(circular_geometry):
     max_shading_elevation = layout.max_shading_elevation(
         collector_geometry, tracker_distance, relative_slope)
     np.testing.assert_allclose(max_shading_elevation, 52.989564)
+
+
+def test_generate_field_layouts(rectangular_geometry):
+    # Test that the batched layouts are identical to the individual layouts
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    gcr = np.array([0.1, 0.2, 0.3])
+    aspect_ratio = np.array([1, 1.5, np.sqrt(3)/2])
+    offset = np.array([0, 0.2, -0.5])
+    field_layouts = layout.generate_field_layouts(
+        gcr=gcr, total_collector_area=collector_geometry.area,
+        min_tracker_spacing=min_tracker_spacing, neighbor_order=2,
+        aspect_ratio=aspect_ratio, offset=offset, rotation=30,
+        slope_azimuth=200, slope_tilt=3)
+    for i in range(3):
+        expected = layout.generate_field_layout(
+            gcr=gcr[i], total_collector_area=collector_geometry.area,
+            min_tracker_spacing=min_tracker_spacing, neighbor_order=2,
+            aspect_ratio=aspect_ratio[i], offset=offset[i], rotation=30,
+            slope_azimuth=200, slope_tilt=3)
+        for result_array, expected_array in zip(field_layouts, expected):
+            assert result_array.shape == (3, 24)
+            np.testing.assert_allclose(result_array[i], expected_array)
+
+
+def test_generate_field_layouts_value_error(rectangular_geometry):
+    # Test that a ValueError is raised if any of the layouts is invalid
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    with pytest.raises(ValueError, match="Maximum ground cover ratio exceded"):
+        _ = layout.generate_field_layouts(
+            gcr=[0.1, 0.5], total_collector_area=collector_geometry.area,
+            min_tracker_spacing=min_tracker_spacing, neighbor_order=1,
+            aspect_ratio=1, offset=0, rotation=0)
+
+
+def test_can_shade():
+    # A collector at a distance of 10 can shade a collector with a minimum
+    # tracker spacing of 2 for solar elevation angles below asin(0.2)=11.54°
+    tracker_distance = np.array([10, 10, 10, 10, 10])
+    relative_slope = np.array([0, 0, 5, -5, -80])
+    result = layout._can_shade(tracker_distance, relative_slope, 2, [11.5, 11.6, 16, 16, 11.6])
+    np.testing.assert_array_equal(result, [True, False, True, False, False])
+
+
+def test_min_solar_elevation(rectangular_geometry):
+    # Test that neighbors which cannot cast shade above the minimum solar
+    # elevation are removed without changing the shaded fraction
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    full_layout = layout.generate_field_layout(
+        gcr=0.2, total_collector_area=collector_geometry.area,
+        min_tracker_spacing=min_tracker_spacing, neighbor_order=6,
+        aspect_ratio=1.2, offset=0.1, rotation=20, slope_azimuth=150, slope_tilt=4)
+    reduced_layout = layout.generate_field_layout(
+        gcr=0.2, total_collector_area=collector_geometry.area,
+        min_tracker_spacing=min_tracker_spacing, neighbor_order=6,
+        aspect_ratio=1.2, offset=0.1, rotation=20, slope_azimuth=150, slope_tilt=4,
+        min_solar_elevation=5)
+    assert len(reduced_layout[0]) < len(full_layout[0])
+    for solar_elevation in [5, 6, 8, 12]:
+        for solar_azimuth in np.arange(0, 360, 7.5):
+            full = shading.shaded_fraction(
+                solar_elevation, solar_azimuth, collector_geometry,
+                collector_geometry, min_tracker_spacing, *full_layout[3:],
+                slope_azimuth=150, slope_tilt=4)
+            reduced = shading.shaded_fraction(
+                solar_elevation, solar_azimuth, collector_geometry,
+                collector_geometry, min_tracker_spacing, *reduced_layout[3:],
+                slope_azimuth=150, slope_tilt=4)
+            np.testing.assert_allclose(full, reduced)
+
+
+@pytest.mark.parametrize('aspect_ratio, offset, slope_tilt', [
+    (1, 0, 0), (1.5, -0.5, 0), (2, 0.3, 5)])
+def test_required_neighbor_order(rectangular_geometry, aspect_ratio, offset, slope_tilt):
+    # Test that increasing the neighbor order beyond the required neighbor
+    # order does not add any neighbors that can cast shade
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    kwargs = dict(gcr=0.15, total_collector_area=collector_geometry.area,
+                  min_tracker_spacing=min_tracker_spacing, aspect_ratio=aspect_ratio,
+                  offset=offset)
+    neighbor_order = layout._required_neighbor_order(
+        slope_tilt=slope_tilt, min_solar_elevation=8, **kwargs)
+    required = layout.generate_field_layout(
+        neighbor_order=neighbor_order, rotation=0, slope_azimuth=0,
+        slope_tilt=slope_tilt, min_solar_elevation=8, **kwargs)
+    extended = layout.generate_field_layout(
+        neighbor_order=neighbor_order + 3, rotation=0, slope_azimuth=0,
+        slope_tilt=slope_tilt, min_solar_elevation=8, **kwargs)
+    assert len(required[0]) == len(extended[0])
+
+
+def test_required_neighbor_order_value_error(rectangular_geometry):
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    with pytest.raises(ValueError, match="must be greater than the slope tilt"):
+        layout._required_neighbor_order(
+            gcr=0.15, total_collector_area=collector_geometry.area,
+            min_tracker_spacing=min_tracker_spacing, aspect_ratio=1, offset=0,
+            slope_tilt=5, min_solar_elevation=5)
+
+
+def test_max_shading_elevation_no_neighbors(rectangular_geometry):
+    # Test that the maximum shading elevation is zero without neighbors
+    collector_geometry, _ = rectangular_geometry
+    result = layout.max_shading_elevation(collector_geometry, np.array([]), np.array([]))
+    assert result == 0
@@ -0,0 +1,93 @@
+from twoaxistracking import lookup, trackerfield, shading
+from shapely import geometry
+import numpy as np
+import pandas as pd
+import pytest
+
+
+# Sloped field, so that the lookup tables also cover fully shaded positions
+sloped_field = pytest.mark.parametrize('tracker_field', [dict(
+    active_collector_geometry=geometry.box(-2, -1, 2, 1), layout_type='hexagonal_n_s',
+    slope_azimuth=90, slope_tilt=3)], indirect=True, ids=['sloped'])
+
+
+@sloped_field
+def test_lookup_table_accuracy(tracker_field):
+    # Test that the interpolated shaded fraction is close to the calculated
+    # shaded fraction and that the refinement reduces the error
+    rng = np.random.default_rng(0)
+    solar_elevation = rng.uniform(-5, 35, 2000)
+    solar_azimuth = rng.uniform(0, 360, 2000)
+    expected = tracker_field.get_shaded_fraction(solar_elevation, solar_azimuth)
+    coarse = lookup.ShadingLookupTable(tracker_field, tolerance=0.05)
+    fine = lookup.ShadingLookupTable(tracker_field, tolerance=0.01)
+    coarse_error = np.abs(coarse.get_shaded_fraction(solar_elevation, solar_azimuth)
+                          - expected)
+    fine_error = np.abs(fine.get_shaded_fraction(solar_elevation, solar_azimuth) - expected)
+    # Night, unshaded, and fully shaded solar positions are exact
+    np.testing.assert_array_equal(np.isnan(fine_error), solar_elevation < 0)
+    labels = tracker_field._classify_solar_positions(solar_elevation, solar_azimuth)
+    np.testing.assert_array_equal(
+        fine_error[np.isin(labels, [shading._UNSHADED, shading._FULLY_SHADED])], 0)
+    assert np.nanmax(fine_error) <= 0.01
+    assert np.nanmax(coarse_error) <= 0.05
+    assert np.nanmean(fine_error) < 0.01 / 4
+    assert np.nanmean(fine_error) < np.nanmean(coarse_error)
+    assert coarse.n_cells < fine.n_cells
+    # The refinement is adaptive and uses fewer evaluations than a uniform
+    # grid with the resolution of the smallest cells
+    smallest_cell = np.min((fine._upper_elevation - fine._lower_elevation)
+                           * (fine._right_azimuth - fine._left_azimuth))
+    assert fine.n_evaluations < 0.1 * 360 * tracker_field.max_shading_elevation \
+        / smallest_cell
+
+
+@sloped_field
+def test_lookup_table_error_bound(tracker_field):
+    # Test that the interpolation error is within the tolerance on a dense
+    # grid of solar positions, which are offset from the cell edges
+    solar_elevation, solar_azimuth = [grid.ravel() for grid in np.meshgrid(
+        np.arange(0.05, tracker_field.max_shading_elevation, 0.2),
+        np.arange(0.1, 360, 0.4))]
+    expected = tracker_field.get_shaded_fraction(solar_elevation, solar_azimuth)
+    table = lookup.ShadingLookupTable(tracker_field, tolerance=0.05)
+    error = np.abs(table.get_shaded_fraction(solar_elevation, solar_azimuth) - expected)
+    assert np.nanmax(error) <= table.tolerance
+
+
+@sloped_field
+def test_lookup_table_max_depth(tracker_field):
+    # Test that only the corners of the root cells are calculated when the
+    # cells cannot be split
+    table = lookup.ShadingLookupTable(tracker_field, max_depth=0, elevation_step=10,
+                                      azimuth_step=90)
+    n_elevation = np.ceil(tracker_field.max_shading_elevation / 10)
+    assert table.n_cells == 4 * n_elevation
+    assert table.n_evaluations == 5 * (n_elevation + 1)
+
+
+@sloped_field
+def test_lookup_table_input_types(tracker_field):
+    # Test that the output is of the same type as the inputs
+    table = lookup.ShadingLookupTable(tracker_field, tolerance=0.05)
+    index = pd.date_range('2020-01-01', periods=3, freq='h')
+    solar_elevation = pd.Series([10, 50, -2], index=index)
+    solar_azimuth = pd.Series([100, 200, 300], index=index)
+    result = table.get_shaded_fraction(solar_elevation, solar_azimuth)
+    assert isinstance(result, pd.Series)
+    pd.testing.assert_index_equal(result.index, index)
+    assert isinstance(table.get_shaded_fraction(10, 450), float)
+    assert table.get_shaded_fraction(10, 450) == table.get_shaded_fraction(10, 90)
+    assert isinstance(table.get_shaded_fraction([10], [90]), list)
+
+
+def test_lookup_table_no_neighbors(rectangular_geometry):
+    # Test a field where shading cannot occur
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=collector_geometry,
+        neighbor_order=None, gcr=0.05, layout_type='square', min_solar_elevation=60)
+    table = lookup.ShadingLookupTable(field)
+    np.testing.assert_allclose(table.get_shaded_fraction([0, 10, 70], [0, 90, 180]),
+                               [1, 0, 0])
@@ -1,7 +1,9 @@
 import matplotlib.pyplot as plt
+from matplotlib import animation
 from twoaxistracking import plotting, trackerfield
 from .conftest import assert_isinstance
 import numpy as np
+import pytest
 from shapely import geometry
 
 
@@ -54,3 +56,137 @@ def test_plotting_of_field_layout(rectangular_geometry):
     result = field.plot_field_layout()
     assert_isinstance(result, plt.Figure)
     plt.close('all')
+
+
+def test_plotting_of_shaded_fraction(rectangular_geometry, active_geometry_split):
+    # Test that a figure is created for each solar position that requires
+    # the geometric shading calculation
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=active_geometry_split,
+        neighbor_order=1,
+        gcr=0.25,
+        layout_type='square',
+    )
+    plt.close('all')
+    field.get_shaded_fraction([-1, 3, 5, 60], [120, 120, 145, 180], plot=True)
+    assert len(plt.get_fignums()) == 2
+    plt.close('all')
+
+
+def test_plotting_of_sky_shading_map(rectangular_geometry):
+    # Test if plot_sky_shading_map returns a figure object
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=collector_geometry,
+        neighbor_order=1,
+        gcr=0.25,
+        layout_type='square')
+    result = field.plot_sky_shading_map(azimuth_step=30, elevation_step=10)
+    assert_isinstance(result, plt.Figure)
+    plt.close('all')
+
+
+def test_save_shading_animation(rectangular_geometry, tmp_path):
+    # Test that one frame is written for each solar position and that the
+    # figure is closed afterwards
+    from PIL import Image
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=collector_geometry,
+        neighbor_order=1,
+        gcr=0.25,
+        layout_type='square')
+    solar_elevation = [-1, 0.5, 5, 10, 80]
+    solar_azimuth = [90, 95, 100, 135, 180]
+    filename = tmp_path / 'shading.gif'
+    field.save_shading_animation(solar_elevation, solar_azimuth, filename, dpi=20)
+    with Image.open(filename) as image:
+        assert image.n_frames == 5
+    assert plt.get_fignums() == []
+    # Specifying the writer
+    field.save_shading_animation(solar_elevation, solar_azimuth, tmp_path / 'shading.png',
+                                 dpi=20, writer=animation.PillowWriter(fps=2))
+    with Image.open(tmp_path / 'shading.png') as image:
+        assert image.n_frames == 5
+
+
+def test_save_shading_animation_chunks(rectangular_geometry, tmp_path, monkeypatch):
+    # Test that the geometries are calculated in chunks while the frames are
+    # written, rather than for all solar positions up front
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=collector_geometry,
+        neighbor_order=1,
+        gcr=0.25,
+        layout_type='square')
+    events = []
+    unshaded_geometries = field._unshaded_geometries
+
+    def recorded_unshaded_geometries(solar_elevation, solar_azimuth):
+        events.append('chunk')
+        return unshaded_geometries(solar_elevation, solar_azimuth)
+
+    class RecordingWriter(animation.PillowWriter):
+        def grab_frame(self, **savefig_kwargs):
+            events.append('frame')
+            super().grab_frame(**savefig_kwargs)
+
+    monkeypatch.setattr(field, '_unshaded_geometries', recorded_unshaded_geometries)
+    field.save_shading_animation([-1, 0.5, 5, 10, 80], [90, 95, 100, 135, 180],
+                                 tmp_path / 'shading.gif', dpi=20, writer=RecordingWriter(),
+                                 chunk_size=2)
+    assert events == ['chunk', 'frame', 'frame', 'chunk', 'frame', 'frame', 'chunk', 'frame']
+
+
+def test_save_shading_animation_default_writer(rectangular_geometry, tmp_path):
+    # Test that ffmpeg is used for other file formats than gif
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=collector_geometry,
+        neighbor_order=1,
+        gcr=0.25,
+        layout_type='square')
+    filename = tmp_path / 'shading.mp4'
+    if animation.writers.is_available('ffmpeg'):
+        field.save_shading_animation([5, 10], [100, 135], filename, dpi=20)
+        assert filename.exists()
+    else:
+        with pytest.raises(RuntimeError, match='ffmpeg'):
+            field.save_shading_animation([5, 10], [100, 135], filename, dpi=20)
+
+
+def test_plot_tracker_layout():
+    # Test plotting of a large field with and without circles and values
+    X, Y = np.meshgrid(np.arange(150) * 10., np.arange(100) * 6.)
+    values = np.linspace(0, 0.05, X.size)
+    result = plotting.plot_tracker_layout(X, Y, values=values, label='Shading loss')
+    assert_isinstance(result, plt.Figure)
+    assert result.axes[0].collections[0].get_rasterized()
+    assert len(result.axes) == 2  # Includes the colorbar
+    fig, ax = plt.subplots()
+    result = plotting.plot_tracker_layout(X[:10], Y[:10], min_tracker_spacing=4.5, ax=ax)
+    assert result is fig
+    assert not ax.collections[0].get_rasterized()
+    assert ax.get_xlim() == (-4.5, 1494.5)
+    assert ax.get_ylim() == (-4.5, 58.5)
+    plt.close('all')
+
+
+def test_plot_tracker_layout_decimation():
+    # Test that a subset of the trackers is plotted when the number of
+    # trackers exceeds max_points
+    X, Y = np.meshgrid(np.arange(150) * 10., np.arange(100) * 6.)
+    values = X / 1490
+    result = plotting.plot_tracker_layout(X, Y, values=values, min_tracker_spacing=4.5,
+                                          max_points=1000, rasterized=True)
+    collection = result.axes[0].collections[0]
+    assert len(collection.get_offsets()) == 1000
+    np.testing.assert_allclose(collection.get_array(), collection.get_offsets()[:, 0] / 1490)
+    assert collection.get_rasterized()
+    plt.close('all')
@@ -0,0 +1,86 @@
+from twoaxistracking import gridded, shading, trackerfield
+from twoaxistracking.tests import reference_dataset
+import numpy as np
+import pytest
+import xarray as xr
+
+
+# Shading engines validated against the reference dataset. Each engine takes
+# a tracker field and arrays of solar elevation and azimuth angles. The
+# speedup of the threads is the ratio of the recorded throughputs of the
+# parallel and the chunked engine, which only differ in the number of threads.
+ENGINES = {
+    'shaded_fraction': reference_dataset.scalar_shaded_fraction,
+    'get_shaded_fraction': lambda tracker_field, solar_elevation, solar_azimuth:
+        tracker_field.get_shaded_fraction(solar_elevation, solar_azimuth),
+    'chunked_shaded_fraction': lambda tracker_field, solar_elevation, solar_azimuth:
+        tracker_field.get_shaded_fraction(solar_elevation, solar_azimuth, max_workers=1,
+                                          chunk_size=500),
+    'parallel_shaded_fraction': lambda tracker_field, solar_elevation, solar_azimuth:
+        tracker_field.get_shaded_fraction(solar_elevation, solar_azimuth, max_workers=4,
+                                          chunk_size=500),
+    'gridded_shaded_fraction': lambda tracker_field, solar_elevation, solar_azimuth:
+        gridded.gridded_shaded_fraction(
+            tracker_field, xr.DataArray(solar_elevation).chunk(4096),
+            xr.DataArray(solar_azimuth).chunk(4096)).values,
+}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_engine_matches_reference_dataset(engine, record_property):
+    # Test that the engine reproduces the reference shaded fractions and
+    # record the runtime of each scenario, e.g., for the junit xml report
+    results = reference_dataset.evaluate_engine(ENGINES[engine])
+    for scenario, result in results.iterrows():
+        record_property(f'{scenario}_runtime', result['runtime'])
+        record_property(f'{scenario}_throughput', result['throughput'])
+    assert np.all(results['max_difference'] < 1e-9)
+
+
+def test_reference_dataset_is_deterministic(tmp_path):
+    # Test that the stored reference dataset is reproduced when regenerated
+    # with the independent reference implementation
+    path = tmp_path / 'reference_dataset.npz'
+    reference_dataset.generate_reference_dataset(path)
+    stored, generated = np.load(reference_dataset.REFERENCE_DATASET), np.load(path)
+    assert sorted(stored.files) == sorted(generated.files)
+    for name in stored.files:
+        np.testing.assert_allclose(generated[name], stored[name], rtol=0, atol=1e-9)
+
+
+def test_reference_dataset_scenarios(square_field_layout, square_field_layout_sloped):
+    # Test that the scenarios use the layouts of the test fixtures
+    for scenario, field_layout in [('square', square_field_layout),
+                                   ('square_sloped', square_field_layout_sloped)]:
+        tracker_field = trackerfield.TrackerField(**reference_dataset.SCENARIOS[scenario])
+        np.testing.assert_allclose(tracker_field.tracker_distance, field_layout[3])
+        np.testing.assert_allclose(tracker_field.relative_azimuth, field_layout[4])
+        np.testing.assert_allclose(tracker_field.relative_slope, field_layout[5], atol=1e-6)
+
+
+def test_reference_shaded_fraction_is_independent(monkeypatch):
+    # Test that the reference implementation does not use the shading module,
+    # so that errors in the shared shading helpers are caught by the engines
+    tracker_field = trackerfield.TrackerField(**reference_dataset.SCENARIOS['square_sloped'])
+    for name in dir(shading):
+        if callable(getattr(shading, name)) and not name.startswith('__'):
+            monkeypatch.setattr(shading, name, None)
+    reference = np.load(reference_dataset.REFERENCE_DATASET)
+    np.testing.assert_allclose(
+        reference_dataset.reference_shaded_fraction(
+            tracker_field, reference['solar_elevation'][:2000],
+            reference['solar_azimuth'][:2000]),
+        reference['square_sloped'][:2000], rtol=0, atol=1e-9)
+
+
+def test_evaluate_engine_detects_differences():
+    # Test that differences and missing values are reported
+    def offset_engine(tracker_field, solar_elevation, solar_azimuth):
+        shaded_fraction = tracker_field.get_shaded_fraction(solar_elevation, solar_azimuth)
+        shaded_fraction[solar_elevation > 0] += 0.01
+        shaded_fraction[0] = 0.5
+        return shaded_fraction
+
+    results = reference_dataset.evaluate_engine(offset_engine)
+    assert list(results.index) == list(reference_dataset.SCENARIOS)
+    assert np.all(results['max_difference'] == np.inf)
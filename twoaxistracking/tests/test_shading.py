@@ -1,5 +1,6 @@
 from twoaxistracking import shading
 import numpy as np
+import pytest
 from shapely import geometry
 import shapely
 
@@ -235,3 +236,104 @@ def test_return_geometries_normal_case(
     assert geometries['shading_geometries'][0].equals_exact(
         expected_shading_geometries, tolerance=0.00001)
     assert len(geometries['shading_geometries']) == 1
+
+
+def test_classify_solar_positions():
+    # Test that the vectorized classification gives the same labels as the
+    # early-exit conditions in shaded_fraction
+    solar_elevation = np.array([-5, np.nan, 0, 3, 9, 40, 60])
+    solar_azimuth = np.array([180, 180, 90, 180, 180, 180, 0])
+    labels = shading._classify_solar_positions(
+        solar_elevation, solar_azimuth, slope_azimuth=0, slope_tilt=10,
+        max_shading_elevation=50)
+    expected = [shading._NIGHT, shading._NIGHT, shading._FULLY_SHADED,
+                shading._FULLY_SHADED, shading._FULLY_SHADED,
+                shading._NEEDS_GEOMETRY, shading._UNSHADED]
+    np.testing.assert_array_equal(labels, expected)
+
+
+def test_horizon_lookup_table():
+    # Test that the horizon profile is interpolated periodically across north
+    # and that negative horizon elevation angles are set to zero
+    table = shading._horizon_lookup_table([350, 90, 10, 180], [8, 4, -2, 6], n_azimuths=36)
+    assert len(table) == 36
+    np.testing.assert_allclose(table[[0, 1, 9, 18, 35]], [3, 0, 4, 6, 8])
+    np.testing.assert_allclose(
+        shading._horizon_lookup(table, np.array([355, 5, 90, 365, -5, np.nan])),
+        [5.5, 1.5, 4, 1.5, 5.5, 3])
+
+
+@pytest.mark.parametrize('azimuth, elevation', [
+    ([0, 90], [1, 2, 3]), ([[0, 90]], [[1, 2]]), ([], [])])
+def test_horizon_lookup_table_value_error(azimuth, elevation):
+    with pytest.raises(ValueError, match="must consist of one-dimensional"):
+        shading._horizon_lookup_table(azimuth, elevation)
+
+
+def test_classify_solar_positions_horizon_profile():
+    # Test that solar positions below the horizon profile are fully shaded
+    horizon_profile = shading._horizon_lookup_table([0, 90, 180, 270], [0, 0, 20, 0])
+    labels = shading._classify_solar_positions(
+        [10, 10, 25], [90, 180, 180], slope_azimuth=0, slope_tilt=0,
+        max_shading_elevation=30, horizon_profile=horizon_profile)
+    np.testing.assert_array_equal(
+        labels, [shading._NEEDS_GEOMETRY, shading._FULLY_SHADED, shading._NEEDS_GEOMETRY])
+    # The horizon profile takes precedence over the maximum shading elevation
+    labels = shading._classify_solar_positions(
+        [15, 15, -1], [90, 180, 180], slope_azimuth=0, slope_tilt=0,
+        max_shading_elevation=5, horizon_profile=horizon_profile)
+    np.testing.assert_array_equal(
+        labels, [shading._UNSHADED, shading._FULLY_SHADED, shading._NIGHT])
+
+
+def test_translate_geometry(circular_geometry):
+    # Test that offsetting the coordinates gives the same geometries as
+    # shapely.affinity.translate
+    collector_geometry, _ = circular_geometry
+    xoff = np.array([-3.5, 0, 2.25])
+    yoff = np.array([1, -4, 0.5])
+    result = shading._translate_geometry(collector_geometry, xoff, yoff)
+    for geom, x, y in zip(result, xoff, yoff):
+        assert geom.equals_exact(
+            shapely.affinity.translate(collector_geometry, x, y), tolerance=1e-12)
+
+
+def test_unshaded_geometries_geometry_index(rectangular_geometry, circular_geometry):
+    # Test that the shading geometries are created from the geometry of each
+    # neighboring collector
+    rectangular_collector, _ = rectangular_geometry
+    circular_collector, _ = circular_geometry
+    xoff = np.array([[-3, 3.5, 0], [0.5, 10, 1]])
+    yoff = np.array([[1, -0.5, 9], [1, 10, -1.5]])
+    shades = np.array([[True, True, False], [True, False, True]])
+    geometry_index = np.array([1, 0, 1])
+    collector_geometries = np.array([rectangular_collector, circular_collector])
+    unshaded_geometries, shading_geometries, position_index = \
+        shading._unshaded_geometries(xoff, yoff, shades, collector_geometries,
+                                     rectangular_collector, geometry_index=geometry_index)
+    np.testing.assert_array_equal(position_index, [0, 0, 1, 1])
+    expected_geometries = [
+        shapely.affinity.translate(circular_collector, -3, 1),
+        shapely.affinity.translate(rectangular_collector, 3.5, -0.5),
+        shapely.affinity.translate(circular_collector, 0.5, 1),
+        shapely.affinity.translate(circular_collector, 1, -1.5)]
+    for geom, expected in zip(shading_geometries, expected_geometries):
+        assert geom.equals_exact(expected, tolerance=1e-12)
+    for k in range(2):
+        expected = rectangular_collector.difference(
+            shapely.union_all(shading_geometries[position_index == k]))
+        assert unshaded_geometries[k].symmetric_difference(expected).area < 1e-9
+
+
+def test_shaded_fraction_does_not_prepare_geometry(rectangular_geometry, square_field_layout):
+    # Test that the geometries passed by the user are not modified, as
+    # prepared geometries are not safe to share between threads
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    active_geometry = geometry.box(-1, -0.5, 1, 0.5)
+    _, _, _, tracker_distance, relative_azimuth, relative_slope = square_field_layout
+    shaded_fraction = shading.shaded_fraction(
+        3, 120, collector_geometry, active_geometry, min_tracker_spacing,
+        tracker_distance, relative_azimuth, relative_slope)
+    assert shaded_fraction > 0
+    assert not shapely.is_prepared(active_geometry)
+    assert not shapely.is_prepared(collector_geometry)
@@ -0,0 +1,225 @@
+from twoaxistracking import terrain, trackerfield, shading
+import numpy as np
+import pandas as pd
+import pickle
+import pytest
+
+
+@pytest.fixture
+def sloped_heightmap():
+    # Planar terrain corresponding to a slope with an azimuth of 160° and a
+    # tilt of 5°
+    x = np.arange(-80, 81, 5.)
+    y = np.arange(-100, 101, 2.5)
+    X, Y = np.meshgrid(x, y)
+    heights = -(X * np.sin(np.deg2rad(160)) + Y * np.cos(np.deg2rad(160))) \
+        * np.tan(np.deg2rad(5))
+    return x, y, heights
+
+
+def test_terrain_height(sloped_heightmap):
+    # Test that the bilinear interpolation reproduces a planar terrain and
+    # that points outside the heightmap are nan
+    x, y, heights = sloped_heightmap
+    xi = np.array([0, 12.3, -80, 80, -47.1, 81, 0])
+    yi = np.array([0, -7.7, -100, 100, 33.3, 0, -100.1])
+    expected = -(xi * np.sin(np.deg2rad(160)) + yi * np.cos(np.deg2rad(160))) \
+        * np.tan(np.deg2rad(5))
+    expected[-2:] = np.nan
+    np.testing.assert_allclose(terrain.terrain_height(x, y, heights, xi, yi), expected)
+
+
+def test_terrain_height_bilinear():
+    # Test the interpolation within a single grid cell
+    heights = np.array([[0, 1], [2, 4]])
+    result = terrain.terrain_height([0, 1], [0, 1], heights, [0.5, 0.25], [0.5, 1])
+    np.testing.assert_allclose(result, [1.75, 2.5])
+
+
+@pytest.mark.parametrize('x, y, heights, match', [
+    ([0, 2, 1], [0, 1], np.zeros((2, 3)), 'strictly increasing'),
+    ([0], [0, 1], np.zeros((2, 1)), 'strictly increasing'),
+    ([0, 1], [0, 1, 2], np.zeros((2, 3)), 'shape of the terrain heights'),
+])
+def test_terrain_value_error(x, y, heights, match):
+    with pytest.raises(ValueError, match=match):
+        terrain.terrain_height(x, y, heights, 0, 0)
+
+
+def test_terrain_horizon_profile(sloped_heightmap):
+    # Test that the horizon of a planar terrain equals the slope horizon
+    azimuth = np.arange(0, 360, 5)
+    result = terrain.terrain_horizon_profile(*sloped_heightmap, azimuth=azimuth)
+    expected = shading.horizon_elevation_angle(azimuth, 160, 5)
+    np.testing.assert_allclose(result, expected, atol=1e-10)
+    assert len(terrain.terrain_horizon_profile(*sloped_heightmap)) == 360
+
+
+@pytest.fixture
+def field_kwargs(rectangular_geometry):
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    return dict(total_collector_geometry=collector_geometry,
+                active_collector_geometry=collector_geometry,
+                gcr=0.2, layout_type='hexagonal_n_s')
+
+
+def test_heightmap_planar(field_kwargs, sloped_heightmap):
+    # Test that a planar heightmap gives the same result as a sloped field,
+    # whose horizon is seen from the ground
+    field = trackerfield.TrackerField(
+        neighbor_order=2, heightmap=sloped_heightmap, mounting_height=0, **field_kwargs)
+    sloped_field = trackerfield.TrackerField(
+        neighbor_order=2, slope_azimuth=160, slope_tilt=5, **field_kwargs)
+    np.testing.assert_allclose(field.relative_slope, sloped_field.relative_slope)
+    np.testing.assert_allclose(field.Z, field.tracker_distance
+                               * np.tan(np.deg2rad(field.relative_slope)))
+    solar_elevation = np.repeat(np.arange(-1, 30, 1.5), 18)
+    solar_azimuth = np.tile(np.arange(0, 360, 20), 21)
+    np.testing.assert_allclose(
+        field.get_shaded_fraction(solar_elevation, solar_azimuth),
+        sloped_field.get_shaded_fraction(solar_elevation, solar_azimuth))
+
+
+def test_heightmap_min_solar_elevation(field_kwargs, sloped_heightmap):
+    # Test that the neighbors derived from the minimum solar elevation
+    # include all neighbors that can shade on the terrain
+    field = trackerfield.TrackerField(
+        neighbor_order=None, min_solar_elevation=15, heightmap=sloped_heightmap,
+        **field_kwargs)
+    reference_field = trackerfield.TrackerField(
+        neighbor_order=field.neighbor_order + 2, heightmap=sloped_heightmap,
+        **field_kwargs)
+    assert len(field.X) < len(reference_field.X)
+    solar_elevation = np.repeat(np.arange(15, 37, 2), 18)
+    solar_azimuth = np.tile(np.arange(0, 360, 20), 11)
+    np.testing.assert_allclose(
+        field.get_shaded_fraction(solar_elevation, solar_azimuth),
+        reference_field.get_shaded_fraction(solar_elevation, solar_azimuth))
+
+
+def test_heightmap_mountain(field_kwargs):
+    # Test that a distant mountain in the south shades the collectors above
+    # the maximum shading elevation of the neighboring collectors
+    x = y = np.arange(-100, 101, 4.)
+    X, Y = np.meshgrid(x, y)
+    heights = 50 * np.exp(-(X**2 + (Y + 90)**2) / 200)
+    field = trackerfield.TrackerField(neighbor_order=1, heightmap=(x, y, heights),
+                                      **field_kwargs)
+    # The horizon does not raise the maximum shading elevation
+    assert field.max_shading_elevation < 25 < field._horizon_profile.max()
+    result = field.get_shaded_fraction([25, 25, 60], [180, 90, 180])
+    np.testing.assert_allclose(result, [1, 0, 0])
+
+
+def test_terrain_horizon_profile_observer_height():
+    # Test that the horizon is seen from the observer height above the terrain
+    x = y = np.arange(-50, 51, 1.)
+    X, Y = np.meshgrid(x, y)
+    # A 1 m high mound 10 m south of the collector
+    heights = np.where((np.abs(X) <= 2) & (np.abs(Y + 10) <= 2), 1., 0.)
+    ground = terrain.terrain_horizon_profile(x, y, heights, azimuth=[180])
+    np.testing.assert_allclose(ground, np.rad2deg(np.arctan(1 / 8)))
+    elevated = terrain.terrain_horizon_profile(x, y, heights, azimuth=[180],
+                                               observer_height=0.5)
+    np.testing.assert_allclose(elevated, np.rad2deg(np.arctan(0.5 / 8)))
+    above = terrain.terrain_horizon_profile(x, y, heights, azimuth=[180],
+                                            observer_height=1.5)
+    np.testing.assert_allclose(above, 0)
+
+
+def test_heightmap_low_bump(field_kwargs):
+    # Test that a low bump close to the collector does not shade the
+    # collector, which is mounted above it
+    x = y = np.arange(-60, 61, 1.)
+    X, Y = np.meshgrid(x, y)
+    heights = np.where((np.abs(X) <= 2) & (np.abs(Y + 10) <= 2), 1., 0.)
+    field = trackerfield.TrackerField(neighbor_order=1, heightmap=(x, y, heights),
+                                      **field_kwargs)
+    flat_field = trackerfield.TrackerField(neighbor_order=1, **field_kwargs)
+    assert field.mounting_height is None
+    np.testing.assert_allclose(field._horizon_profile, 0)
+    solar_elevation, solar_azimuth = [4, 4, 20], [180, 170, 180]
+    np.testing.assert_allclose(field.get_shaded_fraction(solar_elevation, solar_azimuth),
+                               flat_field.get_shaded_fraction(solar_elevation, solar_azimuth))
+    # Seen from the ground, the bump is a horizon of 7.1°
+    ground_field = trackerfield.TrackerField(
+        neighbor_order=1, heightmap=(x, y, heights), mounting_height=0, **field_kwargs)
+    assert ground_field.get_shaded_fraction(4, 180) == 1
+
+
+def test_heightmap_is_not_serialized(field_kwargs):
+    # Test that only the derived layout and horizon are serialized, not the
+    # heightmap, so that fields with large heightmaps are cheap to pickle
+    x = y = np.linspace(-100, 100, 1001)
+    X, Y = np.meshgrid(x, y)
+    heights = 50 * np.exp(-(X**2 + (Y + 90)**2) / 200)
+    field = trackerfield.TrackerField(neighbor_order=2, heightmap=(x, y, heights),
+                                      **field_kwargs)
+    data = pickle.dumps(field)
+    assert len(data) < 100e3
+    assert 'heightmap' not in field.to_dict()
+    new_field = pickle.loads(data)
+    np.testing.assert_array_equal(new_field._horizon_profile, field._horizon_profile)
+    np.testing.assert_array_equal(new_field.relative_slope, field.relative_slope)
+    solar_elevation = np.repeat(np.arange(1, 40, 3.), 18)
+    solar_azimuth = np.tile(np.arange(0, 360, 20), 13)
+    np.testing.assert_array_equal(
+        new_field.get_shaded_fraction(solar_elevation, solar_azimuth),
+        field.get_shaded_fraction(solar_elevation, solar_azimuth))
+    with pytest.raises(ValueError, match="not supported for fields with a heightmap"):
+        new_field.get_shading_loss_curve([0.1, 0.2], solar_elevation, solar_azimuth)
+
+
+def test_horizon_profile_geometry_workload(field_kwargs):
+    # Test that a narrow horizon peak only removes solar positions from the
+    # geometric calculation and does not add any
+    horizon_profile = ([0, 170, 180, 190], [0, 0, 35, 0])
+    field = trackerfield.TrackerField(
+        neighbor_order=2, horizon_profile=horizon_profile, **field_kwargs)
+    flat_field = trackerfield.TrackerField(neighbor_order=2, **field_kwargs)
+    assert field.max_shading_elevation == flat_field.max_shading_elevation
+    solar_elevation = np.repeat(np.arange(0.5, 60, 1), 360)
+    solar_azimuth = np.tile(np.arange(0, 360, 1), 60)
+    labels = field._classify_solar_positions(solar_elevation, solar_azimuth)
+    flat_labels = flat_field._classify_solar_positions(solar_elevation, solar_azimuth)
+    needs_geometry = labels == shading._NEEDS_GEOMETRY
+    assert np.all(flat_labels[needs_geometry] == shading._NEEDS_GEOMETRY)
+    assert needs_geometry.sum() < (flat_labels == shading._NEEDS_GEOMETRY).sum()
+    # Solar positions below the peak and above the maximum shading elevation
+    assert field.get_shaded_fraction(30, 180) == 1
+    assert field.get_shaded_fraction(30, 170) == 0
+    sky_map = field.sky_shading_map(azimuth_step=2, elevation_step=10)
+    assert (sky_map.loc[25, 181] == 1) and (sky_map.loc[25, 171] == 0)
+
+
+def test_heightmap_value_errors(field_kwargs, sloped_heightmap):
+    with pytest.raises(ValueError, match="slope tilt cannot be specified"):
+        trackerfield.TrackerField(neighbor_order=1, heightmap=sloped_heightmap,
+                                  slope_tilt=5, **field_kwargs)
+    with pytest.raises(ValueError, match="does not cover all neighboring"):
+        trackerfield.TrackerField(neighbor_order=20, heightmap=sloped_heightmap,
+                                  **field_kwargs)
+
+
+@pytest.mark.parametrize('series', [False, True])
+def test_horizon_profile(field_kwargs, sloped_heightmap, series):
+    # Test that a far-field horizon profile shades the collectors and is
+    # combined with the horizon of the terrain
+    horizon_profile = (np.arange(0, 360, 45), [0, 0, 0, 10, 30, 10, 0, 0])
+    if series:
+        horizon_profile = pd.Series(horizon_profile[1], index=horizon_profile[0])
+    field = trackerfield.TrackerField(
+        neighbor_order=2, heightmap=sloped_heightmap, horizon_profile=horizon_profile,
+        mounting_height=0, **field_kwargs)
+    far_field = trackerfield.TrackerField(
+        neighbor_order=2, horizon_profile=horizon_profile, **field_kwargs)
+    assert far_field.max_shading_elevation < 25
+    np.testing.assert_allclose(
+        field._horizon_profile,
+        np.maximum(far_field._horizon_profile,
+                   terrain.terrain_horizon_profile(*sloped_heightmap)))
+    result = far_field.get_shaded_fraction([25, 25, 31], [180, 90, 180])
+    np.testing.assert_allclose(result, [1, 0, 0])
+    # Below the uphill horizon of the terrain and the far-field horizon
+    result = field.get_shaded_fraction([4.5, 4.5], [345, 165])
+    np.testing.assert_allclose(result, [1, 1])
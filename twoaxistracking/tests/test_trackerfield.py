@@ -1,7 +1,12 @@
-from twoaxistracking import trackerfield
+from twoaxistracking import trackerfield, shading
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import pickle
+import threading
 import numpy as np
 import pandas as pd
 import pytest
+import shapely
 
 
 def test_invalid_layout_type(rectangular_geometry):
@@ -16,6 +21,21 @@ def test_invalid_layout_type(rectangular_geometry):
             layout_type='this_is_not_a_layout_type')
 
 
+@pytest.mark.parametrize('method', ['get_shaded_fraction', 'get_shading_loss',
+                                    'get_shading_loss_curve', 'get_cell_shaded_fraction'])
+def test_solar_position_shape_mismatch(rectangular_geometry, active_geometry_split, method):
+    # Test if ValueError is raised when the solar elevation and azimuth angles
+    # have different lengths
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=active_geometry_split,
+        neighbor_order=1, gcr=0.25, layout_type='square')
+    args = ([0.2],) if method == 'get_shading_loss_curve' else ()
+    with pytest.raises(ValueError, match="must have the same shape"):
+        getattr(field, method)(*args, [5, 10, 20], [180, 190])
+
+
 def test_square_layout_type(rectangular_geometry):
     # Assert that layout field parameters are correctly set for the square layout
     collector_geometry, min_tracker_spacing = rectangular_geometry
@@ -196,6 +216,575 @@ def test_calculation_of_shaded_fraction_float(rectangular_geometry):
     assert np.isscalar(result)
 
 
+def test_shaded_fraction_matches_scalar_calculation(rectangular_geometry,
+                                                    active_geometry_split):
+    # Test that the vectorized classification of solar positions gives the
+    # same result as calling shading.shaded_fraction for each solar position
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=active_geometry_split,
+        neighbor_order=2,
+        gcr=0.3,
+        layout_type='hexagonal_n_s',
+        slope_azimuth=160,
+        slope_tilt=4)
+    solar_elevation = np.tile(np.arange(-2, 60, 3.7), 10)
+    solar_azimuth = np.linspace(0, 360, len(solar_elevation))
+    result = field.get_shaded_fraction(solar_elevation, solar_azimuth)
+    expected = [shading.shaded_fraction(
+        elevation, azimuth, field.total_collector_geometry,
+        field.active_collector_geometry, field.min_tracker_spacing,
+        field.tracker_distance, field.relative_azimuth, field.relative_slope,
+        field.slope_azimuth, field.slope_tilt, field.max_shading_elevation)
+        for elevation, azimuth in zip(solar_elevation, solar_azimuth)]
+    np.testing.assert_allclose(result, expected)
+
+
+@pytest.mark.parametrize('max_workers, chunk_size', [(1, 7), (3, None), (3, 5), (None, 50)])
+def test_shaded_fraction_threads(rectangular_geometry, active_geometry_split, monkeypatch,
+                                 max_workers, chunk_size):
+    # Test that the chunked calculation in a pool of threads gives the same
+    # result as the serial calculation, and that only the solar positions
+    # requiring the geometric calculation are split into chunks
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=active_geometry_split,
+        neighbor_order=2, gcr=0.3, layout_type='hexagonal_n_s', slope_tilt=3)
+    solar_elevation = np.tile(np.linspace(-10, 50, 41), 3)
+    solar_azimuth = np.repeat([90, 180, 270], 41)
+    expected = field.get_shaded_fraction(solar_elevation, solar_azimuth)
+
+    chunk_threads = set()
+    unshaded_geometries = field._unshaded_geometries
+
+    def recorded_unshaded_geometries(solar_elevation, solar_azimuth):
+        chunk_threads.add(threading.get_ident())
+        if chunk_size is not None:
+            assert len(solar_elevation) <= chunk_size
+        return unshaded_geometries(solar_elevation, solar_azimuth)
+
+    monkeypatch.setattr(field, '_unshaded_geometries', recorded_unshaded_geometries)
+    result = field.get_shaded_fraction(solar_elevation, solar_azimuth,
+                                       max_workers=max_workers, chunk_size=chunk_size)
+    np.testing.assert_array_equal(result, expected)
+    if max_workers == 1:
+        assert chunk_threads == {threading.get_ident()}
+    # Solar positions that do not require the geometric calculation
+    np.testing.assert_array_equal(
+        field.get_shaded_fraction([-5, 80], [180, 180], max_workers=max_workers), [np.nan, 0])
+
+
+def test_shaded_fraction_concurrent_threads(rectangular_geometry, active_geometry_split):
+    # Test that the same field can be used from several threads at once
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=active_geometry_split,
+        neighbor_order=2, gcr=0.3, layout_type='hexagonal_n_s')
+    solar_elevation = np.linspace(1, 40, 200)
+    solar_azimuth = np.linspace(60, 300, 200)
+    expected = field.get_shaded_fraction(solar_elevation, solar_azimuth)
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(
+            lambda _: field.get_shaded_fraction(solar_elevation, solar_azimuth,
+                                                max_workers=2, chunk_size=30), range(8)))
+    for result in results:
+        np.testing.assert_array_equal(result, expected)
+
+
+def test_prepared_geometry_per_thread(rectangular_geometry, active_geometry_split,
+                                      monkeypatch):
+    # Test that each thread uses its own prepared active geometry, including
+    # pool workers and fields used from threads other than the main thread
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=active_geometry_split,
+        neighbor_order=2, gcr=0.3, layout_type='hexagonal_n_s')
+    used = []
+    unshaded_geometries = shading._unshaded_geometries
+
+    def recorded_unshaded_geometries(xoff, yoff, shades, total_collector_geometry,
+                                     active_collector_geometry, *args):
+        # The objects are kept alive, so that their ids are not reused
+        used.append((threading.current_thread(), active_collector_geometry))
+        return unshaded_geometries(xoff, yoff, shades, total_collector_geometry,
+                                   active_collector_geometry, *args)
+
+    monkeypatch.setattr(shading, '_unshaded_geometries', recorded_unshaded_geometries)
+    solar_elevation = np.linspace(1, 20, 60)
+    solar_azimuth = np.linspace(90, 270, 60)
+    with ThreadPoolExecutor(2) as executor:
+        # The field is driven from a thread other than the main thread, which
+        # itself uses a pool of threads
+        executor.submit(field.get_shaded_fraction, solar_elevation, solar_azimuth).result()
+        executor.submit(field.get_shaded_fraction, solar_elevation, solar_azimuth,
+                        max_workers=3, chunk_size=5).result()
+    field.get_shaded_fraction(solar_elevation, solar_azimuth, max_workers=3, chunk_size=5)
+    pairs = {(id(thread), id(geometry)) for thread, geometry in used}
+    threads = {thread for thread, _ in pairs}
+    geometries = {geometry for _, geometry in pairs}
+    assert len(threads) >= 3
+    # One geometry per thread, which is not used by any other thread
+    assert len(pairs) == len(geometries) == len(threads)
+    assert id(field.active_collector_geometry) not in geometries
+
+
+def test_field_does_not_prepare_user_geometry(rectangular_geometry):
+    # Test that the field prepares its own copy of the active geometry
+    # instead of modifying the geometry passed by the user
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    active_geometry = shapely.box(-1, -0.5, 1, 0.5)
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=active_geometry,
+        neighbor_order=1, gcr=0.25, layout_type='square')
+    assert field.get_shaded_fraction(3, 120) > 0
+    assert field.active_collector_geometry is active_geometry
+    assert not shapely.is_prepared(active_geometry)
+    assert shapely.is_prepared(field._prepared_active_collector_geometry())
+
+
+def test_cell_shaded_fraction(rectangular_geometry, active_geometry_split,
+                              expected_datetime_index):
+    # Test that the area-weighted average of the cell shaded fractions equals
+    # the shaded fraction of the total active area
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=active_geometry_split,
+        neighbor_order=1,
+        gcr=0.25,
+        layout_type='square')
+    solar_elevation = pd.Series([-1, 3, 5.2, 8, 40], index=expected_datetime_index)
+    solar_azimuth = pd.Series([90, 120, 145, 200, 180], index=expected_datetime_index)
+    result = field.get_cell_shaded_fraction(solar_elevation, solar_azimuth)
+    assert result.shape == (5, 4)
+    pd.testing.assert_index_equal(result.index, expected_datetime_index)
+    assert result.iloc[0].isna().all()
+    np.testing.assert_allclose(result.iloc[-1], 0)
+    # The lower cells are more shaded than the upper cells
+    assert (result.iloc[1:4, :2].values > result.iloc[1:4, 2:].values).all()
+    np.testing.assert_allclose(
+        result.mean(axis=1),
+        field.get_shaded_fraction(solar_elevation, solar_azimuth))
+
+
+def test_cell_shaded_fraction_array(rectangular_geometry):
+    # Test that the active geometry is a single cell when it is a Polygon
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=collector_geometry,
+        neighbor_order=1,
+        gcr=0.25,
+        layout_type='square')
+    result = field.get_cell_shaded_fraction(np.array([3, 10]), np.array([120, 180]))
+    assert isinstance(result, np.ndarray)
+    np.testing.assert_allclose(
+        result[:, 0], field.get_shaded_fraction(np.array([3, 10]), np.array([120, 180])))
+
+
+@pytest.fixture
+def async_field(rectangular_geometry):
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=collector_geometry,
+        neighbor_order=1, gcr=0.25, aspect_ratio=1, offset=0, rotation=170)
+    # Record the batches passed to the executor
+    field.batches = []
+    get_shaded_fraction = field.get_shaded_fraction
+
+    def recorded_get_shaded_fraction(solar_elevation, solar_azimuth):
+        field.batches.append(len(solar_elevation))
+        return get_shaded_fraction(solar_elevation, solar_azimuth)
+
+    field.get_shaded_fraction = recorded_get_shaded_fraction
+    return field
+
+
+def test_async_shaded_fraction(async_field, solar_position, expected_shaded_fraction,
+                               expected_datetime_index):
+    # Test that concurrent requests are coalesced into one batch and that the
+    # results are returned as the same type as the inputs
+    solar_elevation, solar_azimuth = solar_position
+
+    async def requests():
+        return await asyncio.gather(
+            async_field.aget_shaded_fraction(solar_elevation, solar_azimuth),
+            async_field.aget_shaded_fraction(
+                pd.Series(solar_elevation, index=expected_datetime_index),
+                pd.Series(solar_azimuth, index=expected_datetime_index)),
+            async_field.aget_shaded_fraction(1, 110))
+
+    result_list, result_series, result_float = asyncio.run(requests())
+    assert async_field.batches == [11]
+    assert isinstance(result_list, list)
+    np.testing.assert_allclose(result_list, expected_shaded_fraction)
+    pd.testing.assert_series_equal(result_series, pd.Series(
+        expected_shaded_fraction, index=expected_datetime_index))
+    assert np.isclose(result_float, expected_shaded_fraction[2])
+    assert async_field._pending_requests == {}
+
+
+def test_async_shaded_fraction_executor(async_field, solar_position,
+                                        expected_shaded_fraction):
+    # Test that sequential requests are calculated in separate batches
+    solar_elevation, solar_azimuth = solar_position
+
+    async def requests(executor):
+        first = await async_field.aget_shaded_fraction(
+            solar_elevation, solar_azimuth, executor=executor)
+        second = await async_field.aget_shaded_fraction(
+            np.array(solar_elevation), np.array(solar_azimuth), executor=executor)
+        return first, second
+
+    with ThreadPoolExecutor(2) as executor:
+        first, second = asyncio.run(requests(executor))
+    assert async_field.batches == [5, 5]
+    np.testing.assert_allclose(first, expected_shaded_fraction)
+    np.testing.assert_allclose(second, expected_shaded_fraction)
+
+
+def test_async_shaded_fraction_overlapping_batches(async_field, solar_position,
+                                                   expected_shaded_fraction):
+    # Test that requests made while a batch is running are queued and
+    # coalesced into the next batch, even if workers are available
+    solar_elevation, solar_azimuth = solar_position
+    started, release = threading.Event(), threading.Event()
+    get_shaded_fraction = async_field.get_shaded_fraction
+
+    def blocking_get_shaded_fraction(solar_elevation, solar_azimuth):
+        started.set()
+        release.wait()
+        return get_shaded_fraction(solar_elevation, solar_azimuth)
+
+    async_field.get_shaded_fraction = blocking_get_shaded_fraction
+
+    async def requests(executor):
+        first = asyncio.ensure_future(
+            async_field.aget_shaded_fraction(solar_elevation, solar_azimuth, executor))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+        # Requests made in separate iterations of the event loop
+        queued = []
+        for elevation, azimuth in zip(solar_elevation[2:], solar_azimuth[2:]):
+            queued.append(asyncio.ensure_future(
+                async_field.aget_shaded_fraction(elevation, azimuth, executor)))
+            await asyncio.sleep(0)
+        release.set()
+        return await first, await asyncio.gather(*queued)
+
+    with ThreadPoolExecutor(4) as executor:
+        first, queued = asyncio.run(requests(executor))
+    assert async_field.batches == [5, 3]
+    np.testing.assert_allclose(first, expected_shaded_fraction)
+    np.testing.assert_allclose(queued, expected_shaded_fraction[2:])
+    assert async_field._pending_requests == {}
+    assert async_field._running_batches == set()
+
+
+def test_async_shaded_fraction_cancellation(async_field, solar_position,
+                                            expected_shaded_fraction):
+    # Test that cancelling a request does not affect the other requests and
+    # that the batch is not calculated if all requests are cancelled
+    solar_elevation, solar_azimuth = solar_position
+    release = threading.Event()
+
+    async def requests(executor):
+        # Occupy the only worker, such that the batches are not started
+        blocker = asyncio.get_running_loop().run_in_executor(executor, release.wait)
+        # Requests that are cancelled before being dispatched
+        cancelled = asyncio.ensure_future(
+            async_field.aget_shaded_fraction(solar_elevation, solar_azimuth, executor))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        # Requests that are cancelled after being dispatched
+        tasks = [asyncio.ensure_future(async_field.aget_shaded_fraction(
+            solar_elevation, solar_azimuth, executor)) for _ in range(2)]
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        tasks[0].cancel()
+        await asyncio.sleep(0)
+        tasks[1].cancel()
+        # Partially cancelled batch
+        remaining = [asyncio.ensure_future(async_field.aget_shaded_fraction(
+            solar_elevation, solar_azimuth, executor)) for _ in range(2)]
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        remaining[0].cancel()
+        release.set()
+        await blocker
+        results = await asyncio.gather(*remaining, return_exceptions=True)
+        return cancelled, tasks, results
+
+    with ThreadPoolExecutor(1) as executor:
+        cancelled, tasks, results = asyncio.run(requests(executor))
+    assert cancelled.cancelled()
+    assert all(task.cancelled() for task in tasks)
+    assert isinstance(results[0], asyncio.CancelledError)
+    np.testing.assert_allclose(results[1], expected_shaded_fraction)
+    assert async_field.batches == [10]
+
+
+def test_async_shaded_fraction_exception(async_field):
+    # Test that exceptions are raised for all requests in the batch
+
+    async def requests():
+        return await asyncio.gather(
+            async_field.aget_shaded_fraction([10, 20], [180, 190]),
+            async_field.aget_shaded_fraction([10, 20], [180, 190]),
+            return_exceptions=True)
+
+    def failing_get_shaded_fraction(solar_elevation, solar_azimuth):
+        raise RuntimeError('Calculation failed')
+
+    async_field.get_shaded_fraction = failing_get_shaded_fraction
+    results = asyncio.run(requests())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    with pytest.raises(ValueError, match="must have the same shape"):
+        asyncio.run(async_field.aget_shaded_fraction([10, 20], [180]))
+
+
+def test_to_dict_from_dict(rectangular_geometry, active_geometry_split, monkeypatch):
+    # Test that a field recreated from its dict representation is identical
+    # and that the field layout is not regenerated
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=active_geometry_split,
+        neighbor_order=2, gcr=0.25, layout_type='hexagonal_n_s', slope_tilt=3)
+    field.diffuse_shading_factor(max_workers=1)
+    field_dict = field.to_dict()
+    assert isinstance(field_dict['total_collector_geometry'], bytes)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('The field layout should not be regenerated')
+
+    monkeypatch.setattr(trackerfield.layout, 'generate_field_layout', fail)
+    monkeypatch.setattr(trackerfield.layout, 'max_shading_elevation', fail)
+    for new_field in [trackerfield.TrackerField.from_dict(field_dict),
+                      pickle.loads(pickle.dumps(field))]:
+        assert isinstance(new_field, trackerfield.TrackerField)
+        assert new_field.total_collector_geometry.equals(field.total_collector_geometry)
+        assert new_field.active_collector_geometry.equals(field.active_collector_geometry)
+        assert new_field.min_tracker_spacing == field.min_tracker_spacing
+        assert new_field.max_shading_elevation == field.max_shading_elevation
+        assert new_field.layout_type == 'hexagonal_n_s'
+        np.testing.assert_array_equal(new_field.relative_slope, field.relative_slope)
+        assert new_field._diffuse_shading_factor == field._diffuse_shading_factor
+        solar_elevation = np.arange(0, 40, 2)
+        solar_azimuth = np.arange(0, 360, 18)
+        np.testing.assert_array_equal(
+            new_field.get_shaded_fraction(solar_elevation, solar_azimuth),
+            field.get_shaded_fraction(solar_elevation, solar_azimuth))
+
+
+def test_sky_shading_map(rectangular_geometry):
+    # Test that the sky shading map matches the shaded fraction of the cell
+    # centers and that cells above the maximum shading elevation are unshaded
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=collector_geometry,
+        neighbor_order=2, gcr=0.25, layout_type='hexagonal_e_w',
+        slope_azimuth=90, slope_tilt=5)
+    result = field.sky_shading_map(azimuth_step=10, elevation_step=3, max_workers=2)
+    assert result.shape == (30, 36)
+    assert result.index.name == 'elevation'
+    assert result.columns.name == 'azimuth'
+    np.testing.assert_allclose(result.index, np.arange(1.5, 90, 3))
+    np.testing.assert_allclose(result.columns, np.arange(5, 360, 10))
+    elevation, azimuth = np.meshgrid(result.index, result.columns, indexing='ij')
+    expected = field.get_shaded_fraction(elevation, azimuth)
+    np.testing.assert_allclose(result.to_numpy(), expected)
+    assert (result.loc[result.index > field.max_shading_elevation] == 0).all(axis=None)
+    assert (result.to_numpy() > 0).sum() > 0
+
+
+@pytest.fixture
+def annual_solar_position():
+    # Simplified solar position at a latitude of 55° for every 30 minutes
+    times = pd.date_range('2020-01-01', '2021-01-01', freq='30min', inclusive='left')
+    declination = np.deg2rad(23.45 * np.sin(2 * np.pi * (284 + times.dayofyear) / 365))
+    latitude = np.deg2rad(55)
+    hour_angle = np.deg2rad(15 * (times.hour + times.minute / 60 - 12))
+    sin_elevation = np.sin(latitude) * np.sin(declination) \
+        + np.cos(latitude) * np.cos(declination) * np.cos(hour_angle)
+    solar_elevation = pd.Series(np.rad2deg(np.arcsin(sin_elevation)), index=times)
+    solar_azimuth = pd.Series(np.rad2deg(np.arctan2(
+        np.sin(hour_angle), np.cos(hour_angle) * np.sin(latitude)
+        - np.tan(declination) * np.cos(latitude))) + 180, index=times)
+    return solar_elevation, solar_azimuth
+
+
+def test_get_shading_loss(rectangular_geometry, annual_solar_position, monkeypatch):
+    # Test that the binned shading loss is close to the shading loss
+    # calculated for each solar position, while calculating fewer positions
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=collector_geometry,
+        neighbor_order=2, gcr=0.35, layout_type='hexagonal_n_s',
+        slope_azimuth=90, slope_tilt=2)
+    solar_elevation, solar_azimuth = annual_solar_position
+    shaded_fraction = field.get_shaded_fraction(solar_elevation, solar_azimuth)
+    weights = np.clip(np.sin(np.deg2rad(solar_elevation)), 0, None)
+
+    n_calculated = []
+    unshaded_geometries = field._unshaded_geometries
+
+    def recorded_unshaded_geometries(solar_elevation, solar_azimuth):
+        n_calculated.append(len(solar_elevation))
+        return unshaded_geometries(solar_elevation, solar_azimuth)
+
+    monkeypatch.setattr(field, '_unshaded_geometries', recorded_unshaded_geometries)
+    result = field.get_shading_loss(solar_elevation, solar_azimuth, weights=weights)
+    expected = np.nansum(shaded_fraction * weights) / weights[solar_elevation >= 0].sum()
+    assert np.isclose(result, expected, atol=2e-4)
+    assert n_calculated[0] < 0.5 * (shaded_fraction % 1 > 0).sum()
+    # Time-weighted monthly shading losses
+    result = field.get_shading_loss(solar_elevation, solar_azimuth, freq='MS',
+                                    elevation_step=0.25, azimuth_step=0.5)
+    expected = shaded_fraction.groupby(pd.Grouper(freq='MS')).mean()
+    assert isinstance(result, pd.Series)
+    pd.testing.assert_series_equal(result, expected, atol=1e-3)
+
+
+def test_get_shading_loss_night(rectangular_geometry, annual_solar_position):
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=collector_geometry,
+        neighbor_order=1, gcr=0.25, layout_type='square')
+    # Night-time solar positions have no shading loss
+    assert np.isnan(field.get_shading_loss([-5, -3], [0, 10]))
+    assert field.get_shading_loss([-5, 50], [0, 180], weights=[10, 1]) == 0
+    solar_elevation, solar_azimuth = annual_solar_position
+    with pytest.raises(ValueError, match="must be a pandas Series with a DatetimeIndex"):
+        field.get_shading_loss(solar_elevation.values, solar_azimuth, freq='MS')
+
+
+def test_get_shading_loss_curve(rectangular_geometry, annual_solar_position, monkeypatch):
+    # Test that the shading loss curve matches the shading loss of fields
+    # created for each GCR, while calculating all GCRs in one batch
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    kwargs = dict(total_collector_geometry=collector_geometry,
+                  active_collector_geometry=collector_geometry,
+                  neighbor_order=2, layout_type='hexagonal_n_s',
+                  slope_azimuth=90, slope_tilt=2)
+    field = trackerfield.TrackerField(gcr=0.3, **kwargs)
+    solar_elevation, solar_azimuth = annual_solar_position
+    weights = np.clip(np.sin(np.deg2rad(solar_elevation)), 0, None)
+
+    n_calls = []
+    unshaded_geometries_from_offsets = field._unshaded_geometries_from_offsets
+
+    def recorded_unshaded_geometries_from_offsets(xoff, yoff, in_view):
+        n_calls.append(len(xoff))
+        return unshaded_geometries_from_offsets(xoff, yoff, in_view)
+
+    monkeypatch.setattr(field, '_unshaded_geometries_from_offsets',
+                        recorded_unshaded_geometries_from_offsets)
+    gcr = [0.1, 0.2, 0.3, 0.4]
+    result = field.get_shading_loss_curve(gcr, solar_elevation, solar_azimuth, weights)
+    assert len(n_calls) == 1
+    np.testing.assert_array_equal(result.index, gcr)
+    assert result.index.name == 'gcr'
+    expected = [trackerfield.TrackerField(gcr=g, **kwargs).get_shading_loss(
+        solar_elevation, solar_azimuth, weights) for g in gcr]
+    np.testing.assert_allclose(result, expected, rtol=1e-9)
+    assert np.all(np.diff(result) > 0)
+
+
+def test_get_shading_loss_curve_min_solar_elevation(rectangular_geometry,
+                                                    annual_solar_position):
+    # Test that the neighbors selected using min_solar_elevation can be used
+    # for lower GCRs
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    kwargs = dict(total_collector_geometry=collector_geometry,
+                  active_collector_geometry=collector_geometry,
+                  layout_type='square')
+    field = trackerfield.TrackerField(
+        gcr=0.3, neighbor_order=None, min_solar_elevation=5, **kwargs)
+    solar_elevation, solar_azimuth = annual_solar_position
+    solar_elevation = solar_elevation.where(solar_elevation >= 5, -1)
+    result = field.get_shading_loss_curve([0.15, 0.3], solar_elevation, solar_azimuth)
+    expected = [trackerfield.TrackerField(gcr=g, neighbor_order=6, **kwargs).get_shading_loss(
+        solar_elevation, solar_azimuth) for g in [0.15, 0.3]]
+    np.testing.assert_allclose(result, expected, rtol=1e-9)
+    with pytest.raises(ValueError, match="cannot exceed the ground cover ratio"):
+        field.get_shading_loss_curve([0.2, 0.35], solar_elevation, solar_azimuth)
+    # Night-time solar positions have no shading loss
+    assert np.all(np.isnan(field.get_shading_loss_curve(0.2, [-5, -3], [0, 10])))
+
+
+@pytest.mark.parametrize('gcr', [[0, 0.2], [0.2, 0.9], [-0.1], 5.0])
+def test_get_shading_loss_curve_invalid_gcr(rectangular_geometry, gcr):
+    # Test that the ground cover ratios are limited to the range of the
+    # layout, which is (0, 0.4) for the rectangular geometry and square layout
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=collector_geometry,
+        neighbor_order=1, gcr=0.25, layout_type='square')
+    with pytest.raises(ValueError, match="must be greater than 0 and cannot exceed the "
+                                         "maximum ground cover ratio of 0.400"):
+        field.get_shading_loss_curve(gcr, [10, 20], [180, 180])
+    field.get_shading_loss_curve([0.1, 0.39], [10, 20], [180, 180])
+
+
+def test_get_shading_loss_curve_height_offset(rectangular_geometry):
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=collector_geometry,
+        neighbor_order=1, gcr=0.25, layout_type='square', height_offset=np.ones(8))
+    with pytest.raises(ValueError, match="not supported for fields with a heightmap"):
+        field.get_shading_loss_curve([0.2, 0.3], [10, 20], [180, 180])
+
+
+def test_min_solar_elevation(rectangular_geometry, active_geometry_split):
+    # Test that deriving the neighbors from the minimum solar elevation gives
+    # the same shaded fraction as a high neighbor order
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    kwargs = dict(total_collector_geometry=collector_geometry,
+                  active_collector_geometry=active_geometry_split,
+                  gcr=0.2, layout_type='hexagonal_e_w')
+    field = trackerfield.TrackerField(neighbor_order=None, min_solar_elevation=4, **kwargs)
+    reference_field = trackerfield.TrackerField(neighbor_order=10, **kwargs)
+    assert field.min_solar_elevation == 4
+    assert len(field.X) < (2 * field.neighbor_order + 1)**2 - 1
+    solar_elevation = np.repeat([4, 5, 7, 10, 15], 24)
+    solar_azimuth = np.tile(np.arange(0, 360, 15), 5)
+    np.testing.assert_allclose(
+        field.get_shaded_fraction(solar_elevation, solar_azimuth),
+        reference_field.get_shaded_fraction(solar_elevation, solar_azimuth))
+
+
+def test_min_solar_elevation_no_neighbors(rectangular_geometry):
+    # Test that a field without neighbors that can shade is unshaded
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    field = trackerfield.TrackerField(
+        total_collector_geometry=collector_geometry,
+        active_collector_geometry=collector_geometry,
+        neighbor_order=None, gcr=0.05, layout_type='square',
+        min_solar_elevation=60)
+    assert len(field.X) == 0
+    np.testing.assert_allclose(field.get_shaded_fraction([0.1, 61], [180, 180]), 0)
+
+
+def test_unspecified_neighbor_order(rectangular_geometry):
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    with pytest.raises(ValueError, match="Either the neighbor order or the minimum"):
+        _ = trackerfield.TrackerField(
+            total_collector_geometry=collector_geometry,
+            active_collector_geometry=collector_geometry,
+            neighbor_order=None, gcr=0.25, layout_type='square')
+
+
 def test_total_collector_geometry_encloses_active_areas(rectangular_geometry, circular_geometry):
     # Test that ValueError is raised if the aperture collector geometry is not
     # completely enclosed by the total collector geometry
@@ -210,3 +799,121 @@ def test_total_collector_geometry_encloses_active_areas(rectangular_geometry, ci
             aspect_ratio=1,
             offset=0,
             rotation=0)
+
+
+@pytest.fixture
+def neighbor_field_kwargs(rectangular_geometry, active_geometry_split):
+    collector_geometry, min_tracker_spacing = rectangular_geometry
+    return dict(total_collector_geometry=collector_geometry,
+                active_collector_geometry=active_geometry_split,
+                neighbor_order=2, gcr=0.2, layout_type='hexagonal_n_s')
+
+
+def test_neighbor_geometries_same_geometry(neighbor_field_kwargs):
+    # Test that neighbors with the geometry of the reference collector give
+    # the same shaded fraction as a homogeneous field
+    field = trackerfield.TrackerField(**neighbor_field_kwargs)
+    n_neighbors = len(field.X)
+    mixed_field = trackerfield.TrackerField(
+        neighbor_geometries=[shapely.box(-2.5, -1.2, 2.5, 1.2),
+                             neighbor_field_kwargs['total_collector_geometry']],
+        neighbor_geometry_index=np.ones(n_neighbors, dtype=int),
+        height_offset=np.zeros(n_neighbors), **neighbor_field_kwargs)
+    np.testing.assert_allclose(mixed_field._shading_distance, field.min_tracker_spacing)
+    assert mixed_field.max_shading_elevation >= field.max_shading_elevation
+    solar_elevation = np.repeat([1, 5, 10, 20, 30], 24)
+    solar_azimuth = np.tile(np.arange(0, 360, 15), 5)
+    np.testing.assert_allclose(
+        mixed_field.get_shaded_fraction(solar_elevation, solar_azimuth),
+        field.get_shaded_fraction(solar_elevation, solar_azimuth))
+
+
+def test_neighbor_geometries_larger_neighbors(neighbor_field_kwargs):
+    # Test that larger neighboring collectors cast more shade, and that only
+    # the neighbors with the larger geometry contribute additional shade
+    field = trackerfield.TrackerField(**neighbor_field_kwargs)
+    neighbor_geometry_index = (field.relative_azimuth == 180).astype(int)
+    mixed_field = trackerfield.TrackerField(
+        neighbor_geometries=[neighbor_field_kwargs['total_collector_geometry'],
+                             shapely.box(-3, -1.5, 3, 1.5)],
+        neighbor_geometry_index=neighbor_geometry_index, **neighbor_field_kwargs)
+    solar_elevation = np.repeat([5, 10, 15, 20], 3)
+    solar_azimuth = np.tile([0, 90, 180], 4)
+    shaded_fraction = field.get_shaded_fraction(solar_elevation, solar_azimuth)
+    mixed_shaded_fraction = mixed_field.get_shaded_fraction(solar_elevation, solar_azimuth)
+    south = solar_azimuth == 180
+    assert np.all(mixed_shaded_fraction[south] > shaded_fraction[south])
+    np.testing.assert_allclose(mixed_shaded_fraction[~south], shaded_fraction[~south])
+
+
+def test_height_offset(neighbor_field_kwargs):
+    # Test that height offsets equal to the heights on a slope give the same
+    # shaded fraction as the sloped field above the horizon of the slope
+    sloped_field = trackerfield.TrackerField(
+        slope_azimuth=180, slope_tilt=5, **neighbor_field_kwargs)
+    height_offset = sloped_field.tracker_distance * np.tan(
+        np.deg2rad(sloped_field.relative_slope))
+    field = trackerfield.TrackerField(height_offset=height_offset, **neighbor_field_kwargs)
+    np.testing.assert_allclose(field.Z, height_offset)
+    np.testing.assert_allclose(field.relative_slope, sloped_field.relative_slope)
+    assert np.isclose(field.max_shading_elevation, sloped_field.max_shading_elevation)
+    # Only the ground of the sloped field blocks the sun below the slope
+    solar_elevation = np.repeat([6, 10, 15, 20], 24)
+    solar_azimuth = np.tile(np.arange(0, 360, 15), 4)
+    np.testing.assert_allclose(
+        field.get_shaded_fraction(solar_elevation, solar_azimuth),
+        sloped_field.get_shaded_fraction(solar_elevation, solar_azimuth))
+
+
+def test_neighbor_geometries_min_solar_elevation(neighbor_field_kwargs):
+    # Test that the per-neighbor values are filtered together with the
+    # neighbors that cannot shade above the minimum solar elevation
+    neighbor_field_kwargs['neighbor_order'] = 6
+    n_neighbors = len(trackerfield.TrackerField(**neighbor_field_kwargs).X)
+    kwargs = dict(
+        neighbor_geometries=[neighbor_field_kwargs['total_collector_geometry'],
+                             shapely.box(-3, -1.5, 3, 1.5)],
+        neighbor_geometry_index=np.arange(n_neighbors) % 2,
+        height_offset=np.linspace(-0.5, 0.5, n_neighbors), **neighbor_field_kwargs)
+    field = trackerfield.TrackerField(min_solar_elevation=5, **kwargs)
+    reference_field = trackerfield.TrackerField(**kwargs)
+    assert len(field.X) < n_neighbors
+    assert len(field.neighbor_geometry_index) == len(field.height_offset) == len(field.X)
+    solar_elevation = np.repeat([5, 7, 10, 15], 24)
+    solar_azimuth = np.tile(np.arange(0, 360, 15), 4)
+    np.testing.assert_allclose(
+        field.get_shaded_fraction(solar_elevation, solar_azimuth),
+        reference_field.get_shaded_fraction(solar_elevation, solar_azimuth))
+
+
+def test_neighbor_geometries_to_dict(neighbor_field_kwargs):
+    # Test that the neighbor geometries survive serialization
+    n_neighbors = len(trackerfield.TrackerField(**neighbor_field_kwargs).X)
+    field = trackerfield.TrackerField(
+        neighbor_geometries=[neighbor_field_kwargs['total_collector_geometry'],
+                             shapely.box(-3, -1.5, 3, 1.5)],
+        neighbor_geometry_index=np.arange(n_neighbors) % 2,
+        height_offset=np.full(n_neighbors, 0.2), **neighbor_field_kwargs)
+    new_field = pickle.loads(pickle.dumps(field))
+    assert new_field.neighbor_geometries[1].equals(field.neighbor_geometries[1])
+    np.testing.assert_array_equal(new_field._shading_distance, field._shading_distance)
+    solar_elevation = np.arange(0, 40, 2)
+    solar_azimuth = np.arange(0, 360, 18)
+    np.testing.assert_array_equal(
+        new_field.get_shaded_fraction(solar_elevation, solar_azimuth),
+        field.get_shaded_fraction(solar_elevation, solar_azimuth))
+
+
+@pytest.mark.parametrize('kwargs, match', [
+    (dict(neighbor_geometries=[shapely.box(-1, -1, 1, 1)]), 'must be specified together'),
+    (dict(neighbor_geometry_index=np.zeros(24, dtype=int)), 'must be specified together'),
+    (dict(height_offset=np.zeros(24), neighbor_order=None, min_solar_elevation=5),
+     'The neighbor order must be specified'),
+    (dict(height_offset=np.zeros(3)), 'one value for each of the 24'),
+    (dict(neighbor_geometries=[shapely.box(-1, -1, 1, 1)],
+          neighbor_geometry_index=np.ones(24, dtype=int)), 'out of range'),
+])
+def test_neighbor_geometries_value_error(neighbor_field_kwargs, kwargs, match):
+    neighbor_field_kwargs.update(kwargs)
+    with pytest.raises(ValueError, match=match):
+        _ = trackerfield.TrackerField(**neighbor_field_kwargs)
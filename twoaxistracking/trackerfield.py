@@ -6,9 +6,14 @@ get started with the package and keeps track of the variables that are
 passed from one function to the next.
 """
 
-from twoaxistracking import layout, shading, plotting
+from twoaxistracking import layout, shading, plotting, irradiance, terrain
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import threading
 import numpy as np
 import pandas as pd
+import shapely
 
 
 STANDARD_FIELD_LAYOUT_PARAMETERS = {
@@ -21,6 +26,15 @@ STANDARD_FIELD_LAYOUT_PARAMETERS = {
     'hexagonal_e_w': {'aspect_ratio': np.sqrt(3)/2, 'offset': -0.5, 'rotation': 90},
 }
 
+# Attributes that are stored as is when converting a TrackerField to a dict
+_SERIALIZED_ATTRIBUTES = (
+    'neighbor_order', 'min_solar_elevation', 'gcr', 'layout_type', 'aspect_ratio',
+    'offset', 'rotation', 'slope_azimuth', 'slope_tilt', 'X', 'Y', 'Z',
+    'tracker_distance', 'relative_azimuth', 'relative_slope', 'max_shading_elevation',
+    'mounting_height', '_has_heightmap', 'horizon_profile', '_horizon_profile',
+    'neighbor_geometry_index', 'height_offset',
+)
+
 
 class TrackerField:
     """
@@ -33,9 +47,10 @@ class TrackerField:
         Polygon corresponding to the total collector area.
     active_collector_geometry: :py:class:`Shapely Polygon <Polygon>` or :py:class:`MultiPolygon`
         One or more polygons defining the active collector area.
-    neighbor_order: int
+    neighbor_order: int or None
         Order of neighbors to include in layout. It is recommended to use a
-        neighbor order of two.
+        neighbor order of two. If None, the neighbor order is derived from
+        ``min_solar_elevation``.
     gcr: float
         Ground cover ratio. Ratio of collector area to ground area.
     layout_type: {square, square_rotated, hexagon_e_w, hexagon_n_s}, optional
@@ -51,6 +66,43 @@ class TrackerField:
         Direction of normal to slope on horizontal [degrees]
     slope_tilt : float, default : 0
         Tilt of slope relative to horizontal [degrees]
+    min_solar_elevation : float, optional
+        Minimum solar elevation angle for which shading needs to be accounted
+        for [degrees]. If specified, only the neighboring collectors that can
+        cast shade for solar elevation angles above ``min_solar_elevation``
+        are included. Shading at lower solar elevation angles may be
+        underestimated.
+    heightmap : tuple of (x, y, heights), optional
+        Heightmap of the terrain, where ``x`` and ``y`` are the increasing
+        grid coordinates relative to the reference collector (east and north
+        are positive) and ``heights`` is a 2D array with the terrain heights
+        with shape (len(y), len(x)). If specified, the relative heights of
+        the neighboring collectors and the horizon are derived from the
+        heightmap. Cannot be combined with ``slope_tilt``.
+    mounting_height : float, optional
+        Height of the center of rotation of the collectors above the terrain,
+        from which the horizon of the heightmap is seen. Defaults to half the
+        minimum tracker spacing, i.e., the lowest height at which the
+        collectors can be rotated to vertical above level ground. Only used
+        together with ``heightmap``.
+    horizon_profile : tuple of (azimuth, elevation) or pandas.Series, optional
+        Far-field horizon profile, e.g., caused by distant mountains, as
+        arrays of azimuth angles and horizon elevation angles [degrees] or as
+        a Series of horizon elevation angles indexed by azimuth angle. Solar
+        positions below the horizon are fully shaded.
+    neighbor_geometries : list of :py:class:`Shapely Polygons <Polygon>`, optional
+        Total collector geometries of the types of collectors in the field,
+        e.g., different tracker models. Must be specified together with
+        ``neighbor_geometry_index``.
+    neighbor_geometry_index : array-like of ints, optional
+        Index of the geometry in ``neighbor_geometries`` of each neighboring
+        collector. If not specified, the neighboring collectors have the same
+        geometry as the reference collector.
+    height_offset : array-like, optional
+        Mounting height of each neighboring collector relative to the
+        reference collector, in addition to the height difference caused by
+        the slope or terrain. A positive offset means that the neighboring
+        collector is higher.
 
     Notes
     -----
@@ -58,20 +110,46 @@ class TrackerField:
     using the ``layout_type`` argument or by specifying the individual layout
     parameters ``aspect_ratio``, ``offset``, and ``rotation``. For both cases
     the ground cover ratio (``gcr``) needs to be specified.
+
+    Instead of specifying the ``neighbor_order``, the neighboring collectors
+    can be determined from ``min_solar_elevation``, in which case exactly the
+    neighbors that can cast shade above the minimum solar elevation angle are
+    included. This way the number of neighbors, and thus the computation
+    time, is determined by the field layout instead of by (2n+1)².
+
+    When a heightmap is specified, the relative heights of the
+    neighboring collectors and the horizon profile of the terrain, see
+    :py:func:`twoaxistracking.terrain.terrain_horizon_profile`, are calculated
+    once when the field is created. All collectors are assumed to be mounted
+    at the same height above the terrain, and the horizon is seen from the
+    mounting height of the reference collector. The heightmap itself is not
+    kept, so that the field is cheap to serialize. The horizon profile is stored as a lookup
+    table with a resolution of one degree, and solar positions below the
+    horizon are fully shaded. A far-field ``horizon_profile`` is interpolated
+    onto the same lookup table, and the higher of the two horizons is used.
+    The lookup table makes the horizon check essentially free compared to
+    the geometric shading calculation. The horizon does not raise the
+    maximum shading elevation, i.e., solar positions above the horizon and
+    the maximum shading elevation do not go through the geometric
+    calculation.
+
+    The per-neighbor parameters ``neighbor_geometry_index`` and
+    ``height_offset`` have one value for each neighboring collector in the
+    order returned by :py:func:`twoaxistracking.generate_field_layout` for
+    the specified ``neighbor_order`` (without ``min_solar_elevation``). The
+    neighbor order therefore has to be specified when they are used. The
+    neighbor geometries are only stored once, and the shading geometries are
+    created for each geometry by offsetting its coordinates.
     """
 
     def __init__(self, total_collector_geometry, active_collector_geometry,
                  neighbor_order, gcr, layout_type=None, aspect_ratio=None,
-                 offset=None, rotation=None, slope_azimuth=0, slope_tilt=0):
+                 offset=None, rotation=None, slope_azimuth=0, slope_tilt=0,
+                 min_solar_elevation=None, heightmap=None, horizon_profile=None,
+                 neighbor_geometries=None, neighbor_geometry_index=None,
+                 height_offset=None, mounting_height=None):
 
-        # Collector geometry
-        self.total_collector_geometry = total_collector_geometry
-        self.active_collector_geometry = active_collector_geometry
-        # Derive properties from geometries
-        self.total_collector_area = self.total_collector_geometry.area
-        self.active_collector_area = self.active_collector_geometry.area
-        self.min_tracker_spacing = \
-            layout._calculate_min_tracker_spacing(self.total_collector_geometry)
+        self._set_collector_geometry(total_collector_geometry, active_collector_geometry)
 
         # Ensure that the total collector area contains the active areas
         if self.total_collector_geometry.contains(self.active_collector_geometry) is False:
@@ -92,8 +170,37 @@ class TrackerField:
             raise ValueError('Aspect ratio, offset, and rotation needs to be '
                              'specified when no layout type has been selected')
 
+        if (heightmap is not None) and (slope_tilt != 0):
+            raise ValueError('The slope tilt cannot be specified together with '
+                             'a heightmap.')
+        if (neighbor_geometries is None) != (neighbor_geometry_index is None):
+            raise ValueError('The neighbor geometries and the neighbor geometry '
+                             'index must be specified together.')
+        # Properties that are specified for each neighboring collector
+        per_neighbor = (neighbor_geometry_index is not None) or (height_offset is not None)
+        if per_neighbor and (neighbor_order is None):
+            raise ValueError('The neighbor order must be specified together with '
+                             'per-neighbor geometries or height offsets.')
+
+        # Derive the neighbor order needed for the minimum solar elevation
+        if neighbor_order is None:
+            if min_solar_elevation is None:
+                raise ValueError('Either the neighbor order or the minimum solar '
+                                 'elevation needs to be specified.')
+            neighbor_order = layout._required_neighbor_order(
+                gcr=gcr,
+                total_collector_area=self.total_collector_area,
+                min_tracker_spacing=self.min_tracker_spacing,
+                aspect_ratio=aspect_ratio,
+                offset=offset,
+                # The steepest terrain slope bounds the relative slopes
+                slope_tilt=slope_tilt if heightmap is None else terrain._max_terrain_slope(
+                    *heightmap),
+                min_solar_elevation=min_solar_elevation)
+
         # Field layout parameters
         self.neighbor_order = neighbor_order
+        self.min_solar_elevation = min_solar_elevation
         self.gcr = gcr
         self.layout_type = layout_type
         self.aspect_ratio = aspect_ratio
@@ -101,6 +208,9 @@ class TrackerField:
         self.rotation = rotation
         self.slope_azimuth = slope_azimuth
         self.slope_tilt = slope_tilt
+        self.mounting_height = mounting_height
+        self._has_heightmap = heightmap is not None
+        self.horizon_profile = horizon_profile
 
         # Calculate position of neighboring collectors based on field layout
         (self.X, self.Y, self.Z, self.tracker_distance, self.relative_azimuth,
@@ -114,11 +224,174 @@ class TrackerField:
                 offset=self.offset,
                 rotation=self.rotation,
                 slope_azimuth=self.slope_azimuth,
-                slope_tilt=self.slope_tilt)
+                slope_tilt=self.slope_tilt,
+                # The neighbors that cannot shade are removed after deriving
+                # the relative slopes from the heightmap and height offsets
+                min_solar_elevation=None if (heightmap is not None) or per_neighbor
+                else self.min_solar_elevation)
+
+        # Derive the relative heights and the horizon from the heightmap and
+        # the far-field horizon profile
+        self._horizon_profile = None
+        if heightmap is not None:
+            self.Z, self.relative_slope = terrain._terrain_field_layout(
+                *heightmap, self.X, self.Y, self.tracker_distance)
+            self._horizon_profile = terrain.terrain_horizon_profile(
+                *heightmap, observer_height=self.min_tracker_spacing / 2
+                if mounting_height is None else mounting_height)
+        if horizon_profile is not None:
+            if isinstance(horizon_profile, pd.Series):
+                horizon_profile = (horizon_profile.index, horizon_profile.values)
+            far_field_horizon = shading._horizon_lookup_table(*horizon_profile)
+            if self._horizon_profile is not None:
+                far_field_horizon = np.maximum(far_field_horizon, self._horizon_profile)
+            self._horizon_profile = far_field_horizon
+
+        # Geometries and mounting heights of the neighboring collectors
+        self.neighbor_geometries = None
+        if neighbor_geometries is not None:
+            self.neighbor_geometries = np.empty(len(neighbor_geometries), dtype=object)
+            self.neighbor_geometries[:] = list(neighbor_geometries)
+        self.neighbor_geometry_index = _per_neighbor_values(
+            neighbor_geometry_index, len(self.X), int)
+        self.height_offset = _per_neighbor_values(height_offset, len(self.X), float)
+        if self.height_offset is not None:
+            self.Z = self.Z + self.height_offset
+            self.relative_slope = np.rad2deg(np.arctan(
+                np.tan(np.deg2rad(self.relative_slope))
+                + self.height_offset / self.tracker_distance))
+        self._set_neighbor_geometries()
+
+        # Remove the neighbors that cannot shade, unless already done when
+        # generating the field layout
+        if (self.min_solar_elevation is not None) and ((heightmap is not None) or per_neighbor):
+            can_shade = layout._can_shade(
+                self.tracker_distance, self.relative_slope, self._shading_distance,
+                self.min_solar_elevation)
+            (self.X, self.Y, self.Z, self.tracker_distance, self.relative_azimuth,
+             self.relative_slope, self.neighbor_geometry_index, self.height_offset) = (
+                None if values is None else values[can_shade] for values in
+                (self.X, self.Y, self.Z, self.tracker_distance, self.relative_azimuth,
+                 self.relative_slope, self.neighbor_geometry_index, self.height_offset))
+            self._set_neighbor_geometries()
+
+        # Calculate the maximum elevation angle for which shading by the
+        # neighboring collectors can occcur. The horizon is checked separately.
+        self.max_shading_elevation = self._max_shading_elevation(self.tracker_distance)
+
+        # Diffuse shading factors are only calculated when first requested
+        # and are cached by number of sky patches
+        self._diffuse_shading_factor = {}
+
+    def _set_collector_geometry(self, total_collector_geometry, active_collector_geometry):
+        """Set the collector geometries and the properties derived from them."""
+        # Collector geometry
+        self.total_collector_geometry = total_collector_geometry
+        self.active_collector_geometry = active_collector_geometry
+        # Derive properties from geometries
+        self.total_collector_area = self.total_collector_geometry.area
+        self.active_collector_area = self.active_collector_geometry.area
+        self.min_tracker_spacing = \
+            layout._calculate_min_tracker_spacing(self.total_collector_geometry)
+        # The coordinates of the total collector geometry are kept, so that
+        # the shading geometries can be created by offsetting the coordinates
+        self._total_collector_coordinates = \
+            shapely.get_coordinates(self.total_collector_geometry)
+        # Each thread uses its own prepared copy of the active geometry for
+        # fast intersection tests, leaving the geometry of the user unmodified
+        self._thread_local = threading.local()
+        # Pending asynchronous requests, coalesced per event loop and executor,
+        # and the event loops and executors with a batch being calculated
+        self._pending_requests = {}
+        self._running_batches = set()
+
+    def _set_neighbor_geometries(self):
+        """Derive the properties of the neighbor geometries used in the
+        shading calculation."""
+        if self.neighbor_geometries is None:
+            self._neighbor_collector_coordinates = None
+            # Neighboring collectors farther away than the minimum tracker
+            # spacing cannot shade the reference collector
+            self._shading_distance = self.min_tracker_spacing
+            return
+        if np.any((self.neighbor_geometry_index < 0)
+                  | (self.neighbor_geometry_index >= len(self.neighbor_geometries))):
+            raise ValueError('The neighbor geometry index is out of range.')
+        self._neighbor_collector_coordinates = [
+            shapely.get_coordinates(g) for g in self.neighbor_geometries]
+        neighbor_radius = np.array([
+            layout._calculate_min_tracker_spacing(g) / 2 for g in self.neighbor_geometries])
+        self._shading_distance = self.min_tracker_spacing / 2 \
+            + neighbor_radius[self.neighbor_geometry_index]
+
+    def _max_shading_elevation(self, tracker_distance):
+        """Calculate the maximum elevation angle for which shading can occur
+        for the neighboring collectors at the specified distances.
+
+        For mixed collector geometries, the union of the geometries gives a
+        conservative estimate.
+        """
+        geometry = self.total_collector_geometry
+        if self.neighbor_geometries is not None:
+            geometry = shapely.union_all([geometry, *self.neighbor_geometries])
+        return layout.max_shading_elevation(geometry, tracker_distance, self.relative_slope)
+
+    def to_dict(self):
+        """Convert the tracker field to a dictionary.
+
+        The collector geometries are stored as WKB and the field layout as
+        numpy arrays. The dictionary contains everything needed to recreate
+        the tracker field using
+        :py:meth:`twoaxistracking.TrackerField.from_dict` without
+        regenerating the field layout, including cached diffuse shading
+        factors. Tracker fields are pickled using the same representation.
+
+        Returns
+        -------
+        field : dict
+            Dictionary representation of the tracker field.
+        """
+        field = {
+            'total_collector_geometry': shapely.to_wkb(self.total_collector_geometry),
+            'active_collector_geometry': shapely.to_wkb(self.active_collector_geometry),
+            'diffuse_shading_factor': dict(self._diffuse_shading_factor),
+            'neighbor_geometries': None if self.neighbor_geometries is None
+            else shapely.to_wkb(self.neighbor_geometries),
+        }
+        for name in _SERIALIZED_ATTRIBUTES:
+            field[name] = getattr(self, name)
+        return field
+
+    @classmethod
+    def from_dict(cls, field):
+        """Create a tracker field from its dictionary representation.
+
+        Parameters
+        ----------
+        field : dict
+            Dictionary representation of a tracker field as returned by
+            :py:meth:`twoaxistracking.TrackerField.to_dict`.
+
+        Returns
+        -------
+        tracker_field : :py:class:`twoaxistracking.TrackerField`
+        """
+        tracker_field = cls.__new__(cls)
+        tracker_field._set_collector_geometry(
+            shapely.from_wkb(field['total_collector_geometry']),
+            shapely.from_wkb(field['active_collector_geometry']))
+        for name in _SERIALIZED_ATTRIBUTES:
+            setattr(tracker_field, name, field[name])
+        tracker_field.neighbor_geometries = None if field['neighbor_geometries'] is None \
+            else shapely.from_wkb(field['neighbor_geometries'])
+        tracker_field._set_neighbor_geometries()
+        tracker_field._diffuse_shading_factor = dict(field['diffuse_shading_factor'])
+        return tracker_field
 
-        # Calculate the maximum elevation angle for which shading can occcur
-        self.max_shading_elevation = layout.max_shading_elevation(
-            self.total_collector_geometry, self.tracker_distance, self.relative_slope)
+    def __reduce__(self):
+        # Prepared geometries, thread-local state, and pending asynchronous
+        # requests cannot be pickled, so the dictionary representation is used
+        return (self.from_dict, (self.to_dict(),))
 
     def plot_field_layout(self):
         """Create a plot of the field layout.
@@ -131,8 +404,123 @@ class TrackerField:
         return plotting._plot_field_layout(
             X=self.X, Y=self.Y, Z=self.Z, min_tracker_spacing=self.min_tracker_spacing)
 
+    def sky_shading_map(self, azimuth_step=5, elevation_step=2, max_workers=None):
+        """Calculate the shaded fraction over a grid covering the sky dome.
+
+        The shaded fraction is calculated for the centers of the grid cells
+        in one vectorized calculation, which is split among a pool of
+        threads. Only the grid cells where the collector may be partially
+        shaded go through the geometric calculation.
+
+        Parameters
+        ----------
+        azimuth_step : float, default : 5
+            Width of the grid cells in the azimuth direction [degrees]
+        elevation_step : float, default : 2
+            Height of the grid cells in the elevation direction [degrees]
+        max_workers : int, optional
+            Maximum number of threads used for evaluating the grid cells in
+            parallel. If None, the number of processors is used.
+
+        Returns
+        -------
+        shading_map : pandas.DataFrame
+            Shaded fraction with the elevation angles of the cell centers as
+            index and the azimuth angles of the cell centers as columns.
+        """
+        elevation = np.arange(elevation_step / 2, 90, elevation_step)
+        azimuth = np.arange(azimuth_step / 2, 360, azimuth_step)
+        elevation_grid, azimuth_grid = np.meshgrid(elevation, azimuth, indexing='ij')
+        shaded_fractions = self.get_shaded_fraction(
+            elevation_grid, azimuth_grid, max_workers=max_workers)
+        return pd.DataFrame(shaded_fractions,
+                            index=pd.Index(elevation, name='elevation'),
+                            columns=pd.Index(azimuth, name='azimuth'))
+
+    def plot_sky_shading_map(self, azimuth_step=5, elevation_step=2):
+        """Create a polar plot of the shaded fraction over the sky dome.
+
+        Parameters
+        ----------
+        azimuth_step : float, default : 5
+            Width of the grid cells in the azimuth direction [degrees]
+        elevation_step : float, default : 2
+            Height of the grid cells in the elevation direction [degrees]
+
+        Returns
+        -------
+        fig : matplotlib.figure.Figure
+            Figure with a polar axes, where the zenith is at the center.
+        """
+        return plotting._plot_sky_shading_map(
+            self.sky_shading_map(azimuth_step, elevation_step))
+
+    def diffuse_shading_factor(self, n_patches=145, max_workers=None):
+        """Calculate the shading factor of the sky diffuse irradiance.
+
+        The diffuse shading factor is the average shaded fraction over the
+        sky dome, weighted by the diffuse horizontal irradiance from each sky
+        patch assuming an isotropic sky. The shaded fraction of each patch is
+        calculated as if the sun was located at the center of the patch.
+        Only the patches where the collector may be partially shaded go
+        through the geometric calculation.
+
+        The diffuse shading factor only depends on the collector geometry and
+        field layout and is therefore only calculated once per field and
+        number of sky patches.
+
+        Parameters
+        ----------
+        n_patches : int, default : 145
+            Number of sky patches. Either the 145 patches of the Tregenza sky
+            discretization or a Reinhart subdivision (144*MF**2 + 1 patches,
+            e.g., 577 or 2305).
+        max_workers : int, optional
+            Maximum number of threads used for evaluating the sky patches in
+            parallel. If None, the number of processors is used.
+
+        Returns
+        -------
+        diffuse_shading_factor : float
+            Fraction of the sky diffuse irradiance that is shaded [unitless]
+        """
+        if n_patches not in self._diffuse_shading_factor:
+            elevation, azimuth, weight = irradiance._sky_patches(n_patches)
+            shaded_fractions = self.get_shaded_fraction(
+                elevation, azimuth, max_workers=max_workers)
+            self._diffuse_shading_factor[n_patches] = np.sum(shaded_fractions * weight)
+        return self._diffuse_shading_factor[n_patches]
+
+    def _geometric_shaded_fraction(self, solar_elevation, solar_azimuth,
+                                   max_workers=1, chunk_size=None):
+        """Calculate the shaded fraction of solar positions that all require
+        the geometric shading calculation, in chunks using a pool of threads.
+
+        The time of the geometric calculation is spent in vectorized shapely
+        operations, which release the GIL, so the chunks are calculated in
+        parallel. Each worker thread uses its own prepared active collector
+        geometry, see :py:meth:`_prepared_active_collector_geometry`.
+        """
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if chunk_size is None:
+            # One chunk per thread gives the longest GIL-free operations
+            chunk_size = max(int(np.ceil(len(solar_elevation) / max_workers)), 1)
+
+        def chunk_shaded_fraction(start):
+            unshaded_geometries, _, _ = self._unshaded_geometries(
+                solar_elevation[start:start + chunk_size],
+                solar_azimuth[start:start + chunk_size])
+            return 1 - shapely.area(unshaded_geometries) / self.active_collector_area
+
+        starts = range(0, len(solar_elevation), chunk_size)
+        if (max_workers == 1) or (len(starts) <= 1):
+            return np.concatenate([np.empty(0)] + [chunk_shaded_fraction(s) for s in starts])
+        with ThreadPoolExecutor(max_workers) as executor:
+            return np.concatenate(list(executor.map(chunk_shaded_fraction, starts)))
+
     def get_shaded_fraction(self, solar_elevation,  solar_azimuth,
-                            plot=False):
+                            plot=False, max_workers=1, chunk_size=None):
         """Calculate the shaded fraction for the specified solar positions.
 
         Uses the :py:func:`twoaxistracking.shaded_fraction` function to
@@ -148,45 +536,547 @@ class TrackerField:
         plot : boolean, default: False
             Whether to plot the unshaded and shading geometries for each solar
             position.
+        max_workers : int, default : 1
+            Number of threads that calculate the geometric shading in
+            parallel. If None, the number of processors is used.
+        chunk_size : int, optional
+            Number of solar positions requiring the geometric shading
+            calculation per chunk. By default, these solar positions are split
+            evenly among the threads.
 
         Returns
         -------
         shaded_fractions : array-like
             The shaded fractions for the specified collector geometry,
             field layout, and solar angles.
+
+        Notes
+        -----
+        Only the solar positions that require the geometric shading
+        calculation are split into chunks, so the threads get an equal share
+        of the work regardless of, e.g., the number of night-time solar
+        positions. The geometric calculation of each chunk is vectorized and
+        spends most of its time in shapely operations that release the GIL,
+        so the threads calculate in parallel. Large chunks give the longest
+        GIL-free operations, whereas smaller chunks reduce the memory use.
         """
-        is_scalar = False
-        # Wrap scalars in a list
-        if np.isscalar(solar_elevation):
-            solar_elevation = [solar_elevation]
-            solar_azimuth = [solar_azimuth]
-            is_scalar = True
-
-        # Calculate the shaded fraction for each solar position
-        shaded_fractions = []
-        for (elevation, azimuth) in zip(solar_elevation, solar_azimuth):
-            shaded_fraction = shading.shaded_fraction(
-                solar_elevation=elevation,
-                solar_azimuth=azimuth,
-                total_collector_geometry=self.total_collector_geometry,
-                active_collector_geometry=self.active_collector_geometry,
-                min_tracker_spacing=self.min_tracker_spacing,
-                tracker_distance=self.tracker_distance,
-                relative_azimuth=self.relative_azimuth,
-                relative_slope=self.relative_slope,
-                slope_azimuth=self.slope_azimuth,
-                slope_tilt=self.slope_tilt,
-                max_shading_elevation=self.max_shading_elevation,
-                plot=plot)
-            shaded_fractions.append(shaded_fraction)
+        is_scalar = np.isscalar(solar_elevation)
+        elevation, azimuth = _solar_position_arrays(solar_elevation, solar_azimuth)
+
+        # Classify all solar positions at once, so that only the solar
+        # positions where shading may partially occur enter the geometric
+        # shading calculation
+        labels = self._classify_solar_positions(elevation, azimuth)
+        shaded_fractions = shading._SHADED_FRACTION_BY_LABEL[labels]
+
+        # Calculate the shaded fraction for the remaining solar positions
+        needs_geometry = labels == shading._NEEDS_GEOMETRY
+        if not plot:
+            shaded_fractions[needs_geometry] = self._geometric_shaded_fraction(
+                elevation[needs_geometry], azimuth[needs_geometry], max_workers, chunk_size)
+        else:
+            unshaded_geometries, shading_geometries, position_index = \
+                self._unshaded_geometries(elevation[needs_geometry], azimuth[needs_geometry])
+            shaded_fractions[needs_geometry] = \
+                1 - shapely.area(unshaded_geometries) / self.active_collector_area
+            for i, unshaded_geometry in enumerate(unshaded_geometries):
+                plotting._plot_shading(
+                    self.active_collector_geometry, unshaded_geometry,
+                    list(shading_geometries[position_index == i]),
+                    self.min_tracker_spacing)
+
+        return _as_input_type(shaded_fractions, solar_elevation, is_scalar)
+
+    async def aget_shaded_fraction(self, solar_elevation, solar_azimuth,
+                                   executor=None):
+        """Calculate the shaded fraction without blocking the event loop.
+
+        Asynchronous version of
+        :py:meth:`twoaxistracking.TrackerField.get_shaded_fraction`. The
+        calculation is offloaded to an executor. Requests for the same field
+        and executor that are made concurrently, i.e., within the same
+        iteration of the event loop, are coalesced into one batched
+        calculation, and the results are split among the requests. While a
+        batch is being calculated, new requests are queued and coalesced into
+        the next batch, which is started when the current batch completes.
+        Thus, there is at most one batch per field and executor at a time,
+        and the batches grow with the load.
+
+        Cancelling a request does not affect the other requests in the batch.
+        The batched calculation is cancelled if all of its requests are
+        cancelled before it has started.
+
+        Parameters
+        ----------
+        solar_elevation : array-like
+            Solar elevation angles in degrees.
+        solar_azimuth : array-like
+            Solar azimuth angles in degrees.
+        executor : concurrent.futures.Executor, optional
+            Executor that carries out the calculation. If None, the default
+            executor of the event loop is used. Thread pools are recommended,
+            as the geometric calculations release the GIL.
+
+        Returns
+        -------
+        shaded_fractions : array-like
+            The shaded fractions for the specified collector geometry,
+            field layout, and solar angles.
+        """
+        elevation, azimuth = _solar_position_arrays(solar_elevation, solar_azimuth)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (loop, executor)
+        pending = self._pending_requests.setdefault(key, [])
+        if (len(pending) == 0) and (key not in self._running_batches):
+            # The batch is dispatched once the currently runnable tasks have
+            # made their requests. If a batch is running, the requests are
+            # dispatched when it completes.
+            loop.call_soon(self._dispatch_requests, key)
+        pending.append((elevation, azimuth, future))
+
+        shaded_fractions = await future
+        return _as_input_type(shaded_fractions, solar_elevation,
+                              np.isscalar(solar_elevation))
+
+    def _dispatch_requests(self, key):
+        """Run the pending asynchronous requests as one batch in the executor."""
+        loop, executor = key
+        requests = [request for request in self._pending_requests.pop(key, [])
+                    if not request[2].cancelled()]
+        if len(requests) == 0:
+            return
+        elevations, azimuths, futures = zip(*requests)
+        self._running_batches.add(key)
+        batch = loop.run_in_executor(
+            executor, self.get_shaded_fraction,
+            np.concatenate(elevations), np.concatenate(azimuths))
+        splits = np.cumsum([len(elevation) for elevation in elevations])[:-1]
+
+        def set_results(batch):
+            # Dispatch the requests queued while the batch was running
+            self._running_batches.discard(key)
+            self._dispatch_requests(key)
+            if batch.cancelled():
+                for future in futures:
+                    future.cancel()
+                return
+            exception = batch.exception()
+            results = [None] * len(futures) if exception is not None \
+                else np.split(np.asarray(batch.result()), splits)
+            for future, result in zip(futures, results):
+                if future.done():
+                    continue
+                elif exception is not None:
+                    future.set_exception(exception)
+                else:
+                    future.set_result(result)
+
+        def cancel_batch(_):
+            if all(future.cancelled() for future in futures):
+                batch.cancel()
+
+        batch.add_done_callback(set_results)
+        for future in futures:
+            future.add_done_callback(cancel_batch)
+
+    def get_shading_loss(self, solar_elevation, solar_azimuth, weights=None,
+                         elevation_step=0.5, azimuth_step=1, freq=None):
+        """Calculate the time-integrated shading loss from binned solar
+        positions.
+
+        The solar positions are binned by elevation and azimuth angle, and
+        the shaded fraction is only calculated once for the center of each
+        occupied bin. The cost of the geometric calculation is therefore
+        proportional to the number of occupied bins rather than the number
+        of timestamps, which makes it suitable for estimating annual or
+        monthly shading losses from long time series.
+
+        Parameters
+        ----------
+        solar_elevation : array-like
+            Solar elevation angles in degrees.
+        solar_azimuth : array-like
+            Solar azimuth angles in degrees.
+        weights : array-like, optional
+            Weight of each solar position, e.g., the direct normal irradiance
+            for an irradiance-weighted shading loss. If None, all solar
+            positions are weighted equally (time-weighted shading loss).
+        elevation_step : float, default : 0.5
+            Height of the bins [degrees]
+        azimuth_step : float, default : 1
+            Width of the bins [degrees]
+        freq : str, optional
+            Frequency for which to calculate the shading loss, e.g., ``'MS'``
+            for monthly shading losses. Requires ``solar_elevation`` to be a
+            pandas Series with a DatetimeIndex.
+
+        Returns
+        -------
+        shading_loss : float or pandas.Series
+            Weighted average shaded fraction of the solar positions above the
+            horizon. A Series indexed by period is returned if ``freq`` is
+            specified.
+
+        Notes
+        -----
+        Whether a solar position is at night, below the horizon, or above
+        the maximum shading elevation is determined for each solar position,
+        and only the remaining solar positions are binned.
+        """
+        if (freq is not None) and not (isinstance(solar_elevation, pd.Series)
+                                       and isinstance(solar_elevation.index, pd.DatetimeIndex)):
+            raise ValueError('The solar elevation must be a pandas Series with a '
+                             'DatetimeIndex when freq is specified.')
+        elevation, azimuth = _solar_position_arrays(solar_elevation, solar_azimuth)
+        weights = np.broadcast_to(
+            np.asarray(1 if weights is None else weights, dtype=float), elevation.shape)
+
+        labels = self._classify_solar_positions(elevation, azimuth)
+        shaded_fractions = shading._SHADED_FRACTION_BY_LABEL[labels]
+        needs_geometry = labels == shading._NEEDS_GEOMETRY
+
+        bin_elevation, bin_azimuth, bin_index = _bin_solar_positions(
+            elevation[needs_geometry], azimuth[needs_geometry], elevation_step, azimuth_step)
+        # The geometric calculation is also used for bin centers below the
+        # horizon, as the horizon has already been accounted for
+        unshaded_geometries, _, _ = self._unshaded_geometries(bin_elevation, bin_azimuth)
+        bin_shaded_fractions = \
+            1 - shapely.area(unshaded_geometries) / self.active_collector_area
+        shaded_fractions[needs_geometry] = bin_shaded_fractions[bin_index]
+
+        # Solar positions at night do not contribute to the shading loss
+        is_day = labels != shading._NIGHT
+        shaded_weights = np.where(is_day, shaded_fractions * weights, 0)
+        day_weights = np.where(is_day, weights, 0)
+        if freq is None:
+            # The shading loss is nan if there are no solar positions above
+            # the horizon
+            with np.errstate(invalid='ignore'):
+                return shaded_weights.sum() / day_weights.sum()
+        grouper = pd.Grouper(freq=freq)
+        return (pd.Series(shaded_weights, index=solar_elevation.index).groupby(grouper).sum()
+                / pd.Series(day_weights, index=solar_elevation.index).groupby(grouper).sum())
+
+    def get_shading_loss_curve(self, gcr, solar_elevation, solar_azimuth, weights=None,
+                               elevation_step=0.5, azimuth_step=1):
+        """Calculate the time-integrated shading loss for multiple ground
+        cover ratios.
+
+        Changing only the ground cover ratio scales the field layout by
+        :math:`\\sqrt{gcr_{field} / gcr}`, and thus also the offsets of the
+        projected neighboring collectors. The offsets are therefore only
+        calculated once from the layout of the tracker field and scaled for
+        each ground cover ratio, and the shading of all ground cover ratios
+        is calculated in one batch. The solar positions are binned as in
+        :py:meth:`twoaxistracking.TrackerField.get_shading_loss`.
+
+        Parameters
+        ----------
+        gcr : float or array-like
+            Ground cover ratios for which to calculate the shading loss. The
+        ground cover ratios must be greater than zero and cannot exceed the
+        maximum ground cover ratio of the collector geometry, offset, and
+        minimum tracker spacing of the tracker field.
+        solar_elevation : array-like
+            Solar elevation angles in degrees.
+        solar_azimuth : array-like
+            Solar azimuth angles in degrees.
+        weights : array-like, optional
+            Weight of each solar position, e.g., the direct normal irradiance
+            for an irradiance-weighted shading loss. If None, all solar
+            positions are weighted equally (time-weighted shading loss).
+        elevation_step : float, default : 0.5
+            Height of the bins [degrees]
+        azimuth_step : float, default : 1
+            Width of the bins [degrees]
+
+        Returns
+        -------
+        shading_loss : pandas.Series
+            Weighted average shaded fraction of the solar positions above the
+            horizon, indexed by the ground cover ratio.
+
+        Notes
+        -----
+        The neighboring collectors of the tracker field are used for all
+        ground cover ratios. If the neighbors were selected using
+        ``min_solar_elevation``, the ground cover ratios cannot exceed that of
+        the tracker field, as more distant collectors may cast shade at
+        higher ground cover ratios.
+
+        The relative heights of the neighboring collectors on a heightmap or
+        with height offsets do not scale with the layout, and the shading loss
+        curve is therefore not supported for such fields.
+        """
+        if self._has_heightmap or (self.height_offset is not None):
+            raise ValueError('The shading loss curve is not supported for fields '
+                             'with a heightmap or height offsets.')
+        gcr = np.atleast_1d(np.asarray(gcr, dtype=float))
+        # Same range as in generate_field_layout
+        gcr_max = self.total_collector_area / (
+            self.min_tracker_spacing**2 * np.sqrt(1 - self.offset**2))
+        if np.any(~((gcr > 0) & (gcr <= gcr_max))):
+            raise ValueError('The ground cover ratios must be greater than 0 and cannot '
+                             f'exceed the maximum ground cover ratio of {gcr_max:.3f}.')
+        if (self.min_solar_elevation is not None) and np.any(gcr > self.gcr):
+            raise ValueError('The ground cover ratios cannot exceed the ground cover '
+                             'ratio of the tracker field when min_solar_elevation is '
+                             'specified.')
+        elevation, azimuth = _solar_position_arrays(solar_elevation, solar_azimuth)
+        weights = np.broadcast_to(
+            np.asarray(1 if weights is None else weights, dtype=float), elevation.shape)
+
+        # The field layout scales with the inverse square root of the GCR.
+        # Shading can occur up to the highest elevation of all the layouts,
+        # which is that of the most densely spaced layout.
+        scaling = np.sqrt(self.gcr / gcr)
+        labels = shading._classify_solar_positions(
+            solar_elevation=elevation,
+            solar_azimuth=azimuth,
+            slope_azimuth=self.slope_azimuth,
+            slope_tilt=self.slope_tilt,
+            max_shading_elevation=max(
+                self.max_shading_elevation,
+                self._max_shading_elevation(self.tracker_distance * scaling.min())),
+            horizon_profile=self._horizon_profile)
+        needs_geometry = labels == shading._NEEDS_GEOMETRY
+
+        bin_elevation, bin_azimuth, bin_index = _bin_solar_positions(
+            elevation[needs_geometry], azimuth[needs_geometry], elevation_step, azimuth_step)
+        xoff, yoff, in_view = shading._shading_offsets(
+            bin_elevation, bin_azimuth, self.tracker_distance, self.relative_azimuth,
+            self.relative_slope)
+        # The offsets of all the GCRs are stacked with the GCRs as the
+        # outermost dimension
+        n_bins, n_neighbors = len(bin_elevation), len(self.tracker_distance)
+        unshaded_geometries, _, _ = self._unshaded_geometries_from_offsets(
+            (scaling[:, np.newaxis, np.newaxis] * xoff).reshape(-1, n_neighbors),
+            (scaling[:, np.newaxis, np.newaxis] * yoff).reshape(-1, n_neighbors),
+            np.tile(in_view, (len(gcr), 1)))
+        bin_shaded_fractions = (1 - shapely.area(unshaded_geometries)
+                                / self.active_collector_area).reshape(len(gcr), n_bins)
+
+        # Solar positions below the horizon are fully shaded for all GCRs and
+        # solar positions at night do not contribute to the shading loss
+        bin_weights = np.bincount(bin_index, weights=weights[needs_geometry],
+                                  minlength=n_bins)
+        fully_shaded_weight = weights[labels == shading._FULLY_SHADED].sum()
+        with np.errstate(invalid='ignore'):
+            shading_loss = (fully_shaded_weight + bin_shaded_fractions @ bin_weights) \
+                / weights[labels != shading._NIGHT].sum()
+        return pd.Series(shading_loss, index=pd.Index(gcr, name='gcr'), name='shading_loss')
+
+    def save_shading_animation(self, solar_elevation, solar_azimuth, filename,
+                               fps=10, dpi=100, writer=None, chunk_size=1000):
+        """Save an animation of the shading for a sequence of solar positions.
+
+        The animation shows the same plots as ``get_shaded_fraction`` with
+        ``plot=True``, but reuses a single figure for all solar positions and
+        writes the frames directly to the file. The geometries are calculated
+        in chunks of solar positions while the frames are written, so the
+        memory use does not grow with the number of solar positions. This
+        makes it possible to animate long time series, e.g., a full day at a
+        one-minute resolution.
+
+        Parameters
+        ----------
+        solar_elevation : array-like
+            Solar elevation angles in degrees.
+        solar_azimuth : array-like
+            Solar azimuth angles in degrees.
+        filename : str or path-like
+            Name of the output file, e.g., ``'shading.gif'`` or
+            ``'shading.mp4'``.
+        fps : float, default : 10
+            Frames per second.
+        dpi : float, default : 100
+            Resolution of the frames in dots per inch.
+        writer : str or matplotlib.animation.MovieWriter, optional
+            Writer used to save the animation. If None, the pillow writer is
+            used for GIF files and the ffmpeg writer otherwise.
+        chunk_size : int, default : 1000
+            Number of solar positions for which the geometries are calculated
+            in one batch.
+        """
+        elevation, azimuth = _solar_position_arrays(solar_elevation, solar_azimuth)
+        frames = (frame for start in range(0, len(elevation), chunk_size)
+                  for frame in self._shading_frames(elevation[start:start + chunk_size],
+                                                    azimuth[start:start + chunk_size]))
+        plotting._save_shading_animation(
+            filename, self.active_collector_geometry, frames, self.min_tracker_spacing,
+            fps=fps, dpi=dpi, writer=writer)
+
+    def _shading_frames(self, solar_elevation, solar_azimuth):
+        """Calculate the unshaded geometry, the shading geometries, and the
+        title of the animation frame of each solar position."""
+        labels = self._classify_solar_positions(solar_elevation, solar_azimuth)
+        # Without the geometric calculation, the collector is either
+        # completely unshaded or the unshaded area is empty
+        unshaded_geometries = np.where(
+            labels == shading._UNSHADED, self.active_collector_geometry,
+            shapely.Polygon())
+        shading_geometries = [[] for _ in range(len(solar_elevation))]
+        needs_geometry = np.flatnonzero(labels == shading._NEEDS_GEOMETRY)
+        unshaded_geometries[needs_geometry], geometries, position_index = \
+            self._unshaded_geometries(solar_elevation[needs_geometry],
+                                      solar_azimuth[needs_geometry])
+        for i, position in enumerate(needs_geometry):
+            shading_geometries[position] = geometries[position_index == i]
+        titles = [f'Solar elevation: {el:.1f}°, solar azimuth: {az:.1f}°'
+                  for el, az in zip(solar_elevation, solar_azimuth)]
+        return zip(unshaded_geometries, shading_geometries, titles)
+
+    def get_cell_shaded_fraction(self, solar_elevation, solar_azimuth):
+        """Calculate the shaded fraction of each active area for the specified
+        solar positions.
+
+        The active collector geometry is split into its individual polygons
+        (e.g., cells or modules), and the shaded fraction of each polygon is
+        calculated for all solar positions in one batched calculation. The
+        cell shaded fractions can be combined into an electrical shading loss
+        using :py:func:`twoaxistracking.electrical.electrical_shaded_fraction`.
+
+        Parameters
+        ----------
+        solar_elevation : array-like
+            Solar elevation angles in degrees.
+        solar_azimuth : array-like
+            Solar azimuth angles in degrees.
+
+        Returns
+        -------
+        cell_shaded_fractions : 2D array or pandas.DataFrame
+            The shaded fractions with the solar positions as rows and the
+            polygons of ``active_collector_geometry`` as columns. A DataFrame
+            is returned if ``solar_elevation`` is a pandas Series.
+        """
+        elevation, azimuth = _solar_position_arrays(solar_elevation, solar_azimuth)
+        cells = shapely.get_parts(self.active_collector_geometry)
+
+        labels = self._classify_solar_positions(elevation, azimuth)
+        cell_shaded_fractions = np.repeat(
+            shading._SHADED_FRACTION_BY_LABEL[labels][:, np.newaxis], len(cells), axis=1)
+
+        needs_geometry = labels == shading._NEEDS_GEOMETRY
+        unshaded_geometries, _, _ = self._unshaded_geometries(
+            elevation[needs_geometry], azimuth[needs_geometry])
+        # The unshaded area of each cell is its intersection with the
+        # unshaded geometry, calculated for all solar positions and cells
+        unshaded_cell_area = shapely.area(shapely.intersection(
+            unshaded_geometries[:, np.newaxis], cells[np.newaxis, :]))
+        cell_shaded_fractions[needs_geometry] = \
+            1 - unshaded_cell_area / shapely.area(cells)
 
-        # Return the shaded_fractions as the same type as the input
         if isinstance(solar_elevation, pd.Series):
-            shaded_fractions = pd.Series(shaded_fractions,
-                                         index=solar_elevation.index)
-        elif isinstance(solar_elevation, np.ndarray):
-            shaded_fractions = np.array(shaded_fractions)
-        elif is_scalar:
-            shaded_fractions = shaded_fractions[0]
-
-        return shaded_fractions
+            return pd.DataFrame(cell_shaded_fractions, index=solar_elevation.index)
+        return cell_shaded_fractions
+
+    def _classify_solar_positions(self, solar_elevation, solar_azimuth):
+        """Classify solar positions by the type of shading calculation needed,
+        see :py:func:`twoaxistracking.shading._classify_solar_positions`."""
+        return shading._classify_solar_positions(
+            solar_elevation=solar_elevation,
+            solar_azimuth=solar_azimuth,
+            slope_azimuth=self.slope_azimuth,
+            slope_tilt=self.slope_tilt,
+            max_shading_elevation=self.max_shading_elevation,
+            horizon_profile=self._horizon_profile)
+
+    def _unshaded_geometries(self, solar_elevation, solar_azimuth):
+        """Calculate the unshaded geometries for arrays of solar positions.
+
+        The early-exit conditions of :py:func:`twoaxistracking.shaded_fraction`
+        are not checked, i.e., the solar positions should all require the
+        geometric shading calculation.
+        """
+        xoff, yoff, in_view = shading._shading_offsets(
+            solar_elevation, solar_azimuth, self.tracker_distance,
+            self.relative_azimuth, self.relative_slope)
+        return self._unshaded_geometries_from_offsets(xoff, yoff, in_view)
+
+    def _unshaded_geometries_from_offsets(self, xoff, yoff, in_view):
+        """Calculate the unshaded geometries from the offsets of the projected
+        neighboring collectors, see
+        :py:func:`twoaxistracking.shading._unshaded_geometries`."""
+        # Only collectors within the field of view and close enough to the
+        # reference collector can cast a shadow on it
+        shades = in_view & (np.hypot(xoff, yoff) < self._shading_distance)
+        if self.neighbor_geometries is None:
+            return shading._unshaded_geometries(
+                xoff, yoff, shades, self.total_collector_geometry,
+                self._prepared_active_collector_geometry(),
+                self._total_collector_coordinates)
+        return shading._unshaded_geometries(
+            xoff, yoff, shades, self.neighbor_geometries,
+            self._prepared_active_collector_geometry(),
+            self._neighbor_collector_coordinates, self.neighbor_geometry_index)
+
+    def _prepared_active_collector_geometry(self):
+        """Return the prepared active collector geometry for the current thread.
+
+        The spatial index of a prepared geometry is built lazily by GEOS and
+        is not safe to share between threads. Every thread, i.e., the pool
+        workers as well as the threads calling the field, therefore uses its
+        own prepared copy, which is created on first use.
+        """
+        geometry = getattr(self._thread_local, 'active_collector_geometry', None)
+        if geometry is None:
+            geometry = _prepared_copy(self.active_collector_geometry)
+            self._thread_local.active_collector_geometry = geometry
+        return geometry
+
+
+def _bin_solar_positions(solar_elevation, solar_azimuth, elevation_step, azimuth_step):
+    """Bin solar positions by elevation and azimuth angle.
+
+    Returns the elevation and azimuth angles of the centers of the occupied
+    bins and the index of the bin of each solar position.
+    """
+    n_azimuth_bins = int(np.ceil(360 / azimuth_step))
+    bins = (solar_elevation // elevation_step).astype(int) * n_azimuth_bins \
+        + (np.mod(solar_azimuth, 360) // azimuth_step).astype(int)
+    occupied_bins, bin_index = np.unique(bins, return_inverse=True)
+    return ((occupied_bins // n_azimuth_bins + 0.5) * elevation_step,
+            (occupied_bins % n_azimuth_bins + 0.5) * azimuth_step, bin_index.ravel())
+
+
+def _prepared_copy(geometry):
+    """Return a prepared copy of a geometry."""
+    geometry = shapely.from_wkb(shapely.to_wkb(geometry))
+    shapely.prepare(geometry)
+    return geometry
+
+
+def _solar_position_arrays(solar_elevation, solar_azimuth):
+    """Convert the solar elevation and azimuth angles to flat float arrays."""
+    elevation = np.atleast_1d(np.asarray(solar_elevation, dtype=float)).ravel()
+    azimuth = np.atleast_1d(np.asarray(solar_azimuth, dtype=float)).ravel()
+    if elevation.shape != azimuth.shape:
+        raise ValueError('The solar elevation and azimuth angles must have '
+                         'the same shape.')
+    return elevation, azimuth
+
+
+def _per_neighbor_values(values, n_neighbors, dtype):
+    """Convert values specified for each neighboring collector to an array."""
+    if values is None:
+        return None
+    values = np.asarray(values, dtype=dtype)
+    if values.shape != (n_neighbors,):
+        raise ValueError('The per-neighbor values must have one value for each '
+                         f'of the {n_neighbors} neighboring collectors.')
+    return values
+
+
+def _as_input_type(values, template, is_scalar=False):
+    """Return an array of values as the same type as the template input."""
+    if is_scalar:
+        return values.item()
+    elif isinstance(template, pd.Series):
+        return pd.Series(values, index=template.index)
+    elif isinstance(template, np.ndarray):
+        return values.reshape(template.shape)
+    else:
+        return values.tolist()